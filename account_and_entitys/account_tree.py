@@ -0,0 +1,32 @@
+"""
+Helpers for the XX_Account hierarchy.
+
+XX_Account.is_leaf records whether any other account names this one as its
+parent, so "zero level" (leaf) filtering is a plain column predicate instead
+of loading every parent link into Python.
+"""
+from django.db.models import Case, Exists, OuterRef, Value, When
+
+
+def refresh_account_leaf_flags(account_codes=None, account_model=None):
+    """
+    Recompute is_leaf for the given account codes (or for every account).
+
+    One UPDATE statement; the model can be passed in so migrations can use
+    the historical model. Returns the number of rows updated.
+    """
+    if account_model is None:
+        from .models import XX_Account
+        account_model = XX_Account
+
+    has_children = Exists(account_model.objects.filter(parent=OuterRef('account')))
+    accounts = account_model.objects.all()
+    if account_codes is not None:
+        codes = {str(code) for code in account_codes if code not in (None, '')}
+        if not codes:
+            return 0
+        accounts = accounts.filter(account__in=codes)
+
+    return accounts.update(
+        is_leaf=Case(When(has_children, then=Value(False)), default=Value(True))
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import XX_Account, XX_Entity, XX_PivotFund
+from public_funtion.update_pivot_fund import pivot_fund_balance, with_pivot_fund_balances
 @admin.register(XX_Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ('id', 'account', 'parent', 'alias_default')
@@ -14,9 +15,22 @@ class EntityAdmin(admin.ModelAdmin):
 
 @admin.register(XX_PivotFund)
 class PivotFundAdmin(admin.ModelAdmin):
-    list_display = ('id', 'entity', 'account', 'year', 'budget', 'fund', 'actual', 'encumbrance')
+    list_display = ('id', 'entity', 'account', 'year', 'budget', 'fund', 'actual_balance', 'encumbrance_balance')
     list_filter = ('year',)
     search_fields = ('entity__entity', 'account__account')
+    # Balances move only through the movement ledger
+    readonly_fields = ('actual', 'encumbrance')
+
+    def get_queryset(self, request):
+        return with_pivot_fund_balances(super().get_queryset(request))
+
+    @admin.display(description='actual')
+    def actual_balance(self, obj):
+        return pivot_fund_balance(obj)[1]
+
+    @admin.display(description='encumbrance')
+    def encumbrance_balance(self, obj):
+        return pivot_fund_balance(obj)[0]
 
 # @admin.register(MainCurrency)
 # class MainCurrencyAdmin(admin.ModelAdmin):
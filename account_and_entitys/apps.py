@@ -3,3 +3,12 @@ from django.apps import AppConfig
 class AccountAndEntitysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'account_and_entitys'
+
+    def ready(self):
+        """
+        Initialize signals when the app is ready
+        """
+        try:
+            from . import signals
+        except ImportError as e:
+            print(f"Error importing account and entity signals: {e}")
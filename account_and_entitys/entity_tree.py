@@ -0,0 +1,298 @@
+"""
+Helpers for the XX_Entity hierarchy.
+
+XX_Entity stores its parent as the parent's ``entity`` code (a string), so
+walking the tree with the ORM costs one query per node. Two derived forms
+of the hierarchy are kept instead:
+
+* XX_ENTITY_CLOSURE_XX: one row per (ancestor, descendant) pair, including
+  each entity paired with itself, for SQL that needs "all descendants of
+  these ids" as an indexed join or subquery.
+* EntityTree: a compact in-process copy of XX_Entity answering descendant,
+  leaf and ancestor questions from memory. It is versioned through the
+  shared cache, so every worker reloads it after any entity change.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from budget_transfer.global_function.dashboard_cache import invalidate_dashboard_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-thread counters: a rebuild in one thread must not swallow changes
+# another thread has not committed yet
+_changes = threading.local()
+
+
+def build_closure_pairs(entity_rows):
+    """
+    Compute closure pairs from (id, entity, parent) rows.
+
+    Returns a list of (ancestor_id, descendant_id, depth) tuples. Cycles in
+    the parent links are cut at the first repeated node.
+    """
+    children_by_code = defaultdict(list)
+    for entity_id, code, parent in entity_rows:
+        if parent not in (None, ''):
+            children_by_code[str(parent).strip()].append((entity_id, code))
+
+    pairs = []
+    for entity_id, code, _parent in entity_rows:
+        visited = {entity_id}
+        pairs.append((entity_id, entity_id, 0))
+        stack = [(child, 1) for child in children_by_code.get(str(code).strip(), ())]
+        while stack:
+            (child_id, child_code), depth = stack.pop()
+            if child_id in visited:
+                continue
+            visited.add(child_id)
+            pairs.append((entity_id, child_id, depth))
+            stack.extend(
+                (grandchild, depth + 1)
+                for grandchild in children_by_code.get(str(child_code).strip(), ())
+            )
+    return pairs
+
+
+def rebuild_entity_closure(entity_model=None, closure_model=None):
+    """
+    Rebuild XX_ENTITY_CLOSURE_XX from the current XX_Entity rows.
+
+    The models can be passed in so migrations can call this with historical
+    models. Returns the number of closure rows written.
+    """
+    if entity_model is None or closure_model is None:
+        from .models import XX_Entity, XX_EntityClosure
+        entity_model = entity_model or XX_Entity
+        closure_model = closure_model or XX_EntityClosure
+
+    rows = list(entity_model.objects.values_list('id', 'entity', 'parent'))
+    pairs = build_closure_pairs(rows)
+
+    with transaction.atomic():
+        closure_model.objects.all().delete()
+        closure_model.objects.bulk_create(
+            [
+                closure_model(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                for ancestor_id, descendant_id, depth in pairs
+            ],
+            batch_size=1000,
+        )
+    return len(pairs)
+
+
+def schedule_entity_closure_rebuild():
+    """
+    Rebuild the closure table once the current transaction commits.
+
+    The entity tree and the cached 'normal' dashboard sections, whose entity
+    scopes are resolved from it, are retired at the same time. Every entity
+    change bumps a change counter; a rebuild covers all changes counted
+    before it started, so the callbacks queued by many saves in one
+    transaction collapse into a single rebuild.
+    """
+    change = getattr(_changes, 'counter', 0) + 1
+    _changes.counter = change
+
+    def _rebuild():
+        if change <= getattr(_changes, 'rebuilt_through', 0):
+            return
+        _changes.rebuilt_through = _changes.counter
+        invalidate_entity_tree()
+        invalidate_dashboard_cache('normal')
+        try:
+            rebuild_entity_closure()
+        except Exception as e:
+            logger.error(f"Error rebuilding entity closure table: {str(e)}")
+
+    transaction.on_commit(_rebuild)
+
+
+def get_descendant_ids(entity_ids):
+    """
+    Queryset of the ids of the given entities and all their descendants,
+    suitable for use as an ``id__in`` subquery.
+    """
+    from .models import XX_EntityClosure
+
+    return XX_EntityClosure.objects.filter(ancestor_id__in=entity_ids).values('descendant_id')
+
+
+# ============================================================================
+# In-memory entity tree
+# ============================================================================
+
+ENTITY_TREE_VERSION_KEY = 'entity_tree:version'
+
+# Upper bound (seconds) on how long a worker trusts its tree without seeing
+# the shared version, e.g. while the cache server is unreachable
+DEFAULT_ENTITY_TREE_MAX_AGE = 300
+
+_tree_lock = threading.Lock()
+_tree = None
+
+
+class EntityTree:
+    """
+    Immutable snapshot of XX_Entity held as parallel lists indexed by
+    position, with parent -> children adjacency and a leaf set.
+    """
+
+    FIELDS = ('id', 'entity', 'parent', 'alias_default')
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids = []
+        self.codes = []
+        self.parents = []
+        self.aliases = []
+        self.index_by_id = {}
+        index_by_code = {}
+        for entity_id, code, parent, alias in rows:
+            self.index_by_id[entity_id] = len(self.ids)
+            index_by_code[str(code).strip()] = len(self.ids)
+            self.ids.append(entity_id)
+            self.codes.append(code)
+            self.parents.append(parent)
+            self.aliases.append(alias)
+
+        self.children = [[] for _ in self.ids]
+        self.parent_index = [None] * len(self.ids)
+        for position, parent in enumerate(self.parents):
+            if parent in (None, ''):
+                continue
+            parent_position = index_by_code.get(str(parent).strip())
+            if parent_position is not None:
+                self.children[parent_position].append(position)
+                self.parent_index[position] = parent_position
+
+        self.leaf_positions = frozenset(
+            position for position, children in enumerate(self.children) if not children
+        )
+
+    @classmethod
+    def load(cls, version=None):
+        from .models import XX_Entity
+
+        rows = XX_Entity.objects.order_by('entity').values_list(*cls.FIELDS)
+        return cls(list(rows), version=version)
+
+    def _positions(self, entity_ids):
+        positions = []
+        for entity_id in entity_ids:
+            try:
+                position = self.index_by_id.get(int(entity_id))
+            except (TypeError, ValueError):
+                continue
+            if position is not None:
+                positions.append(position)
+        return positions
+
+    def descendant_positions(self, entity_ids):
+        """Positions of the given entities and all their descendants."""
+        collected = set()
+        stack = self._positions(entity_ids)
+        while stack:
+            position = stack.pop()
+            if position in collected:
+                continue
+            collected.add(position)
+            stack.extend(self.children[position])
+        return sorted(collected)
+
+    def descendant_ids(self, entity_ids):
+        return [self.ids[p] for p in self.descendant_positions(entity_ids)]
+
+    def leaf_ids(self, entity_ids):
+        """Descendants (including the entities themselves) that have no children."""
+        return [
+            self.ids[p] for p in self.descendant_positions(entity_ids) if p in self.leaf_positions
+        ]
+
+    def ancestor_ids(self, entity_id):
+        """Ids of the entity's parent, grandparent, ... up to the root."""
+        ancestors = []
+        positions = self._positions([entity_id])
+        seen = set(positions)
+        position = self.parent_index[positions[0]] if positions else None
+        while position is not None and position not in seen:
+            seen.add(position)
+            ancestors.append(self.ids[position])
+            position = self.parent_index[position]
+        return ancestors
+
+    def all_ids(self):
+        return list(self.ids)
+
+    def codes_for(self, entity_ids):
+        return [self.codes[p] for p in self._positions(entity_ids)]
+
+    def entities(self, entity_ids):
+        """XX_Entity instances for the given ids, built without a query."""
+        from .models import XX_Entity
+
+        return [
+            XX_Entity.from_db(
+                'default',
+                self.FIELDS,
+                (self.ids[p], self.codes[p], self.parents[p], self.aliases[p]),
+            )
+            for p in self._positions(entity_ids)
+        ]
+
+
+def _get_shared_tree_version():
+    try:
+        return cache.get_or_set(ENTITY_TREE_VERSION_KEY, 1, None)
+    except Exception as e:
+        logger.error(f"Error reading entity tree version: {str(e)}")
+        return None
+
+
+def get_entity_tree():
+    """
+    Return the current EntityTree, reloading it if another process has
+    bumped the shared version or the local copy is too old.
+    """
+    global _tree
+    max_age = getattr(settings, 'ENTITY_TREE_MAX_AGE', DEFAULT_ENTITY_TREE_MAX_AGE)
+    version = _get_shared_tree_version()
+
+    tree = _tree
+    if (
+        tree is not None
+        and tree.version == version
+        and time.monotonic() - tree.loaded_at < max_age
+    ):
+        return tree
+
+    with _tree_lock:
+        tree = _tree
+        if (
+            tree is None
+            or tree.version != version
+            or time.monotonic() - tree.loaded_at >= max_age
+        ):
+            tree = EntityTree.load(version=version)
+            _tree = tree
+    return tree
+
+
+def invalidate_entity_tree():
+    """Drop this worker's tree and bump the shared version for all others."""
+    global _tree
+    _tree = None
+    try:
+        try:
+            cache.incr(ENTITY_TREE_VERSION_KEY)
+        except ValueError:
+            cache.set(ENTITY_TREE_VERSION_KEY, 2, None)
+    except Exception as e:
+        logger.error(f"Error bumping entity tree version: {str(e)}")
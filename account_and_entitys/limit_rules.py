@@ -0,0 +1,144 @@
+"""
+Compiled XX_ACCOUNT_ENTITY_LIMIT transfer rules.
+
+Every validated transfer line needs the rule of its (entity, account) pair,
+and the rules only change when an admin edits them or uploads a new sheet.
+Each worker therefore keeps the whole table compiled into a dict keyed by
+(entity_id, account_id), with the Yes/No flags decoded, so a rule check is
+a dict lookup. Like the entity tree, the map is versioned through the shared
+cache: any limit change (signals, or invalidate_limit_rules() after writes
+that bypass them) bumps the version and every worker reloads on next use.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LIMIT_RULES_VERSION_KEY = 'limit_rules:version'
+
+# Upper bound (seconds) on how long a worker trusts its rules without seeing
+# the shared version, e.g. while the cache server is unreachable
+DEFAULT_LIMIT_RULES_MAX_AGE = 300
+
+# allowed is True/False for "Yes"/"No" and None for anything else (no rule
+# check applies); source_allowed/target_allowed are True only for "Yes"
+LimitRule = namedtuple('LimitRule', ['id', 'allowed', 'source_allowed', 'target_allowed'])
+
+_rules_lock = threading.Lock()
+_rules = None
+
+# Per-thread counters so the invalidations queued by many saves in one
+# transaction collapse into one version bump
+_changes = threading.local()
+
+
+def _decode_allowed(value):
+    if value == "Yes":
+        return True
+    if value == "No":
+        return False
+    return None
+
+
+class LimitRules(dict):
+    """{(entity_id, account_id): LimitRule} with the version it was loaded at."""
+
+    def __init__(self, rows, version=None):
+        super().__init__()
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # Rows come ordered by id; the first rule of a pair wins, like .first()
+        for rule_id, entity_id, account_id, allowed, source, target in rows:
+            self.setdefault(
+                (str(entity_id), str(account_id)),
+                LimitRule(rule_id, _decode_allowed(allowed), source == "Yes", target == "Yes"),
+            )
+
+    @classmethod
+    def load(cls, version=None):
+        from .models import XX_ACCOUNT_ENTITY_LIMIT
+
+        rows = XX_ACCOUNT_ENTITY_LIMIT.objects.order_by('id').values_list(
+            'id',
+            'entity_id',
+            'account_id',
+            'is_transer_allowed',
+            'is_transer_allowed_for_source',
+            'is_transer_allowed_for_target',
+        )
+        return cls(rows.iterator(chunk_size=2000), version=version)
+
+
+def _get_shared_version():
+    try:
+        return cache.get_or_set(LIMIT_RULES_VERSION_KEY, 1, None)
+    except Exception as e:
+        logger.error(f"Error reading limit rules version: {str(e)}")
+        return None
+
+
+def _is_current(rules, version, max_age):
+    return (
+        rules is not None
+        and rules.version == version
+        and time.monotonic() - rules.loaded_at < max_age
+    )
+
+
+def get_limit_rules():
+    """
+    Return the compiled LimitRules, reloading them if another process has
+    bumped the shared version or the local copy is too old.
+    """
+    global _rules
+    max_age = getattr(settings, 'LIMIT_RULES_MAX_AGE', DEFAULT_LIMIT_RULES_MAX_AGE)
+    version = _get_shared_version()
+
+    rules = _rules
+    if _is_current(rules, version, max_age):
+        return rules
+
+    with _rules_lock:
+        rules = _rules
+        if not _is_current(rules, version, max_age):
+            rules = LimitRules.load(version=version)
+            _rules = rules
+    return rules
+
+
+def get_limit_rule(entity_id, account_id):
+    """The LimitRule of an (entity, account) pair, or None if there is none."""
+    return get_limit_rules().get((str(entity_id), str(account_id)))
+
+
+def invalidate_limit_rules():
+    """Drop this worker's rules and bump the shared version for all others."""
+    global _rules
+    _rules = None
+    try:
+        try:
+            cache.incr(LIMIT_RULES_VERSION_KEY)
+        except ValueError:
+            cache.set(LIMIT_RULES_VERSION_KEY, 2, None)
+    except Exception as e:
+        logger.error(f"Error bumping limit rules version: {str(e)}")
+
+
+def schedule_limit_rules_invalidation():
+    """Invalidate the compiled rules once the current transaction commits."""
+    change = getattr(_changes, 'counter', 0) + 1
+    _changes.counter = change
+
+    def _invalidate():
+        if change <= getattr(_changes, 'invalidated_through', 0):
+            return
+        _changes.invalidated_through = _changes.counter
+        invalidate_limit_rules()
+
+    transaction.on_commit(_invalidate)
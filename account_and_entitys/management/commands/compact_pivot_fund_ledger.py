@@ -0,0 +1,32 @@
+"""
+Management command to fold pending pivot fund movements into the snapshot.
+
+Transfers append their encumbrance/actual movements to
+XX_PIVOT_FUND_MOVEMENT_XX instead of updating XX_PivotFund, and balances are
+read as snapshot + pending movements. Schedule this (e.g. every few minutes
+from cron) so the pending part stays small and balance reads stay fast.
+
+Usage: python manage.py compact_pivot_fund_ledger [--max-movements N]
+"""
+
+from django.core.management.base import BaseCommand
+
+from public_funtion.update_pivot_fund import compact_pivot_fund_ledger
+
+
+class Command(BaseCommand):
+    help = "Fold pending XX_PivotFundMovement rows into the XX_PivotFund snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-movements',
+            type=int,
+            default=None,
+            help='Compact at most about this many movements per run (default: all pending)',
+        )
+
+    def handle(self, *args, **options):
+        movements, funds = compact_pivot_fund_ledger(options['max_movements'])
+        self.stdout.write(
+            self.style.SUCCESS(f"Compacted {movements} movements into {funds} pivot funds")
+        )
@@ -0,0 +1,21 @@
+"""
+Management command to recompute XX_Account.is_leaf for every account.
+
+The flag is refreshed automatically when an account is saved or deleted
+through the ORM. Run this after loading accounts with raw SQL or any other
+path that bypasses Django signals.
+
+Usage: python manage.py rebuild_account_leaf_flags
+"""
+
+from django.core.management.base import BaseCommand
+
+from account_and_entitys.account_tree import refresh_account_leaf_flags
+
+
+class Command(BaseCommand):
+    help = "Recompute the is_leaf flag of every XX_Account"
+
+    def handle(self, *args, **options):
+        updated = refresh_account_leaf_flags()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed leaf flag on {updated} accounts"))
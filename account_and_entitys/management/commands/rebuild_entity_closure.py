@@ -0,0 +1,21 @@
+"""
+Management command to rebuild the XX_Entity closure table.
+
+XX_ENTITY_CLOSURE_XX is rebuilt automatically whenever an entity is saved or
+deleted through the ORM. Run this after loading entities with raw SQL or any
+other path that bypasses Django signals.
+
+Usage: python manage.py rebuild_entity_closure
+"""
+
+from django.core.management.base import BaseCommand
+
+from account_and_entitys.entity_tree import rebuild_entity_closure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ancestor/descendant closure table of XX_Entity"
+
+    def handle(self, *args, **options):
+        rows = rebuild_entity_closure()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt entity closure table with {rows} rows"))
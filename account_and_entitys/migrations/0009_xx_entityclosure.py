@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+def populate_entity_closure(apps, schema_editor):
+    from account_and_entitys.entity_tree import rebuild_entity_closure
+
+    rebuild_entity_closure(
+        entity_model=apps.get_model('account_and_entitys', 'XX_Entity'),
+        closure_model=apps.get_model('account_and_entitys', 'XX_EntityClosure'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account_and_entitys', '0008_alter_xx_account_account_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XX_EntityClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor_id', models.IntegerField()),
+                ('descendant_id', models.IntegerField()),
+                ('depth', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'XX_ENTITY_CLOSURE_XX',
+                'unique_together': {('ancestor_id', 'descendant_id')},
+            },
+        ),
+        migrations.RunPython(populate_entity_closure, migrations.RunPython.noop),
+    ]
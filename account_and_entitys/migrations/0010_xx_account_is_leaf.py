@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+def populate_account_leaf_flags(apps, schema_editor):
+    from account_and_entitys.account_tree import refresh_account_leaf_flags
+
+    refresh_account_leaf_flags(account_model=apps.get_model('account_and_entitys', 'XX_Account'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account_and_entitys', '0009_xx_entityclosure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xx_account',
+            name='is_leaf',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(populate_account_leaf_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account_and_entitys', '0010_xx_account_is_leaf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XX_PivotFundMovement',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('encumbrance_delta', models.DecimalField(decimal_places=2, default=0, max_digits=30)),
+                ('actual_delta', models.DecimalField(decimal_places=2, default=0, max_digits=30)),
+                ('decide', models.IntegerField()),
+                ('transaction_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('snapshot_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('pivot_fund', models.ForeignKey(db_column='pivot_fund_id', on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='account_and_entitys.xx_pivotfund')),
+            ],
+            options={
+                'db_table': 'XX_PIVOT_FUND_MOVEMENT_XX',
+                'indexes': [models.Index(fields=['pivot_fund', 'snapshot_id'], name='xx_pf_movement_pending_idx')],
+            },
+        ),
+    ]
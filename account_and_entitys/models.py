@@ -6,6 +6,7 @@ class XX_Account(models.Model):
     account = models.CharField(max_length=50, unique=True)
     parent = models.CharField(max_length=50, null=True, blank=True)  # Changed from EncryptedCharField
     alias_default = models.CharField(max_length=255, null=True, blank=True)  # Changed from EncryptedCharField
+    is_leaf = models.BooleanField(default=True)  # Maintained by signals: no other account has this one as parent
    
     def __str__(self):
         return str(self.account)
@@ -25,6 +26,19 @@ class XX_Entity(models.Model):
     class Meta:
      db_table = 'XX_Entity_XX'
  
+class XX_EntityClosure(models.Model):
+    """Ancestor/descendant pairs of the XX_Entity hierarchy (every entity is its own ancestor at depth 0)"""
+    ancestor_id = models.IntegerField()
+    descendant_id = models.IntegerField()
+    depth = models.IntegerField(default=0)
+ 
+    def __str__(self):
+        return f"Entity {self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+ 
+    class Meta:
+        db_table = 'XX_ENTITY_CLOSURE_XX'
+        unique_together = ('ancestor_id', 'descendant_id')
+ 
 class XX_PivotFund(models.Model):
     """Model representing ADJD pivot funds"""
     entity = models.CharField(max_length=50)
@@ -44,7 +58,27 @@ class XX_PivotFund(models.Model):
             )
         ]
         db_table = 'XX_PivotFund_XX'
- 
+
+class XX_PivotFundMovement(models.Model):
+    """Append-only encumbrance/actual movement of a pivot fund (XX_PivotFund holds the compacted snapshot)"""
+    id = models.BigAutoField(primary_key=True)
+    pivot_fund = models.ForeignKey(XX_PivotFund, on_delete=models.CASCADE, db_column='pivot_fund_id', related_name='movements')
+    encumbrance_delta = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    actual_delta = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    decide = models.IntegerField()  # 1 submitted, 2 approved, 3 rejected
+    transaction_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    snapshot_id = models.BigIntegerField(null=True, blank=True, db_index=True)  # Set once folded into the snapshot
+
+    def __str__(self):
+        return f"Movement {self.id} of pivot fund {self.pivot_fund_id}"
+
+    class Meta:
+        db_table = 'XX_PIVOT_FUND_MOVEMENT_XX'
+        indexes = [
+            models.Index(fields=['pivot_fund', 'snapshot_id'], name='xx_pf_movement_pending_idx'),
+        ]
+
 class XX_TransactionAudit(models.Model):
     """Model representing ADJD transaction audit records"""
     id = models.AutoField(primary_key=True)
@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from .models import XX_Account, XX_Entity, XX_PivotFund, XX_TransactionAudit, XX_ACCOUNT_ENTITY_LIMIT
+from public_funtion.update_pivot_fund import pivot_fund_balance
 
 class AccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = XX_Account
         fields = '__all__'
+        read_only_fields = ('is_leaf',)
 
 class EntitySerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,6 +18,22 @@ class PivotFundSerializer(serializers.ModelSerializer):
         model = XX_PivotFund
         fields = '__all__'
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Funds loaded through with_pivot_fund_balances() report snapshot + pending ledger movements
+        if hasattr(instance, 'pending_encumbrance'):
+            encumbrance, actual = pivot_fund_balance(instance)
+            if instance.encumbrance is not None or instance.pending_encumbrance:
+                data['encumbrance'] = self.fields['encumbrance'].to_representation(encumbrance)
+            if instance.actual is not None or instance.pending_actual:
+                data['actual'] = self.fields['actual'].to_representation(actual)
+        return data
+
+class PivotFundUpdateSerializer(PivotFundSerializer):
+    """Balances move only through the movement ledger, so updates cannot write them"""
+    class Meta(PivotFundSerializer.Meta):
+        read_only_fields = ('encumbrance', 'actual')
+
 class TransactionAuditSerializer(serializers.ModelSerializer):
     class Meta:
         model = XX_TransactionAudit
@@ -0,0 +1,103 @@
+"""
+Django signals for account_and_entitys models
+Keep derived hierarchy data in step with XX_Entity and XX_Account changes,
+and the compiled transfer rules in step with XX_ACCOUNT_ENTITY_LIMIT
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import XX_Account, XX_Entity, XX_ACCOUNT_ENTITY_LIMIT
+from .account_tree import refresh_account_leaf_flags
+from .entity_tree import schedule_entity_closure_rebuild
+from .limit_rules import schedule_limit_rules_invalidation
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# XX_Entity Signals
+# ============================================================================
+
+
+@receiver(post_save, sender=XX_Entity)
+@receiver(post_delete, sender=XX_Entity)
+def entity_changed(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving or deleting XX_Entity
+    Rebuilds the entity closure table once the change is committed
+    """
+    try:
+        schedule_entity_closure_rebuild()
+    except Exception as e:
+        logger.error(f"Error in entity_changed: {str(e)}")
+
+
+# ============================================================================
+# XX_Account Signals
+# ============================================================================
+
+
+def _changes_hierarchy(update_fields):
+    return update_fields is None or bool({'account', 'parent'} & set(update_fields))
+
+
+@receiver(pre_save, sender=XX_Account)
+def account_pre_save(sender, instance, **kwargs):
+    """
+    Function executed BEFORE saving XX_Account
+    Remembers the stored account/parent so both old and new parents are refreshed.
+    Inserts and saves whose update_fields leave account and parent alone
+    need no lookup
+    """
+    instance._previous_codes = ()
+    if not instance.pk or not _changes_hierarchy(kwargs.get('update_fields')):
+        return
+    instance._previous_codes = (
+        sender.objects.filter(pk=instance.pk).values_list('account', 'parent').first() or ()
+    )
+
+
+@receiver(post_save, sender=XX_Account)
+def account_post_save(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving XX_Account
+    Refreshes the leaf flag of the account and of its old and new parents
+    """
+    if not _changes_hierarchy(kwargs.get('update_fields')):
+        return
+    try:
+        codes = {instance.account, instance.parent, *getattr(instance, '_previous_codes', ())}
+        transaction.on_commit(lambda: refresh_account_leaf_flags(codes))
+    except Exception as e:
+        logger.error(f"Error in account_post_save: {str(e)}")
+
+
+@receiver(post_delete, sender=XX_Account)
+def account_post_delete(sender, instance, **kwargs):
+    """
+    Function executed AFTER deleting XX_Account
+    Its parent may have become a leaf
+    """
+    try:
+        codes = {instance.parent}
+        transaction.on_commit(lambda: refresh_account_leaf_flags(codes))
+    except Exception as e:
+        logger.error(f"Error in account_post_delete: {str(e)}")
+
+
+# ============================================================================
+# XX_ACCOUNT_ENTITY_LIMIT Signals
+# ============================================================================
+
+
+@receiver(post_save, sender=XX_ACCOUNT_ENTITY_LIMIT)
+@receiver(post_delete, sender=XX_ACCOUNT_ENTITY_LIMIT)
+def account_entity_limit_changed(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving or deleting XX_ACCOUNT_ENTITY_LIMIT
+    Retires every worker's compiled transfer rules once the change is committed
+    """
+    try:
+        schedule_limit_rules_invalidation()
+    except Exception as e:
+        logger.error(f"Error in account_entity_limit_changed: {str(e)}")
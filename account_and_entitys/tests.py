@@ -0,0 +1,211 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from budget_management.models import get_zero_level_accounts
+from public_funtion.update_pivot_fund import (
+    APPROVE,
+    REJECT,
+    SUBMIT,
+    apply_pivot_fund_updates,
+    compact_pivot_fund_ledger,
+    pivot_fund_balance,
+    pivot_fund_deltas,
+    with_pivot_fund_balances,
+)
+
+from .account_tree import refresh_account_leaf_flags
+from .entity_tree import ENTITY_TREE_VERSION_KEY, get_descendant_ids, get_entity_tree, invalidate_entity_tree
+from .limit_rules import LIMIT_RULES_VERSION_KEY, get_limit_rule, invalidate_limit_rules
+from .models import (
+    XX_ACCOUNT_ENTITY_LIMIT,
+    XX_Account,
+    XX_Entity,
+    XX_EntityClosure,
+    XX_PivotFund,
+    XX_PivotFundMovement,
+)
+
+
+class PivotFundDeltasTests(SimpleTestCase):
+    def test_submit_encumbers_the_source_amount(self):
+        self.assertEqual(pivot_fund_deltas("100", "0", SUBMIT), (Decimal("100"), Decimal("0")))
+        self.assertEqual(pivot_fund_deltas(0, 50, SUBMIT), (Decimal("0"), Decimal("0")))
+
+    def test_approve_releases_the_source_and_credits_the_target(self):
+        self.assertEqual(pivot_fund_deltas("100", "0", APPROVE), (Decimal("-100"), Decimal("0")))
+        self.assertEqual(pivot_fund_deltas("0", "40.50", APPROVE), (Decimal("0"), Decimal("40.50")))
+
+    def test_reject_adds_the_source_amount_back(self):
+        self.assertEqual(pivot_fund_deltas("100", "0", REJECT), (Decimal("100"), Decimal("0")))
+        self.assertEqual(pivot_fund_deltas("0", "40", REJECT), (Decimal("0"), Decimal("0")))
+
+    def test_empty_amounts_count_as_zero(self):
+        for decide in (SUBMIT, APPROVE, REJECT):
+            with self.subTest(decide=decide):
+                self.assertEqual(pivot_fund_deltas(None, " ", decide), (Decimal("0"), Decimal("0")))
+
+
+class PivotFundLedgerTests(TestCase):
+    def setUp(self):
+        self.source = XX_PivotFund.objects.create(entity="1000", account="5000", year=2025, encumbrance=Decimal("10"))
+        self.target = XX_PivotFund.objects.create(entity="1001", account="5000", year=2025, actual=None)
+
+    def balance(self, fund):
+        return pivot_fund_balance(with_pivot_fund_balances(XX_PivotFund.objects.filter(pk=fund.pk)).get())
+
+    def test_movements_are_appended_without_touching_the_snapshot(self):
+        result = apply_pivot_fund_updates(
+            [(1000, 5000, "100", "0"), (1001, 5000, "0", "100")], SUBMIT, year=2025, transaction_id=1
+        )
+        self.assertEqual(result["missing"], [])
+        self.assertEqual(result["updated"][0]["encumbrance_new_value"], Decimal("110"))
+        # Only the source line moves on submit
+        self.assertEqual(XX_PivotFundMovement.objects.count(), 1)
+        self.source.refresh_from_db()
+        self.assertEqual(self.source.encumbrance, Decimal("10"))
+        self.assertEqual(self.balance(self.source), (Decimal("110"), Decimal("0")))
+
+    def test_missing_pivot_fund_records_nothing(self):
+        result = apply_pivot_fund_updates([(1000, 5000, "5", "0"), (9999, 5000, "5", "0")], SUBMIT, year=2025)
+        self.assertEqual(result["updated"], [])
+        self.assertEqual([line["cost_center_code"] for line in result["missing"]], [9999])
+        self.assertFalse(XX_PivotFundMovement.objects.exists())
+
+    def test_compaction_folds_movements_into_the_snapshot_once(self):
+        lines = [(1000, 5000, "100", "0"), (1001, 5000, "0", "100")]
+        apply_pivot_fund_updates(lines, SUBMIT, year=2025)
+        apply_pivot_fund_updates(lines, APPROVE, year=2025)
+        before = self.balance(self.source), self.balance(self.target)
+
+        # The source's submit and approval cancel out, so only the target changes
+        self.assertEqual(compact_pivot_fund_ledger(), (3, 1))
+        self.assertEqual((self.balance(self.source), self.balance(self.target)), before)
+        self.target.refresh_from_db()
+        self.assertEqual(self.target.actual, Decimal("100"))
+        self.assertFalse(XX_PivotFundMovement.objects.filter(snapshot_id__isnull=True).exists())
+        self.assertEqual(compact_pivot_fund_ledger(), (0, 0))
+
+
+class AccountLeafFlagTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.root = XX_Account.objects.create(account="5000")
+            self.other = XX_Account.objects.create(account="6000")
+
+    def leaf_flags(self):
+        return dict(XX_Account.objects.values_list("account", "is_leaf"))
+
+    def test_adding_and_removing_children_flips_the_parent(self):
+        self.assertEqual(self.leaf_flags(), {"5000": True, "6000": True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            child = XX_Account.objects.create(account="5100", parent="5000")
+        self.assertEqual(self.leaf_flags(), {"5000": False, "5100": True, "6000": True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            child.parent = "6000"
+            child.save()
+        self.assertEqual(self.leaf_flags(), {"5000": True, "5100": True, "6000": False})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            child.delete()
+        self.assertEqual(self.leaf_flags(), {"5000": True, "6000": True})
+
+    def test_refresh_repairs_flags_written_around_the_signals(self):
+        XX_Account.objects.bulk_create([XX_Account(account="5100", parent="5000")])
+        self.assertTrue(self.leaf_flags()["5000"])
+        self.assertEqual(refresh_account_leaf_flags(["5000"]), 1)
+        self.assertEqual(self.leaf_flags(), {"5000": False, "5100": True, "6000": True})
+
+        XX_Account.objects.filter(account="5100").delete()
+        refresh_account_leaf_flags()
+        self.assertEqual(self.leaf_flags(), {"5000": True, "6000": True})
+
+    def test_saves_that_leave_the_hierarchy_alone_skip_the_lookup(self):
+        self.root.alias_default = "Salaries"
+        with self.assertNumQueries(1):
+            self.root.save(update_fields=["alias_default"])
+
+    def test_zero_level_accounts_stay_a_queryset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            XX_Account.objects.create(account="5100", parent="5000")
+        accounts = get_zero_level_accounts(XX_Account.objects.order_by("account"))
+        self.assertEqual(list(accounts.filter(account__icontains="5").values_list("account", flat=True)), ["5100"])
+
+
+class LimitRulesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_limit_rules()
+
+    def test_rules_are_decoded(self):
+        XX_ACCOUNT_ENTITY_LIMIT.objects.create(
+            entity_id="1000", account_id="5000", is_transer_allowed="Yes",
+            is_transer_allowed_for_source="Yes", is_transer_allowed_for_target="No",
+        )
+        rule = get_limit_rule(1000, 5000)
+        self.assertEqual((rule.allowed, rule.source_allowed, rule.target_allowed), (True, True, False))
+        self.assertIsNone(get_limit_rule(1000, 5001))
+
+    def test_changes_reload_the_rules_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            limit = XX_ACCOUNT_ENTITY_LIMIT.objects.create(entity_id="1000", account_id="5000", is_transer_allowed="Yes")
+        self.assertTrue(get_limit_rule(1000, 5000).allowed)
+
+        version = cache.get(LIMIT_RULES_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            limit.is_transer_allowed = "No"
+            limit.save()
+            XX_ACCOUNT_ENTITY_LIMIT.objects.create(entity_id="1001", account_id="5000", is_transer_allowed="No")
+            # Not visible before the commit
+            self.assertTrue(get_limit_rule(1000, 5000).allowed)
+        # Both saves collapse into one version bump
+        self.assertEqual(cache.get(LIMIT_RULES_VERSION_KEY), version + 1)
+        self.assertFalse(get_limit_rule(1000, 5000).allowed)
+        self.assertFalse(get_limit_rule(1001, 5000).allowed)
+
+
+class EntityTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ids = {}
+        for entity, parent in (("1", None), ("2", "1"), ("3", "2"), ("4", "1"), ("9", None)):
+            self.ids[entity] = XX_Entity.objects.create(entity=entity, parent=parent).id
+        invalidate_entity_tree()
+
+    def test_hierarchy_lookups(self):
+        tree = get_entity_tree()
+        ids = self.ids
+        self.assertEqual(sorted(tree.descendant_ids([ids["1"]])), sorted([ids["1"], ids["2"], ids["3"], ids["4"]]))
+        self.assertEqual(sorted(tree.leaf_ids([ids["1"]])), sorted([ids["3"], ids["4"]]))
+        self.assertEqual(tree.ancestor_ids(ids["3"]), [ids["2"], ids["1"]])
+        self.assertEqual(tree.codes_for([ids["9"]]), ["9"])
+
+    def test_entity_changes_reload_the_tree_once_committed(self):
+        self.assertEqual(get_entity_tree().descendant_ids([self.ids["9"]]), [self.ids["9"]])
+        version = cache.get(ENTITY_TREE_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            child = XX_Entity.objects.create(entity="10", parent="9")
+            grandchild = XX_Entity.objects.create(entity="11", parent="10")
+            self.assertEqual(get_entity_tree().descendant_ids([self.ids["9"]]), [self.ids["9"]])
+        # Both saves collapse into one version bump
+        self.assertEqual(cache.get(ENTITY_TREE_VERSION_KEY), version + 1)
+        self.assertEqual(
+            sorted(get_entity_tree().descendant_ids([self.ids["9"]])),
+            sorted([self.ids["9"], child.id, grandchild.id]),
+        )
+
+    def test_entity_changes_rebuild_the_closure_table_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            child = XX_Entity.objects.create(entity="10", parent="9")
+        self.assertEqual(
+            sorted(get_descendant_ids([self.ids["9"]]).values_list("descendant_id", flat=True)),
+            sorted([self.ids["9"], child.id]),
+        )
+        self.assertEqual(XX_EntityClosure.objects.get(ancestor_id=self.ids["1"], descendant_id=self.ids["3"]).depth, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            child.delete()
+        self.assertFalse(XX_EntityClosure.objects.filter(descendant_id=child.id).exists())
@@ -6,8 +6,12 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 
 from budget_management.models import get_entities_with_children, get_level_zero_children, get_zero_level_accounts
+from .entity_tree import get_entity_tree
+from public_funtion.keyset_pagination import get_keyset_page_size, paginate_by_keyset
+from public_funtion.update_pivot_fund import with_pivot_fund_balances
+from public_funtion.excel_stream import iter_excel_batches
 from .models import XX_Account, XX_Entity, XX_PivotFund, XX_TransactionAudit, XX_ACCOUNT_ENTITY_LIMIT
-from .serializers import AccountSerializer, EntitySerializer, PivotFundSerializer, TransactionAuditSerializer, AccountEntityLimitSerializer
+from .serializers import AccountSerializer, EntitySerializer, PivotFundSerializer, PivotFundUpdateSerializer, TransactionAuditSerializer, AccountEntityLimitSerializer
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser
@@ -149,15 +153,15 @@ class EntityListView(APIView):
     def get(self, request):
         # 🔹 Apply permissions filter
         if request.user.abilities.count() > 0:
-            entity_ids = [ability.Entity.id for ability in request.user.abilities.all() if ability.Entity]
-            # Get all accessible entities including their children
-            entities = get_entities_with_children(entity_ids)
+            entity_ids = list(
+                request.user.abilities.filter(Entity__isnull=False).values_list('Entity_id', flat=True)
+            )
         else:
-            # If no permissions filter, get all entities
-            entities = list(XX_Entity.objects.all().order_by('entity'))
+            # If no permissions filter, start from all entities
+            entity_ids = get_entity_tree().all_ids()
         
-        # 🔹 Get only level zero children from the accessible entities
-        level_zero_entities = get_level_zero_children([e.id for e in entities])
+        # 🔹 Get only level zero children from the accessible entities (and their children)
+        level_zero_entities = get_level_zero_children(entity_ids)
         
         # 🔹 Apply search filter
         search_query = request.query_params.get("search")
@@ -264,9 +268,14 @@ class EntityDeleteView(APIView):
 
 # PivotFund views
 class PivotFundListView(APIView):
-    """List all pivot funds"""
+    """List all pivot funds
+
+    Pass ``cursor`` (empty for the first page) to use keyset pagination on
+    (year, entity, account) instead of page numbers.
+    """
     permission_classes = [IsAuthenticated]
     pagination_class = EntityPagination
+    keyset_ordering = ('-year', 'entity', 'account')
     
     def get(self, request):
         # Allow filtering by entity, account, and year
@@ -274,7 +283,7 @@ class PivotFundListView(APIView):
         account_id = request.query_params.get('account')
         year = request.query_params.get('year')
         
-        pivot_funds = XX_PivotFund.objects.all()
+        pivot_funds = with_pivot_fund_balances(XX_PivotFund.objects.all())
         
         if entity_id:
             pivot_funds = pivot_funds.filter(entity=entity_id)
@@ -283,8 +292,22 @@ class PivotFundListView(APIView):
         if year:
             pivot_funds = pivot_funds.filter(year=year)
         
-        # Order by year, entity, account
-        pivot_funds = pivot_funds.order_by('-year', 'entity__entity', 'account__account')
+        # Order by year, entity, account (entity and account are plain code columns)
+        pivot_funds = pivot_funds.order_by(*self.keyset_ordering)
+
+        if 'cursor' in request.query_params:
+            page_size = get_keyset_page_size(request, self.pagination_class.page_size, self.pagination_class.max_page_size)
+            try:
+                page, next_cursor = paginate_by_keyset(
+                    pivot_funds, self.keyset_ordering, request.query_params.get('cursor'), page_size
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'results': PivotFundSerializer(page, many=True).data,
+                'next_cursor': next_cursor,
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+            })
         
         # Handle pagination
         paginator = self.pagination_class()
@@ -349,7 +372,7 @@ class PivotFundDetailView(APIView):
     def get_object(self, entity,account):
         try:
            
-            return XX_PivotFund.objects.get(entity=entity,account=account)
+            return with_pivot_fund_balances(XX_PivotFund.objects.all()).get(entity=entity,account=account)
         
         except XX_PivotFund.DoesNotExist:
             
@@ -389,9 +412,12 @@ class PivotFundUpdateView(APIView):
             return Response({
                 'message': 'Pivot fund not found.'
             }, status=status.HTTP_404_NOT_FOUND)
-        serializer = PivotFundSerializer(pivot_fund, data=request.data)
+        # encumbrance/actual are read as snapshot + pending movements; writing
+        # them back would count the pending movements twice
+        serializer = PivotFundUpdateSerializer(pivot_fund, data=request.data)
         if serializer.is_valid():
             updated_fund = serializer.save()
+            updated_fund = with_pivot_fund_balances(XX_PivotFund.objects.all()).get(pk=updated_fund.pk)
             return Response({
                 'message': 'Pivot fund updated successfully.',
                 'data': PivotFundSerializer(updated_fund).data
@@ -615,22 +641,11 @@ class AccountEntityLimitAPI(APIView):
     def _handle_file_upload(self, file):
         """Process Excel file for bulk creation"""
         try:
-            # Read Excel file
-            df = pd.read_excel(file)
-            
-            # Clean column names (convert to lowercase and strip whitespace)
-            df.columns = df.columns.str.strip().str.lower()
-            df = df.replace([np.nan, pd.NA, pd.NaT, '', 'NULL', 'null'], None)
-
-
-            # Convert to list of dictionaries
-            records = df.to_dict('records')
-            
             created_count = 0
             errors = []
             
             with transaction.atomic():
-                for idx, record in enumerate(records, start=1):
+                for idx, record in enumerate(self._iter_file_records(file), start=1):
                     try:
                         serializer = AccountEntityLimitSerializer(data=record)
                         if serializer.is_valid():
@@ -664,6 +679,15 @@ class AccountEntityLimitAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def _iter_file_records(self, file):
+        """Rows of the uploaded sheet as dictionaries, streamed batch by batch"""
+        # Clean column names (convert to lowercase and strip whitespace)
+        for df in iter_excel_batches(file, normalize_header=lambda name: name.strip().lower()):
+            df = df.astype(object).replace([np.nan, pd.NA, pd.NaT, '', 'NULL', 'null'], None)
+
+            # Convert to list of dictionaries
+            yield from df.to_dict('records')
+
     def _handle_single_record(self, data):
         """Handle single record creation"""
         serializer = AccountEntityLimitSerializer(data=data)
@@ -12,4 +12,10 @@ class AdjdTransactionTransferSerializer(serializers.ModelSerializer):
     
    
 
-    
\ No newline at end of file
+    
+
+class AdjdTransactionTransferBulkSerializer(AdjdTransactionTransferSerializer):
+    """Validates one line of a batch whose transaction has already been looked up once"""
+    class Meta(AdjdTransactionTransferSerializer.Meta):
+        fields = None
+        exclude = ('transaction',)
@@ -0,0 +1,300 @@
+import io
+
+import pandas as pd
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from account_and_entitys.limit_rules import invalidate_limit_rules
+from account_and_entitys.models import XX_ACCOUNT_ENTITY_LIMIT, XX_PivotFund, XX_PivotFundMovement
+from budget_management.models import xx_BudgetTransfer
+from user_management.models import xx_User
+from public_funtion.excel_stream import iter_excel_batches, read_excel_columns
+
+from .models import xx_TransactionTransfer
+from .transfer_import import TransferSheetImport
+from .views import validate_adjd_transaction, validate_adjd_transcation_transfer, validate_adjd_transfer_lines
+
+
+def make_workbook(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    file = io.BytesIO()
+    workbook.save(file)
+    file.seek(0)
+    file.name = "transfers.xlsx"
+    return file
+
+
+class ExcelStreamTests(SimpleTestCase):
+    def test_batches_are_indexed_by_excel_row(self):
+        file = make_workbook(
+            [["Cost Center Code", "Account Code"]]
+            + [[1000 + n, 5000] for n in range(5)]
+            + [[None, None]]
+            + [[2000, 5000]]
+        )
+        batches = list(iter_excel_batches(file, batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 2])
+        # Row 7 is empty and skipped
+        self.assertEqual([row for batch in batches for row in batch.index], [2, 3, 4, 5, 6, 8])
+        self.assertEqual(batches[-1].loc[8, "Cost Center Code"], 2000)
+
+    def test_headers_are_normalized_and_short_rows_padded(self):
+        file = make_workbook([[" Cost_Center_Code", None, "Account_Code"], [1000]])
+        normalize = lambda name: name.strip().lower()
+        self.assertEqual(read_excel_columns(file, normalize), ["cost_center_code", "unnamed: 1", "account_code"])
+
+        (batch,) = iter_excel_batches(file, normalize_header=normalize)
+        self.assertEqual(batch.loc[2].tolist(), [1000, None, None])
+
+    def test_sheet_without_rows(self):
+        self.assertEqual(list(iter_excel_batches(make_workbook([]))), [])
+        self.assertEqual(list(iter_excel_batches(make_workbook([["cost_center_code"]]))), [])
+
+
+def make_frame(rows, first_row=2):
+    return pd.DataFrame(
+        rows,
+        columns=["cost_center_code", "account_code", "from_center", "to_center"],
+        index=pd.Index(range(first_row, first_row + len(rows)), name="row"),
+    )
+
+
+class TransferSheetImportTests(TestCase):
+    def setUp(self):
+        self.transfer = xx_BudgetTransfer.objects.create(
+            amount=0, status="pending", transaction_date="x", code="FAR-0001"
+        )
+        for entity in ("1000", "1001", "1002"):
+            XX_PivotFund.objects.create(entity=entity, account="5000", year=2025)
+            XX_ACCOUNT_ENTITY_LIMIT.objects.create(
+                entity_id=entity,
+                account_id="5000",
+                is_transer_allowed="Yes",
+                is_transer_allowed_for_source="Yes",
+                is_transer_allowed_for_target="Yes",
+            )
+        XX_PivotFund.objects.create(entity="1003", account="5000", year=2025)
+        xx_TransactionTransfer.objects.create(transaction=self.transfer, cost_center_code=1002, account_code=5000)
+        invalidate_limit_rules()
+
+    def test_rows_are_checked_and_errors_keep_their_excel_row(self):
+        sheet = TransferSheetImport(self.transfer)
+        sheet.add_frame(make_frame([
+            [1000, 5000, 10, 0],
+            ["abc", 5000, 0, 10],
+            [1001, 5000, 5, 5],
+        ]))
+        sheet.add_frame(make_frame([
+            [1000.0, 5000, 0, 3],
+            [1002, 5000, 1, None],
+            [1003, 5000, -1, 0],
+            [1004, 5000, 1.005, 0],
+        ], first_row=10))
+
+        self.assertEqual([transfer.cost_center_code for transfer in sheet.transfers], [1000])
+        errors = {error["row"]: error["error"] for error in sheet.errors}
+        self.assertEqual(errors[3], ["cost_center_code: A valid integer is required."])
+        self.assertEqual(errors[4], ["Can't have value in both from and to at the same time"])
+        self.assertEqual(errors[10], ["Duplicate transfer for account code 5000 and cost center 1000 (Found: row 2)"])
+        self.assertEqual(errors[11], ["Duplicate transfer for account code 5000 and cost center 1002 (Found: existing line)"])
+        self.assertEqual(errors[12], [
+            "from amount must be positive",
+            "No transfer rules found for account 5000 and cost center 1003",
+        ])
+        self.assertEqual(errors[13], [
+            "from_center: Ensure that there are no more than 2 decimal places.",
+            "Code combination not found for 1004 and 5000",
+            "No transfer rules found for account 5000 and cost center 1004",
+        ])
+        self.assertEqual(sheet.errors[0]["data"], {
+            "cost_center_code": "abc", "account_code": 5000, "from_center": 0, "to_center": 10,
+        })
+
+    def test_save_returns_the_new_lines_with_their_ids(self):
+        sheet = TransferSheetImport(self.transfer)
+        sheet.add_frame(make_frame([[1000, 5000, 10, 0], [1001, 5000, 0, 10]]))
+        saved = sheet.save()
+
+        self.assertEqual([(line.cost_center_code, line.account_code) for line in saved], [(1000, 5000), (1001, 5000)])
+        self.assertTrue(all(line.transfer_id for line in saved))
+        self.assertEqual(xx_TransactionTransfer.objects.filter(transaction=self.transfer).count(), 3)
+        self.assertEqual(TransferSheetImport(self.transfer).save(), [])
+
+
+class TransferBatchCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="planner", role="user"))
+        self.transfer = xx_BudgetTransfer.objects.create(amount=0, status="pending", transaction_date="x", code="FAR-0001")
+        self.existing = xx_TransactionTransfer.objects.create(
+            transaction=self.transfer, cost_center_code=1002, account_code=5000, from_center=7
+        )
+
+    def post(self, lines):
+        return self.client.post(
+            reverse("adjd-transfer-create"),
+            [dict(line, transaction=self.transfer.pk) for line in lines],
+            format="json",
+        )
+
+    def test_mixed_batch_keeps_the_existing_lines(self):
+        response = self.post([
+            {"cost_center_code": 1000, "account_code": 5000, "from_center": "10.00", "to_center": "0"},
+            {"cost_center_code": "abc", "account_code": 5000, "from_center": "0", "to_center": "10.00"},
+            {"cost_center_code": 1001, "account_code": 5000, "from_center": "0", "to_center": "10.00"},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            list(xx_TransactionTransfer.objects.filter(transaction=self.transfer).values_list("transfer_id", flat=True)),
+            [self.existing.transfer_id],
+        )
+
+        valid_first, invalid, valid_last = response.data
+        self.assertEqual([item["index"] for item in response.data], [0, 1, 2])
+        for item in (valid_first, valid_last):
+            self.assertIs(item["saved"], False)
+            self.assertEqual(item["message"], "Not saved because other transfers in the batch are invalid")
+            self.assertNotIn("transfer_id", item["data"])
+        self.assertEqual(valid_first["data"]["cost_center_code"], 1000)
+        self.assertEqual(invalid["data"]["cost_center_code"], "abc")
+        self.assertIn("cost_center_code", invalid["error"])
+        self.assertNotIn("saved", invalid)
+
+    def test_valid_batch_replaces_the_lines(self):
+        response = self.post([
+            {"cost_center_code": 1000, "account_code": 5000, "from_center": "10.00", "to_center": "0"},
+            {"cost_center_code": 1001, "account_code": 5000, "from_center": "0", "to_center": "10.00"},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        saved = list(xx_TransactionTransfer.objects.filter(transaction=self.transfer).order_by("transfer_id"))
+        self.assertEqual([line.cost_center_code for line in saved], [1000, 1001])
+        self.assertEqual([item["transfer_id"] for item in response.data], [line.transfer_id for line in saved])
+        self.assertEqual([item["transaction"] for item in response.data], [self.transfer.pk] * 2)
+
+
+class TransferLineValidationTests(TestCase):
+    def setUp(self):
+        self.transfer = xx_BudgetTransfer.objects.create(amount=0, status="pending", transaction_date="x", code="FAR-0001")
+        XX_PivotFund.objects.create(entity="1000", account="5000", year=2025)
+        XX_PivotFund.objects.create(entity="1001", account="5000", year=2025)
+        XX_ACCOUNT_ENTITY_LIMIT.objects.create(
+            entity_id="1000", account_id="5000", is_transer_allowed="Yes",
+            is_transer_allowed_for_source="Yes", is_transer_allowed_for_target="No",
+        )
+        XX_ACCOUNT_ENTITY_LIMIT.objects.create(entity_id="1001", account_id="5000", is_transer_allowed="No")
+        invalidate_limit_rules()
+        for cost_center_code, from_center, to_center, actual in (
+            (1000, 10, 0, 100),
+            (1000, 0, 5, 100),
+            (1000, 1, 0, 100),
+            (1001, -5, 0, 100),
+            (1002, 0, -3, 0),
+            (1001, 50, 10, 20),
+        ):
+            xx_TransactionTransfer.objects.create(
+                transaction=self.transfer, cost_center_code=cost_center_code, account_code=5000,
+                from_center=from_center, to_center=to_center, approved_budget=0, available_budget=0,
+                encumbrance=0, actual=actual,
+            )
+
+    def validation_lines(self):
+        # Built the way the submit and list views build them
+        return [
+            {
+                "transaction_id": self.transfer.pk,
+                "from_center": float(line.from_center),
+                "to_center": float(line.to_center),
+                "approved_budget": float(line.approved_budget),
+                "available_budget": float(line.available_budget),
+                "encumbrance": float(line.encumbrance),
+                "actual": float(line.actual),
+                "cost_center_code": line.cost_center_code,
+                "account_code": line.account_code,
+                "transfer_id": line.transfer_id,
+            }
+            for line in xx_TransactionTransfer.objects.filter(transaction=self.transfer).order_by("transfer_id")
+        ]
+
+    def test_batch_and_per_line_errors_are_equal(self):
+        for code in ("FAR-0001", "AFR-0001"):
+            with self.subTest(code=code):
+                per_line = []
+                for line in self.validation_lines():
+                    errors = validate_adjd_transaction(line, code=code)
+                    per_line.append(validate_adjd_transcation_transfer(line, code=code, errors=errors))
+                batch = validate_adjd_transfer_lines(self.validation_lines(), code=code)
+
+                self.assertEqual(batch, per_line)
+                self.assertTrue(any(error.startswith("Duplicate transfer") for error in batch[0]))
+                self.assertTrue(all(errors for errors in batch))
+
+
+class TransferSubmitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="submitter", role="user"))
+        self.funds = {}
+        for year in (2024, 2025):
+            for entity in ("1000", "1001"):
+                self.funds[entity, year] = XX_PivotFund.objects.create(entity=entity, account="5000", year=year)
+
+    def make_transfer(self, fy):
+        transfer = xx_BudgetTransfer.objects.create(
+            amount=0, status="pending", status_level=1, transaction_date="x", code="FAR-0001", fy=fy
+        )
+        xx_TransactionTransfer.objects.create(
+            transaction=transfer, cost_center_code=1000, account_code=5000, from_center=10, to_center=0
+        )
+        xx_TransactionTransfer.objects.create(
+            transaction=transfer, cost_center_code=1001, account_code=5000, from_center=0, to_center=10
+        )
+        return transfer
+
+    def submit(self, transfer):
+        return self.client.post(reverse("adjd-transfer-submit"), {"transaction": transfer.pk}, format="json")
+
+    def test_lines_are_loaded_once(self):
+        transfer = self.make_transfer(2025)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit(transfer)
+        self.assertEqual(response.status_code, 200)
+        line_loads = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and 'FROM "XX_Transaction_Transfer_XX"' in query["sql"]
+        ]
+        self.assertEqual(len(line_loads), 1)
+
+    def test_pivot_funds_are_scoped_to_the_fiscal_year(self):
+        transfer = self.make_transfer(2025)
+        response = self.submit(transfer)
+
+        self.assertEqual(response.status_code, 200)
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status_level, 2)
+        # Only the source line moves on submit, against the 2025 fund
+        self.assertEqual(
+            list(XX_PivotFundMovement.objects.values_list("pivot_fund_id", flat=True)),
+            [self.funds["1000", 2025].pk],
+        )
+
+    def test_funds_in_several_years_need_a_fiscal_year(self):
+        transfer = self.make_transfer(None)
+        response = self.submit(transfer)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            [(line["cost_center_code"], line["error"]) for line in response.data["missing_pivot_funds"]],
+            [(1000, "Multiple pivot funds found"), (1001, "Multiple pivot funds found")],
+        )
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status_level, 1)
+        self.assertFalse(XX_PivotFundMovement.objects.exists())
@@ -0,0 +1,190 @@
+"""
+Excel import of transfer lines.
+
+Sheets are checked column by column with pandas instead of row by row
+through the serializer: amounts and codes are coerced in one pass, the
+business rules are vectorised, and the (cost center, account) pairs are
+matched against the pivot fund keys (one query for the whole sheet) and the
+compiled transfer rules. Valid rows are written with one bulk_create; every
+rejected row is reported with its Excel row number.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from account_and_entitys.limit_rules import get_limit_rules
+from budget_transfer.global_function.dashbaord import apply_smart_dashboard_line_delta
+from budget_transfer.global_function.dashboard_cache import invalidate_dashboard_cache
+from public_funtion.update_pivot_fund import find_pivot_fund_keys
+
+from .models import xx_TransactionTransfer
+
+REQUIRED_COLUMNS = ["cost_center_code", "account_code", "from_center", "to_center"]
+
+# xx_TransactionTransfer amounts are DecimalField(max_digits=15, decimal_places=2)
+MAX_AMOUNT = 10 ** 13
+
+
+def _clean_value(value):
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class TransferSheetImport:
+    """
+    Validates transfer sheet rows for one budget transfer and saves the valid ones.
+
+    Frames (indexed by Excel row number, as yielded by
+    public_funtion.excel_stream) can be added one batch at a time;
+    duplicates are detected across all of them and against the lines the
+    transfer already has.
+    """
+
+    def __init__(self, budget_transfer):
+        self.budget_transfer = budget_transfer
+        self.check_signs = (budget_transfer.code or "")[0:3] != "AFR"
+        self.transfers = []
+        self.errors = []
+        # (cost center, account) -> Excel row (0 for lines already saved)
+        self.seen = {
+            key: 0
+            for key in xx_TransactionTransfer.objects.filter(
+                transaction=budget_transfer
+            ).values_list("cost_center_code", "account_code")
+        }
+
+    def add_frame(self, df):
+        """Validate one DataFrame of sheet rows and queue its valid rows."""
+        if df.empty:
+            return
+        messages = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+
+        def flag(mask, message):
+            for index in mask[mask].index:
+                messages[index].append(message)
+
+        # Codes must be whole numbers (IntegerField); 1000.0 from Excel is fine
+        codes = {}
+        for column in ("cost_center_code", "account_code"):
+            values = pd.to_numeric(df[column], errors="coerce")
+            invalid = values.isna() | (values != values.round())
+            flag(invalid, f"{column}: A valid integer is required.")
+            codes[column] = values.where(~invalid)
+
+        # Empty amounts count as 0
+        amounts = {}
+        for column in ("from_center", "to_center"):
+            raw = df[column].replace(r"^\s*$", np.nan, regex=True)
+            values = pd.to_numeric(raw, errors="coerce")
+            flag(values.isna() & raw.notna(), f"{column}: A valid number is required.")
+            values = values.fillna(0)
+            flag((values.round(2) - values).abs() > 1e-9, f"{column}: Ensure that there are no more than 2 decimal places.")
+            flag(values.abs() >= MAX_AMOUNT, f"{column}: Ensure that there are no more than 15 digits in total.")
+            amounts[column] = values
+
+        from_center, to_center = amounts["from_center"], amounts["to_center"]
+        if self.check_signs:
+            flag(from_center < 0, "from amount must be positive")
+            flag(to_center < 0, "to amount must be positive")
+        flag((from_center > 0) & (to_center > 0), "Can't have value in both from and to at the same time")
+
+        has_codes = codes["cost_center_code"].notna() & codes["account_code"].notna()
+        cost_centers = codes["cost_center_code"].where(has_codes, 0).astype("int64")
+        accounts = codes["account_code"].where(has_codes, 0).astype("int64")
+
+        keys = {
+            (str(cost_center), str(account))
+            for cost_center, account in zip(cost_centers[has_codes], accounts[has_codes])
+        }
+        pivot_fund_keys = find_pivot_fund_keys(keys)
+        rules = get_limit_rules()
+
+        for index in has_codes[has_codes].index:
+            cost_center, account = int(cost_centers[index]), int(accounts[index])
+            key = (str(cost_center), str(account))
+
+            previous_row = self.seen.get((cost_center, account))
+            if previous_row is not None:
+                found = f"row {previous_row}" if previous_row else "existing line"
+                messages[index].append(
+                    f"Duplicate transfer for account code {account} and cost center {cost_center} (Found: {found})"
+                )
+            else:
+                self.seen[(cost_center, account)] = int(index)
+
+            if key not in pivot_fund_keys:
+                messages[index].append(f"Code combination not found for {cost_center} and {account}")
+
+            rule = rules.get(key)
+            if rule is None:
+                messages[index].append(
+                    f"No transfer rules found for account {account} and cost center {cost_center}"
+                )
+            elif rule.allowed is False:
+                messages[index].append(
+                    f"Not allowed to make transfer for {cost_center} and {account} according to the rules"
+                )
+            elif rule.allowed:
+                if from_center[index] > 0 and not rule.source_allowed:
+                    messages[index].append(
+                        f"Not allowed to make transfer for {cost_center} and {account} according to the rules (can't transfer from this account)"
+                    )
+                if to_center[index] > 0 and not rule.target_allowed:
+                    messages[index].append(
+                        f"Not allowed to make transfer for {cost_center} and {account} according to the rules (can't transfer to this account)"
+                    )
+
+        for index in df.index:
+            if messages[index]:
+                self.errors.append({
+                    "row": int(index),
+                    "error": messages[index],
+                    "data": {column: _clean_value(value) for column, value in df.loc[index].items()},
+                })
+            else:
+                self.transfers.append(xx_TransactionTransfer(
+                    transaction=self.budget_transfer,
+                    cost_center_code=int(cost_centers[index]),
+                    account_code=int(accounts[index]),
+                    from_center=Decimal(f"{from_center[index]:.2f}"),
+                    to_center=Decimal(f"{to_center[index]:.2f}"),
+                    # Default values for the other amounts
+                    approved_budget=0,
+                    available_budget=0,
+                    encumbrance=0,
+                    actual=0,
+                ))
+
+    def save(self):
+        """
+        Insert the queued valid rows with one bulk_create (all sheet batches
+        together). Returns the saved lines, read back with their ids.
+        """
+        if not self.transfers:
+            return []
+        # Imported pairs never clash with each other or with existing lines
+        keys = {(transfer.cost_center_code, transfer.account_code) for transfer in self.transfers}
+        with transaction.atomic():
+            xx_TransactionTransfer.objects.bulk_create(self.transfers)
+            # bulk_create sends no post_save signals
+            if self.budget_transfer.status == "approved":
+                apply_smart_dashboard_line_delta(
+                    added=[
+                        (line.cost_center_code, line.account_code, line.from_center, line.to_center)
+                        for line in self.transfers
+                    ]
+                )
+            transaction.on_commit(lambda: invalidate_dashboard_cache("normal", "smart"))
+            # Oracle does not return the ids of bulk inserted rows, so read the lines back
+            return [
+                line
+                for line in xx_TransactionTransfer.objects.filter(
+                    transaction=self.budget_transfer
+                ).order_by("transfer_id")
+                if (line.cost_center_code, line.account_code) in keys
+            ]
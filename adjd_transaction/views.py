@@ -4,22 +4,32 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .models import xx_TransactionTransfer
-from account_and_entitys.models import XX_Entity, XX_PivotFund, XX_ACCOUNT_ENTITY_LIMIT
+from account_and_entitys.models import XX_Entity, XX_PivotFund
+from account_and_entitys.limit_rules import get_limit_rule, get_limit_rules
 from budget_management.models import xx_BudgetTransfer
-from .serializers import AdjdTransactionTransferSerializer
+from .serializers import AdjdTransactionTransferSerializer, AdjdTransactionTransferBulkSerializer
+from .transfer_import import REQUIRED_COLUMNS, TransferSheetImport
 from decimal import Decimal
+from django.db import transaction
 from django.db.models import Sum
-from public_funtion.update_pivot_fund import update_pivot_fund
+from public_funtion.update_pivot_fund import apply_pivot_fund_updates, find_pivot_fund_keys, find_pivot_funds
+from public_funtion.excel_stream import iter_excel_batches, read_excel_columns
 from django.utils import timezone
 from user_management.models import xx_notification
+from budget_transfer.global_function.dashbaord import apply_smart_dashboard_line_delta
+from budget_transfer.global_function.dashboard_cache import invalidate_dashboard_cache
 import pandas as pd
 import io
 
 
-def validate_adjd_transaction(data, code=None):
+def validate_adjd_transaction(data, code=None, duplicate_ids=None):
     """
     Validate ADJD transaction transfer data against 10 business rules
     Returns a list of validation errors or empty list if valid
+
+    ``duplicate_ids`` (ids of the other lines of the transaction with the
+    same cost center and account) skips the duplicate lookup query; see
+    validate_adjd_transfer_lines().
     """
     errors = []
 
@@ -77,18 +87,20 @@ def validate_adjd_transaction(data, code=None):
             errors.append(" from value must be less or equal actual value")
 
     # Validation 5: Check for duplicate transfers (same transaction, from_account, to_account)
-    existing_transfers = xx_TransactionTransfer.objects.filter(
-        transaction=data["transaction_id"],
-        cost_center_code=data["cost_center_code"],
-        account_code=data["account_code"],
-    )
+    if duplicate_ids is None:
+        existing_transfers = xx_TransactionTransfer.objects.filter(
+            transaction=data["transaction_id"],
+            cost_center_code=data["cost_center_code"],
+            account_code=data["account_code"],
+        )
 
-    # If we're validating an existing record, exclude it from the duplicate check
-    if "transfer_id" in data and data["transfer_id"]:
-        existing_transfers = existing_transfers.exclude(transfer_id=data["transfer_id"])
+        # If we're validating an existing record, exclude it from the duplicate check
+        if "transfer_id" in data and data["transfer_id"]:
+            existing_transfers = existing_transfers.exclude(transfer_id=data["transfer_id"])
+        duplicate_ids = [t.transfer_id for t in existing_transfers[:3]]
 
-    if existing_transfers.exists():
-        duplicates = [f"ID: {t.transfer_id}" for t in existing_transfers[:3]]
+    if duplicate_ids:
+        duplicates = [f"ID: {transfer_id}" for transfer_id in duplicate_ids[:3]]
         errors.append(
             f"Duplicate transfer for account code {data['account_code']} and cost center {data['cost_center_code']} (Found: {', '.join(duplicates)})"
         )
@@ -96,22 +108,32 @@ def validate_adjd_transaction(data, code=None):
     return errors
 
 
-def validate_adjd_transcation_transfer(data, code=None, errors=None):
+def validate_adjd_transcation_transfer(data, code=None, errors=None, pivot_fund_keys=None, limit_rules=None):
+    """
+    Check the line's code combination and transfer rules, appending to ``errors``.
+
+    ``pivot_fund_keys`` (set of (entity, account) with a pivot fund) replaces
+    the per-line lookup when already loaded for the whole transaction. Rules
+    come from the compiled XX_ACCOUNT_ENTITY_LIMIT map (see limit_rules);
+    pass ``limit_rules`` to reuse one map for many lines.
+    """
     # Validation 1: Check for fund is available if not then no combination code
-    existing_code_combintion = XX_PivotFund.objects.filter(
-        entity=data["cost_center_code"], account=data["account_code"]
-    )
-    if not existing_code_combintion.exists():
+    if pivot_fund_keys is None:
+        has_code_combination = XX_PivotFund.objects.filter(
+            entity=data["cost_center_code"], account=data["account_code"]
+        ).exists()
+    else:
+        has_code_combination = (str(data["cost_center_code"]), str(data["account_code"])) in pivot_fund_keys
+    if not has_code_combination:
         errors.append(
             f"Code combination not found for {data['cost_center_code']} and {data['account_code']}"
         )
-    print("existing_code_combintion", type(data["cost_center_code"]),":", type(data["account_code"]))
     # Validation 2: Check if is allowed to make trasfer using this cost_center_code and account_code
-    allowed_to_make_transfer = XX_ACCOUNT_ENTITY_LIMIT.objects.filter(
-        entity_id=str(data["cost_center_code"]), account_id=str(data["account_code"])
-    ).first()
-    print("allowed_to_make_transfer", allowed_to_make_transfer)
-    
+    if limit_rules is None:
+        allowed_to_make_transfer = get_limit_rule(data["cost_center_code"], data["account_code"])
+    else:
+        allowed_to_make_transfer = limit_rules.get((str(data["cost_center_code"]), str(data["account_code"])))
+
     # Check if no matching record found
     if allowed_to_make_transfer is None:
         errors.append(
@@ -120,18 +142,18 @@ def validate_adjd_transcation_transfer(data, code=None, errors=None):
         return errors
     else:
         # Check transfer permissions if record exists
-        if allowed_to_make_transfer.is_transer_allowed == "No":
+        if allowed_to_make_transfer.allowed is False:
             errors.append(
                 f"Not allowed to make transfer for {data['cost_center_code']} and {data['account_code']} according to the rules"
             )
-        elif allowed_to_make_transfer.is_transer_allowed == "Yes":
+        elif allowed_to_make_transfer.allowed:
             if data["from_center"] > 0:
-                if allowed_to_make_transfer.is_transer_allowed_for_source != "Yes":
+                if not allowed_to_make_transfer.source_allowed:
                     errors.append(
                         f"Not allowed to make transfer for {data['cost_center_code']} and {data['account_code']} according to the rules (can't transfer from this account)"
                     )
             if data["to_center"] > 0:
-                if allowed_to_make_transfer.is_transer_allowed_for_target != "Yes":
+                if not allowed_to_make_transfer.target_allowed:
                     errors.append(
                         f"Not allowed to make transfer for {data['cost_center_code']} and {data['account_code']} according to the rules (can't transfer to this account)"
                     )
@@ -139,6 +161,46 @@ def validate_adjd_transcation_transfer(data, code=None, errors=None):
     return errors
 
 
+def validate_adjd_transfer_lines(lines, code=None):
+    """
+    Validate every line of one transaction at once.
+
+    ``lines`` are the validation dicts of ALL the transaction's lines (as
+    built for validate_adjd_transaction). Duplicates are found among the
+    lines themselves, pivot fund keys are loaded with one query for the
+    whole transaction and transfer rules come from the compiled rule map,
+    instead of three queries per line. Returns one error list per line,
+    identical to the per-line validators.
+    """
+    pivot_fund_keys = find_pivot_fund_keys(
+        {(str(line["cost_center_code"]), str(line["account_code"])) for line in lines}
+    )
+    limit_rules = get_limit_rules()
+
+    ids_by_key = {}
+    for line in sorted(lines, key=lambda line: line["transfer_id"] or 0):
+        ids_by_key.setdefault((line["cost_center_code"], line["account_code"]), []).append(line["transfer_id"])
+
+    results = []
+    for line in lines:
+        duplicate_ids = [
+            transfer_id
+            for transfer_id in ids_by_key[(line["cost_center_code"], line["account_code"])]
+            if transfer_id != line["transfer_id"]
+        ]
+        errors = validate_adjd_transaction(line, code=code, duplicate_ids=duplicate_ids)
+        results.append(
+            validate_adjd_transcation_transfer(
+                line,
+                code=code,
+                errors=errors,
+                pivot_fund_keys=pivot_fund_keys,
+                limit_rules=limit_rules,
+            )
+        )
+    return results
+
+
 class AdjdTransactionTransferCreateView(APIView):
     """Create new ADJD transaction transfers (single or batch)"""
 
@@ -168,13 +230,11 @@ class AdjdTransactionTransferCreateView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Delete all existing transfers for this transaction
-            xx_TransactionTransfer.objects.filter(
-                transaction=transaction_id
-            ).delete()
+            budget_transfer = xx_BudgetTransfer.objects.filter(pk=transaction_id).first()
 
-            # Process the new transfers
+            # Validate every transfer in memory before touching the database
             results = []
+            valid = []
             for index, transfer_data in enumerate(request.data):
                 # Make sure all items have the same transaction ID
                 if transfer_data.get("transaction") != transaction_id:
@@ -187,12 +247,22 @@ class AdjdTransactionTransferCreateView(APIView):
                     )
                     continue
 
-                # Validate and save each transfer
-                serializer = AdjdTransactionTransferSerializer(data=transfer_data)
+                if budget_transfer is None:
+                    # Let the full serializer report the unknown transaction
+                    serializer = AdjdTransactionTransferSerializer(data=transfer_data)
+                else:
+                    serializer = AdjdTransactionTransferBulkSerializer(data=transfer_data)
                 if serializer.is_valid():
-                    transfer = serializer.save()
-                    results.append(serializer.data)
-                    print(f"Transfer {index} created: {transfer}")
+                    valid.append(serializer)
+                    # Replaced by the saved line if the whole batch is valid
+                    results.append(
+                        {
+                            "index": index,
+                            "saved": False,
+                            "message": "Not saved because other transfers in the batch are invalid",
+                            "data": serializer.data,
+                        }
+                    )
                 else:
                     print(f"Validation errors for transfer at index {index}: {serializer.errors}")
                     results.append(
@@ -203,6 +273,33 @@ class AdjdTransactionTransferCreateView(APIView):
                         }
                     )
 
+            # All or nothing: keep the existing transfers if any item is invalid
+            if len(valid) == len(request.data):
+                transfers = [
+                    xx_TransactionTransfer(transaction=budget_transfer, **serializer.validated_data)
+                    for serializer in valid
+                ]
+                with transaction.atomic():
+                    # Replace all existing transfers for this transaction
+                    xx_TransactionTransfer.objects.filter(
+                        transaction=transaction_id
+                    ).delete()
+                    xx_TransactionTransfer.objects.bulk_create(transfers)
+                    # bulk_create sends no post_save signals
+                    if budget_transfer.status == "approved":
+                        apply_smart_dashboard_line_delta(
+                            added=[
+                                (line.cost_center_code, line.account_code, line.from_center, line.to_center)
+                                for line in transfers
+                            ]
+                        )
+                    transaction.on_commit(lambda: invalidate_dashboard_cache("normal", "smart"))
+                    # Oracle does not return the ids of bulk inserted rows, so read the lines back
+                    saved = xx_TransactionTransfer.objects.filter(
+                        transaction=transaction_id
+                    ).order_by("transfer_id")
+                    results = AdjdTransactionTransferSerializer(saved, many=True).data
+
             return Response(results, status=status.HTTP_207_MULTI_STATUS)
         else:
             # Handle single transfer
@@ -310,13 +407,15 @@ class AdjdTransactionTransferListView(APIView):
             else:
                 status = "waiting for approval"
 
-        transfers = xx_TransactionTransfer.objects.filter(
-            transaction=transaction_id
+        # Load the lines once; validation and totals both work on this list
+        transfers = list(
+            xx_TransactionTransfer.objects.filter(transaction=transaction_id)
         )
         serializer = AdjdTransactionTransferSerializer(transfers, many=True)
 
         # Create response with validation for each transfer
         response_data = []
+        validation_lines = []
 
         for transfer_data in serializer.data:
             from_center_val = transfer_data.get("from_center", 0)
@@ -344,13 +443,13 @@ class AdjdTransactionTransferListView(APIView):
                 "transfer_id": transfer_id,  # Fixed: was using 'transfer_id' instead of 'id'
             }
 
-            # Validate the transfer
-            validation_errors = validate_adjd_transaction(
-                validation_data, code=transaction_object.code
-            )
-            validation_errors = validate_adjd_transcation_transfer(
-                validation_data, code=transaction_object.code, errors=validation_errors
-            )
+            validation_lines.append(validation_data)
+
+        # Validate all the transfers together
+        all_validation_errors = validate_adjd_transfer_lines(
+            validation_lines, code=transaction_object.code
+        )
+        for transfer_data, validation_errors in zip(serializer.data, all_validation_errors):
             # Add validation results to the transfer data
             transfer_result = transfer_data.copy()
             if validation_errors:
@@ -360,15 +459,9 @@ class AdjdTransactionTransferListView(APIView):
 
         # Also add transaction-wide validation summary
 
-
-
-        all_related_transfers = xx_TransactionTransfer.objects.filter(
-            transaction=transaction_id
-        )
-
-        if all_related_transfers.exists():
-            from_center_values = all_related_transfers.values_list("from_center", flat=True)
-            to_center_values = all_related_transfers.values_list("to_center", flat=True)
+        if transfers:
+            from_center_values = [transfer.from_center for transfer in transfers]
+            to_center_values = [transfer.to_center for transfer in transfers]
             total_from_center = sum(float(value) if value not in [None, ''] else 0 for value in from_center_values)
             total_to_center = sum(float(value) if value not in [None, ''] else 0 for value in to_center_values)
 
@@ -503,12 +596,14 @@ class AdjdtranscationtransferSubmit(APIView):
             pivot_updates = []
 
             try:
-                # For dictionary input, get transfers from the database
-                transfers = xx_TransactionTransfer.objects.filter(
-                    transaction=transaction_id
+                # Load the lines once; every stage below works on this list
+                transfers = list(
+                    xx_TransactionTransfer.objects.filter(transaction=transaction_id)
                 )
-                code = xx_BudgetTransfer.objects.get(transaction_id=transaction_id).code
-                print(f"Transfers found: {transfers.count()}")
+                budget_transfer = xx_BudgetTransfer.objects.get(transaction_id=transaction_id)
+                code = budget_transfer.code
+                fy = budget_transfer.fy
+                print(f"Transfers found: {len(transfers)}")
                 if len(transfers) < 2 and code[0:3] != "AFR":
                     return Response(
                         {
@@ -549,7 +644,7 @@ class AdjdtranscationtransferSubmit(APIView):
                         f"Transfer ID: {transfer.transfer_id}, From Center: {transfer.from_center}, To Center: {transfer.to_center}, Cost Center Code: {transfer.cost_center_code}, Account Code: {transfer.account_code}"
                     )
                 # Check if transfers exist
-                if not transfers.exists():
+                if not transfers:
                     return Response(
                         {
                             "error": "No transfers found",
@@ -558,20 +653,22 @@ class AdjdtranscationtransferSubmit(APIView):
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-                # Validate all transfers have corresponding pivot funds
+                # Validate all transfers have corresponding pivot funds, fetched in one query
+                pivot_funds = find_pivot_funds(
+                    {(str(transfer.cost_center_code), str(transfer.account_code)) for transfer in transfers},
+                    year=fy,
+                )
                 missing_pivot_funds = []
                 for transfer in transfers:
-                    try:
-                        pivot_fund = XX_PivotFund.objects.get(
-                            entity=transfer.cost_center_code,
-                            account=transfer.account_code,
-                        )
-                    except XX_PivotFund.DoesNotExist:
+                    # Without fy a fund kept for several years is ambiguous
+                    matches = pivot_funds.get((str(transfer.cost_center_code), str(transfer.account_code)), [])
+                    if len(matches) != 1:
                         missing_pivot_funds.append(
                             {
                                 "transfer_id": transfer.transfer_id,
                                 "cost_center_code": transfer.cost_center_code,
                                 "account_code": transfer.account_code,
+                                "error": "Pivot fund not found" if not matches else "Multiple pivot funds found",
                             }
                         )
 
@@ -580,26 +677,28 @@ class AdjdtranscationtransferSubmit(APIView):
                     return Response(
                         {
                             "error": "Missing pivot funds",
-                            "message": f"Some transfers do not have corresponding pivot funds",
+                            "message": f"Some transfers do not have a single corresponding pivot fund",
                             "missing_pivot_funds": missing_pivot_funds,
                         },
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-                # Process each transfer for the transaction (only if all pivot funds exist)
-                for transfer in transfers:
-                    # Use the utility function to update pivot fund
-                    update_result = update_pivot_fund(
-                        transfer.cost_center_code,
-                        transfer.account_code,
-                        transfer.from_center,
-                        transfer.to_center,
+                # Record the movements and the new status together, or neither
+                with transaction.atomic():
+                    # Apply every line's movement in one batch (only if all pivot funds exist)
+                    update_result = apply_pivot_fund_updates(
+                        [
+                            (transfer.cost_center_code, transfer.account_code, transfer.from_center, transfer.to_center)
+                            for transfer in transfers
+                        ],
                         decide=1,
+                        year=fy,
+                        transaction_id=transaction_id,
+                        funds=pivot_funds,
                     )
-                    print(f"Update result: {update_result}")
 
-                    # Check if error key exists and has a value
-                    if "error" in update_result and update_result["error"]:
+                    # Check if any line had no pivot fund to update
+                    if update_result["missing"]:
                         return Response(
                             {
                                 "error": "Budget transfer not found",
@@ -609,14 +708,13 @@ class AdjdtranscationtransferSubmit(APIView):
                         )
 
                     # If we get here, update was successful
-                    pivot_updates.append(update_result)
+                    pivot_updates.extend(update_result["updated"])
 
-                # Update the budget transfer status
-                budget_transfer = xx_BudgetTransfer.objects.get(pk=transaction_id)
-                budget_transfer.status_level = 2
-                budget_transfer.approvel_1 = request.user.username
-                budget_transfer.approvel_1_date = timezone.now()
-                budget_transfer.save()
+                    # Update the budget transfer status
+                    budget_transfer.status_level = 2
+                    budget_transfer.approvel_1 = request.user.username
+                    budget_transfer.approvel_1_date = timezone.now()
+                    budget_transfer.save()
 
                 # user_submit=xx_notification()
                 # user_submit.create_notification(user=request.user,message=f"you have submited the trasnation {transaction_id} secessfully ")
@@ -777,17 +875,10 @@ class AdjdTransactionTransferExcelUploadView(APIView):
             )
 
         try:
-            # Read Excel file
-            df = pd.read_excel(excel_file)
-
-            # Validate required columns
-            required_columns = [
-                "cost_center_code",
-                "account_code",
-                "from_center",
-                "to_center",
-            ]
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            # Validate required columns (reads only the header row)
+            required_columns = REQUIRED_COLUMNS
+            columns = read_excel_columns(excel_file)
+            missing_columns = [col for col in required_columns if col not in columns]
 
             if missing_columns:
                 return Response(
@@ -802,58 +893,12 @@ class AdjdTransactionTransferExcelUploadView(APIView):
             # Delete existing transfers for this transaction
             # xx_TransactionTransfer.objects.filter(transaction=transaction_id).delete()
 
-            # Process Excel data
-            created_transfers = []
-            errors = []
-            print(df["cost_center_code"])
-            print(df["account_code"])
-
-            for index, row in df.iterrows():
-                try:
-                    # Create transfer data dictionary
-                    transfer_data = {
-                        "transaction": transaction_id,
-                        "cost_center_code": str(row["cost_center_code"]),
-                        "account_code": str(row["account_code"]),
-                        "from_center": (
-                            float(row["from_center"])
-                            if not pd.isna(row["from_center"])
-                            else 0
-                        ),
-                        "to_center": (
-                            float(row["to_center"])
-                            if not pd.isna(row["to_center"])
-                            else 0
-                        ),
-                        # Set default values for other required fields
-                        "approved_budget": 0,
-                        "available_budget": 0,
-                        "encumbrance": 0,
-                        "actual": 0,
-                    }
-
-                    # Validate and save
-                    serializer = AdjdTransactionTransferSerializer(data=transfer_data)
-                    if serializer.is_valid():
-                        transfer = serializer.save()
-                        created_transfers.append(serializer.data)
-                    else:
-                        errors.append(
-                            {
-                                "row": index
-                                + 2,  # +2 because Excel is 1-indexed and there's a header row
-                                "error": serializer.errors,
-                                "data": transfer_data,
-                            }
-                        )
-                except Exception as row_error:
-                    errors.append(
-                        {
-                            "row": index + 2,
-                            "error": str(row_error),
-                            "data": row.to_dict(),
-                        }
-                    )
+            # Validate the sheet batch by batch, then insert the valid rows at once
+            sheet_import = TransferSheetImport(transfer)
+            for batch in iter_excel_batches(excel_file):
+                sheet_import.add_frame(batch)
+            created_transfers = AdjdTransactionTransferSerializer(sheet_import.save(), many=True).data
+            errors = sheet_import.errors
 
             # Return results
             response_data = {
@@ -12,7 +12,7 @@ class BudgetManagementConfig(AppConfig):
         """
         try:
             # Import budget transfer signals to register them
-            from .signals import budget_trasnfer
+            from .signals import budget_trasnfer, transcation_transfer, user_ability, attachment
             print("Budget management signals registered successfully")
         except ImportError as e:
             print(f"Error importing budget management signals: {e}")
@@ -0,0 +1,321 @@
+"""
+Chunked, content-addressed storage and streaming downloads for budget
+transfer attachments.
+
+File bytes live once per distinct content in XX_ATTACHMENT_BLOB_XX, keyed by
+their SHA-256 and reference counted; each xx_BudgetTransferAttachment row
+only holds the per-transfer metadata and a reference to its blob. Attaching
+the same document to many transfers therefore stores it once. Attachments
+created before the blob store keep their bytes inline in file_data until
+``python manage.py migrate_attachments_to_blob_store`` moves them.
+
+Binding or loading a BLOB through the ORM holds the whole file in memory, so
+uploads and downloads go through the LOB locator in fixed-size chunks:
+
+* uploads hash the file, then either reuse the existing blob or insert an
+  empty BLOB and append the uploaded file chunk by chunk (through the locked
+  LOB on Oracle, one UPDATE per chunk elsewhere);
+* downloads read the LOB chunk by chunk into a StreamingHttpResponse.
+
+Worker memory per file stays at one chunk no matter how large it is.
+Single byte ranges (``Range: bytes=start-end``) are honoured so large files
+can be resumed or previewed partially.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_chunk_size():
+    return getattr(settings, 'ATTACHMENT_STREAM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+# Appending one bound chunk to a BLOB column, for backends without LOB locators
+_APPEND_SQL = {
+    'sqlite': "UPDATE {table} SET file_data = CAST(file_data || %s AS BLOB) WHERE blob_id = %s",
+    'postgresql': "UPDATE {table} SET file_data = file_data || %s WHERE blob_id = %s",
+    'mysql': "UPDATE {table} SET file_data = CONCAT(file_data, %s) WHERE blob_id = %s",
+}
+
+
+def can_write_blob_chunks():
+    return connection.vendor == 'oracle' or connection.vendor in _APPEND_SQL
+
+
+def _write_blob_chunks(blob_id, chunks):
+    """
+    Write chunks into a blob row's file_data, replacing its content, one
+    chunk at a time. Returns the number of bytes written.
+
+    Oracle appends through the BLOB's LOB locator; other backends append
+    each chunk with an UPDATE.
+    """
+    from .models import xx_AttachmentBlob
+
+    table = xx_AttachmentBlob._meta.db_table
+    size = 0
+    with connection.cursor() as cursor:
+        if connection.vendor != 'oracle':
+            cursor.execute(f"UPDATE {table} SET file_data = %s WHERE blob_id = %s", [b'', blob_id])
+            sql = _APPEND_SQL[connection.vendor].format(table=table)
+            for chunk in chunks:
+                cursor.execute(sql, [chunk, blob_id])
+                size += len(chunk)
+            return size
+
+        cursor.execute(f"UPDATE {table} SET file_data = EMPTY_BLOB() WHERE blob_id = %s", [blob_id])
+        cursor.execute(f"SELECT file_data FROM {table} WHERE blob_id = %s FOR UPDATE", [blob_id])
+        lob = cursor.fetchone()[0]
+        if not hasattr(lob, 'write'):
+            # e.g. the driver is set to fetch LOBs as bytes
+            raise DatabaseError(f"file_data of blob {blob_id} was not returned as a writable LOB locator")
+        for chunk in chunks:
+            # write() takes a 1-based offset
+            lob.write(chunk, size + 1)
+            size += len(chunk)
+    return size
+
+
+def acquire_blob(sha256, file_size, chunks_factory):
+    """
+    Return the blob holding content ``sha256`` with one more reference,
+    creating it from ``chunks_factory()`` if it is not stored yet.
+
+    Must run inside a transaction. The bytes are only read when the content
+    is new.
+    """
+    from .models import xx_AttachmentBlob
+
+    for _attempt in range(2):
+        # No first()/LIMIT: Oracle cannot combine FETCH FIRST with FOR UPDATE
+        existing = list(
+            xx_AttachmentBlob.objects.select_for_update().filter(sha256=sha256)
+        )
+        if existing:
+            blob = existing[0]
+            xx_AttachmentBlob.objects.filter(blob_id=blob.blob_id).update(ref_count=F('ref_count') + 1)
+            return blob
+
+        try:
+            with transaction.atomic():
+                if not can_write_blob_chunks():
+                    # No way to append to a BLOB here: bind the value in one piece
+                    return xx_AttachmentBlob.objects.create(
+                        sha256=sha256,
+                        file_size=file_size,
+                        file_data=b''.join(chunks_factory()),
+                        ref_count=1,
+                    )
+                blob = xx_AttachmentBlob.objects.create(
+                    sha256=sha256, file_size=file_size, file_data=b'', ref_count=1
+                )
+                written = _write_blob_chunks(blob.blob_id, chunks_factory())
+                if written != file_size:
+                    raise ValueError(
+                        f"Attachment content {sha256} changed while it was stored "
+                        f"({written} bytes written, {file_size} expected)"
+                    )
+                # Do not keep the placeholder bytes on the instance
+                del blob.file_data
+                return blob
+        except IntegrityError:
+            # The same content was stored concurrently; reference that copy
+            continue
+    raise IntegrityError(f"Could not store attachment content {sha256}")
+
+
+def release_blob(blob_id):
+    """Drop one reference to a blob and delete it once nothing uses it."""
+    from .models import xx_AttachmentBlob
+
+    with transaction.atomic():
+        xx_AttachmentBlob.objects.filter(blob_id=blob_id).update(ref_count=F('ref_count') - 1)
+        xx_AttachmentBlob.objects.filter(blob_id=blob_id, ref_count__lte=0).delete()
+
+
+def create_attachment_from_upload(transfer, uploaded_file):
+    """
+    Store an uploaded file as a new attachment of ``transfer``, sharing the
+    blob of any identical file already stored. Returns the attachment.
+    """
+    from .models import xx_BudgetTransferAttachment
+
+    chunk_size = get_chunk_size()
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in uploaded_file.chunks(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+
+    with transaction.atomic():
+        blob = acquire_blob(digest.hexdigest(), size, lambda: uploaded_file.chunks(chunk_size))
+        return xx_BudgetTransferAttachment.objects.create(
+            budget_transfer=transfer,
+            blob=blob,
+            file_name=uploaded_file.name,
+            file_type=uploaded_file.content_type,
+            file_size=size,
+            file_data=None,
+        )
+
+
+def move_attachment_to_blob_store(attachment_id):
+    """
+    Move an attachment's inline file_data into the blob store. Returns True
+    if it was moved, False if it was already stored there.
+    """
+    from .models import xx_BudgetTransferAttachment
+
+    with transaction.atomic():
+        attachment = xx_BudgetTransferAttachment.objects.with_data().select_for_update().get(
+            attachment_id=attachment_id
+        )
+        if attachment.blob_id is not None or attachment.file_data is None:
+            return False
+        data = bytes(attachment.file_data)
+        chunk_size = get_chunk_size()
+        blob = acquire_blob(
+            hashlib.sha256(data).hexdigest(),
+            len(data),
+            lambda: (data[i:i + chunk_size] for i in range(0, len(data), chunk_size)),
+        )
+        xx_BudgetTransferAttachment.objects.filter(attachment_id=attachment_id).update(
+            blob=blob, file_data=None, file_size=len(data)
+        )
+        return True
+
+
+def attachment_etag(attachment):
+    """
+    Strong validator: the content hash for blob-store attachments, otherwise
+    built from the (immutable) attachment metadata.
+    """
+    if attachment.blob_id is not None:
+        return f'"{attachment.blob.sha256}"'
+    stamp = int(attachment.upload_date.timestamp()) if attachment.upload_date else 0
+    return f'"{attachment.attachment_id}-{attachment.file_size}-{stamp}"'
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range ``Range`` header against a file of ``size`` bytes.
+
+    Returns (start, end) with ``end`` inclusive, None when the header is absent
+    or not a single byte range (serve the whole file), or raises ValueError
+    when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def iter_attachment_chunks(attachment, start=0, length=None, chunk_size=None):
+    """
+    Yield the attachment's bytes from ``start`` (0-based) for ``length`` bytes
+    (to the end when None), one chunk at a time.
+    """
+    from .models import xx_AttachmentBlob, xx_BudgetTransferAttachment
+
+    chunk_size = chunk_size or get_chunk_size()
+    if attachment.blob_id is not None:
+        sql = f"SELECT file_data FROM {xx_AttachmentBlob._meta.db_table} WHERE blob_id = %s"
+        params = [attachment.blob_id]
+    else:
+        sql = f"SELECT file_data FROM {xx_BudgetTransferAttachment._meta.db_table} WHERE attachment_id = %s"
+        params = [attachment.attachment_id]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            return
+        value = row[0]
+
+        if hasattr(value, 'read'):
+            # Oracle LOB locator: read() takes a 1-based offset and an amount
+            remaining = value.size() - start if length is None else length
+            offset = start + 1
+            while remaining > 0:
+                data = value.read(offset, min(chunk_size, remaining))
+                if not data:
+                    break
+                yield bytes(data)
+                offset += len(data)
+                remaining -= len(data)
+            return
+
+    # Backends without LOB locators return the value itself
+    data = bytes(value)
+    end = len(data) if length is None else start + length
+    for position in range(start, end, chunk_size):
+        yield data[position:min(position + chunk_size, end)]
+
+
+def build_attachment_response(request, attachment):
+    """
+    StreamingHttpResponse for an attachment (loaded with its blob's metadata,
+    see DownloadBudgetTransferAttachmentView), with
+    Content-Length, ETag and single-range support.
+    """
+    size = attachment.file_size or 0
+    etag = attachment_etag(attachment)
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range_header(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        start, length, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        length, status_code = end - start + 1, 206
+
+    response = StreamingHttpResponse(
+        iter_attachment_chunks(attachment, start, length),
+        status=status_code,
+        content_type=attachment.file_type or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, attachment.file_name)
+    if status_code == 206:
+        response['Content-Range'] = f"bytes {start}-{start + length - 1}/{size}"
+    return response
@@ -0,0 +1,178 @@
+"""
+Per-user entity scope used to filter budget transfers.
+
+A user's scope is the set of numeric cost center codes covered by their
+entity abilities of one Type (optionally narrowed to a single project),
+including every descendant entity. Resolving it walks the entity hierarchy,
+so the result is kept in two places:
+
+* the shared cache, holding the code list for Python callers, and
+* XX_USER_ENTITY_SCOPE_XX, one row per code, so SQL can join against the
+  scope instead of binding an ever-growing IN list.
+
+Scope keys embed the entity tree version and a per-user ability generation.
+Any XX_Entity change bumps the former and any xx_UserAbility change bumps
+the latter, so a stale scope is never looked up again; its rows are removed
+the next time the same scope is resolved under a newer version.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from account_and_entitys.entity_tree import get_entity_tree
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCOPE_CACHE_TTL = 300
+
+CACHE_PREFIX = 'entity_scope'
+
+
+def get_scope_cache_ttl():
+    return getattr(settings, 'ENTITY_SCOPE_CACHE_TTL', DEFAULT_SCOPE_CACHE_TTL)
+
+
+def _ability_generation_key(user_id):
+    return f"{CACHE_PREFIX}:abilities:{user_id}"
+
+
+def get_ability_generation(user_id):
+    """Return the current ability generation for a user (None if the cache is down)."""
+    try:
+        return cache.get_or_set(_ability_generation_key(user_id), 1, None)
+    except Exception as e:
+        logger.error(f"Error reading ability generation: {str(e)}")
+        return None
+
+
+def invalidate_user_entity_scope(user_id):
+    """Retire every cached scope of a user after their abilities change."""
+    key = _ability_generation_key(user_id)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+    except Exception as e:
+        logger.error(f"Error invalidating entity scope for user {user_id}: {str(e)}")
+
+
+def get_user_entity_ids(user, Type='edit'):
+    """Ids of the entities the user holds an ability of the given Type on."""
+    return list(
+        user.abilities.filter(Type=Type, Entity__isnull=False).values_list('Entity_id', flat=True)
+    )
+
+
+def resolve_numeric_cost_center_codes(tree, entity_ids):
+    """
+    Codes of the entities and their descendants, converted to integers to
+    match the numeric cost_center_code column. Non-numeric codes are skipped
+    to avoid Oracle ORA-01722 when comparing against NUMBER columns.
+    """
+    codes = set()
+    for code in tree.codes_for(tree.descendant_ids(entity_ids)):
+        try:
+            codes.add(int(str(code).strip()))
+        except Exception:
+            continue
+    return sorted(codes)
+
+
+def _scope_version(prefix, scope_key):
+    """(tree version, ability generation) of a scope key, or None if unversioned."""
+    try:
+        tree_version, generation = scope_key[len(prefix):].split('.')
+        return int(tree_version), int(generation)
+    except ValueError:
+        return None
+
+
+def _store_scope_rows(user_id, prefix, scope_key, codes, versioned=True):
+    from .models import xx_UserEntityScope
+
+    with transaction.atomic():
+        if versioned:
+            # Only versions strictly older than this one are never looked up
+            # again; a worker still on an older tree must not remove the rows
+            # of newer versions. Rows already stored under this key are
+            # still current
+            current = _scope_version(prefix, scope_key)
+            stored_keys = (
+                xx_UserEntityScope.objects.filter(scope_key__startswith=prefix)
+                .exclude(scope_key=scope_key)
+                .values_list('scope_key', flat=True)
+                .distinct()
+            )
+            older = []
+            for key in stored_keys:
+                version = _scope_version(prefix, key)
+                if version is None or (version[0] <= current[0] and version[1] <= current[1]):
+                    older.append(key)
+            if older:
+                xx_UserEntityScope.objects.filter(scope_key__in=older).delete()
+            if xx_UserEntityScope.objects.filter(scope_key=scope_key).exists():
+                return
+        else:
+            # Versions unknown (cache unreachable): store this key afresh
+            xx_UserEntityScope.objects.filter(scope_key=scope_key).delete()
+        try:
+            with transaction.atomic():
+                xx_UserEntityScope.objects.bulk_create(
+                    [
+                        xx_UserEntityScope(scope_key=scope_key, user_id=user_id, cost_center_code=code)
+                        for code in codes
+                    ],
+                    batch_size=1000,
+                )
+        except IntegrityError:
+            # Another request stored the same scope concurrently
+            pass
+
+
+def get_user_entity_scope(user, Type='edit', dashboard_filler_per_project=None):
+    """
+    Return (scope_key, numeric cost center codes) for the user's scope.
+
+    The XX_USER_ENTITY_SCOPE_XX rows for scope_key are guaranteed to exist
+    when this returns, so callers can join against them.
+    """
+    tree = get_entity_tree()
+    filler = '-' if dashboard_filler_per_project is None else str(dashboard_filler_per_project)
+    prefix = f"{user.id}:{Type}:{filler}:"
+    generation = get_ability_generation(user.id)
+    scope_key = f"{prefix}{tree.version}.{generation}"
+    cache_key = f"{CACHE_PREFIX}:{scope_key}"
+
+    try:
+        codes = cache.get(cache_key)
+    except Exception as e:
+        logger.error(f"Error reading entity scope cache: {str(e)}")
+        codes = None
+    if codes is not None:
+        # The rows can be gone while the cached codes live on, e.g. removed
+        # as stale by a worker still holding an older tree, or cleaned up
+        # by hand, so check them before handing out the key
+        from .models import xx_UserEntityScope
+
+        if not codes or xx_UserEntityScope.objects.filter(scope_key=scope_key).exists():
+            return scope_key, codes
+        versioned = tree.version is not None and generation is not None
+        _store_scope_rows(user.id, prefix, scope_key, codes, versioned=versioned)
+        return scope_key, codes
+
+    entity_ids = get_user_entity_ids(user, Type)
+    if dashboard_filler_per_project is not None:
+        if int(dashboard_filler_per_project) in entity_ids:
+            entity_ids = [int(dashboard_filler_per_project)]
+    codes = resolve_numeric_cost_center_codes(tree, entity_ids)
+
+    versioned = tree.version is not None and generation is not None
+    _store_scope_rows(user.id, prefix, scope_key, codes, versioned=versioned)
+    try:
+        cache.set(cache_key, codes, get_scope_cache_ttl())
+    except Exception as e:
+        logger.error(f"Error writing entity scope cache: {str(e)}")
+    return scope_key, codes
@@ -0,0 +1,37 @@
+"""
+Management command to move inline attachment bytes into the blob store.
+
+Attachments uploaded before the content-addressed blob store keep their
+bytes in XX_BUDGET_TRANSFER_ATTACHMENT_XX.file_data. This command hashes
+each of them, shares an existing blob with the same content or creates one,
+and clears the inline copy. Each attachment is moved in its own
+transaction, so the command can be interrupted and run again.
+
+Usage: python manage.py migrate_attachments_to_blob_store
+"""
+
+from django.core.management.base import BaseCommand
+
+from budget_management.attachments import move_attachment_to_blob_store
+from budget_management.models import xx_BudgetTransferAttachment
+
+
+class Command(BaseCommand):
+    help = "Move inline attachment file_data into the deduplicated blob store"
+
+    def handle(self, *args, **options):
+        attachment_ids = list(
+            xx_BudgetTransferAttachment.objects.filter(blob__isnull=True)
+            .order_by('attachment_id')
+            .values_list('attachment_id', flat=True)
+        )
+        moved = 0
+        for attachment_id in attachment_ids:
+            try:
+                if move_attachment_to_blob_store(attachment_id):
+                    moved += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Attachment {attachment_id}: {str(e)}"))
+        self.stdout.write(
+            self.style.SUCCESS(f"Moved {moved} of {len(attachment_ids)} attachments to the blob store")
+        )
@@ -0,0 +1,40 @@
+"""
+Management command to rebuild the maintained smart dashboard totals.
+
+Approvals, rejections and deletions keep XX_DASHBOARD_SMART_AGG_XX up to date
+incrementally. This command recomputes the table from every approved
+transfer line to reconcile any drift (for example after lines of an approved
+transfer were edited directly), then refreshes the saved smart dashboard.
+
+Usage: python manage.py rebuild_dashboard_aggregates
+"""
+
+from django.core.management.base import BaseCommand
+
+from budget_transfer.global_function.dashbaord import (
+    dashboard_smart,
+    rebuild_smart_dashboard_aggregates,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the smart dashboard (cost center, account) totals from approved transfers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-refresh',
+            action='store_true',
+            help='Do not regenerate the saved smart dashboard after rebuilding',
+        )
+
+    def handle(self, *args, **options):
+        combinations = rebuild_smart_dashboard_aggregates()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {combinations} cost center/account combinations")
+        )
+
+        if not options['skip_refresh']:
+            if dashboard_smart() is False:
+                self.stdout.write(self.style.ERROR("Failed to refresh the saved smart dashboard"))
+            else:
+                self.stdout.write(self.style.SUCCESS("Saved smart dashboard refreshed"))
@@ -0,0 +1,21 @@
+"""
+Management command to rebuild the budget transfer search token index.
+
+Saving a transfer through the ORM re-indexes it automatically. Run this once
+after deploying the index, and after any change made with raw SQL or
+queryset.update() on searchable columns.
+
+Usage: python manage.py rebuild_transfer_search_index
+"""
+
+from django.core.management.base import BaseCommand
+
+from budget_management.search_index import rebuild_transfer_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild XX_BUDGET_TRANSFER_SEARCH_XX from every budget transfer"
+
+    def handle(self, *args, **options):
+        tokens = rebuild_transfer_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {tokens} search tokens"))
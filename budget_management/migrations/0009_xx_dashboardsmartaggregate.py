@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+def populate_smart_dashboard_aggregates(apps, schema_editor):
+    from budget_transfer.global_function.dashbaord import rebuild_smart_dashboard_aggregates
+
+    rebuild_smart_dashboard_aggregates(
+        line_model=apps.get_model('adjd_transaction', 'xx_TransactionTransfer'),
+        aggregate_model=apps.get_model('budget_management', 'xx_DashboardSmartAggregate'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0008_alter_xx_budgettransfer_transaction_date'),
+        ('adjd_transaction', '0003_alter_xx_transactiontransfer_account_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='xx_DashboardSmartAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cost_center_code', models.IntegerField(blank=True, null=True)),
+                ('account_code', models.IntegerField(blank=True, null=True)),
+                ('total_from_center', models.DecimalField(decimal_places=2, default=0, max_digits=30)),
+                ('total_to_center', models.DecimalField(decimal_places=2, default=0, max_digits=30)),
+                ('line_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'XX_DASHBOARD_SMART_AGG_XX',
+                'unique_together': {('cost_center_code', 'account_code')},
+            },
+        ),
+        migrations.RunPython(populate_smart_dashboard_aggregates, migrations.RunPython.noop),
+    ]
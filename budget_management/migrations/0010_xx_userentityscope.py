@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0009_xx_dashboardsmartaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='xx_UserEntityScope',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope_key', models.CharField(db_index=True, max_length=150)),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('cost_center_code', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'XX_USER_ENTITY_SCOPE_XX',
+                'unique_together': {('scope_key', 'cost_center_code')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_search_tokens(apps, schema_editor):
+    from budget_management.search_index import SEARCH_FIELDS, tokenize_transfer
+
+    transfer_model = apps.get_model('budget_management', 'xx_BudgetTransfer')
+    token_model = apps.get_model('budget_management', 'xx_BudgetTransferSearchToken')
+    batch = []
+    for row in transfer_model.objects.values('transaction_id', *SEARCH_FIELDS).iterator():
+        batch.extend(
+            token_model(transfer_id=row['transaction_id'], token=token)
+            for token in sorted(tokenize_transfer(row))
+        )
+        if len(batch) >= 1000:
+            token_model.objects.bulk_create(batch)
+            batch = []
+    token_model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0010_xx_userentityscope'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='xx_BudgetTransferSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('transfer', models.ForeignKey(db_column='transaction_id', on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='budget_management.xx_budgettransfer')),
+            ],
+            options={
+                'db_table': 'XX_BUDGET_TRANSFER_SEARCH_XX',
+                'indexes': [models.Index(fields=['token', 'transfer'], name='xx_bt_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(populate_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0011_xx_budgettransfersearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='xx_budgettransfer',
+            index=models.Index(fields=['user_id', 'request_date'], name='xx_bt_user_reqdate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='xx_budgettransfer',
+            index=models.Index(fields=['status', 'status_level', 'type'], name='xx_bt_status_level_type_idx'),
+        ),
+    ]
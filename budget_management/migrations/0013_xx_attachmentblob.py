@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0012_xx_budgettransfer_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='xx_AttachmentBlob',
+            fields=[
+                ('blob_id', models.AutoField(primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file_size', models.IntegerField()),
+                ('file_data', models.BinaryField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'XX_ATTACHMENT_BLOB_XX',
+            },
+        ),
+        migrations.AlterField(
+            model_name='xx_budgettransferattachment',
+            name='file_data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='xx_budgettransferattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, db_column='blob_id', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='budget_management.xx_attachmentblob'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget_management', '0013_xx_attachmentblob'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='xx_attachmentblob',
+            options={'base_manager_name': 'objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='xx_budgettransferattachment',
+            options={'base_manager_name': 'objects'},
+        ),
+    ]
@@ -1,6 +1,8 @@
 from pyexpat import model
 from django.db import models
 from account_and_entitys.models import XX_Account, XX_Entity
+from account_and_entitys.entity_tree import get_entity_tree
+from budget_management.entity_scope import get_user_entity_ids, get_user_entity_scope
 from user_management.models import xx_User
 # Removed encrypted fields import - using standard Django fields now
 import json
@@ -40,6 +42,12 @@ class xx_BudgetTransfer(models.Model):
     
     class Meta:
         db_table = 'XX_BUDGET_TRANSFER_XX'
+        indexes = [
+            # "My transfers" lists filtered by request date ranges
+            models.Index(fields=['user_id', 'request_date'], name='xx_bt_user_reqdate_idx'),
+            # Approval queues: pending transfers at a status level for a type
+            models.Index(fields=['status', 'status_level', 'type'], name='xx_bt_status_level_type_idx'),
+        ]
     
     def __str__(self):
         return f"Transfer {self.transaction_id}: {self.amount} requested by {self.requested_by}"
@@ -49,7 +57,7 @@ class xx_BudgetTransfer(models.Model):
 # JOIN XX_Entity_XX ON XX_Transaction_Transfer_XX.cost_center_code = XX_Entity_XX.entity 
 # WHERE XX_Entity_XX.id IN (value1, value2, ...);
 
-from django.db.models import Q, Count, F
+from django.db.models import Q, Count, F, Exists, OuterRef
 from django.db.models import Value
 from django.db.models.functions import Cast
 from django.db.models import CharField
@@ -57,45 +65,22 @@ from django.db.models import CharField
 def get_entities_with_children(entity_ids):
     """
     Given a list of entity IDs, return all XX_Entity objects including their children (recursively).
-    """
-    # Start with the initial set
-    entities = list(XX_Entity.objects.filter(id__in=entity_ids))
-    collected_ids = set(e.id for e in entities)
-
-    queue = list(entities)  # start with base entities
-    while queue:
-        parent_entity = queue.pop(0)
-
-        # Find children where parent matches the string version of this entity number
-        children = XX_Entity.objects.filter(parent=str(parent_entity.entity))
-
-        for child in children:
-            if child.id not in collected_ids:
-                collected_ids.add(child.id)
-                entities.append(child)
-                queue.append(child)
 
-    return entities
+    Answered from the in-memory entity tree, so no query is issued unless
+    the tree has to be (re)loaded after an entity change.
+    """
+    tree = get_entity_tree()
+    return tree.entities(tree.descendant_ids(entity_ids))
 
 def get_zero_level_accounts(accounts_queryset):
     """
     Given a queryset of XX_Account objects, return only Zero Level accounts
     (accounts that are not parents to any other account).
+
+    Uses the maintained XX_Account.is_leaf flag, so the result stays a
+    queryset and can be filtered further in the database.
     """
-    # Convert queryset to list if it's not already
-    accounts = list(accounts_queryset)
-    
-    # Get all account numbers that are used as parents
-    parent_accounts = XX_Account.objects.exclude(parent__isnull=True).exclude(parent='')
-    parent_account_numbers = set(parent.parent for parent in parent_accounts)
-    
-    # Filter for accounts that are not parents
-    zero_level_accounts = [
-        account for account in accounts 
-        if account.account not in parent_account_numbers
-    ]
-    
-    return zero_level_accounts
+    return accounts_queryset.filter(is_leaf=True)
 
 def filter_budget_transfers_all_in_entities(budget_transfers, user, Type = 'edit',dashboard_filler_per_project=None):
     """
@@ -103,115 +88,36 @@ def filter_budget_transfers_all_in_entities(budget_transfers, user, Type = 'edit
     return only those where *all* related transactions
     belong to the given entity_ids.
     
-    Modified to avoid Oracle NCLOB issues with complex annotations.
+    The user's allowed cost center codes are resolved once per scope version
+    and stored in XX_USER_ENTITY_SCOPE_XX. The check runs as a correlated
+    NOT EXISTS against those rows inside the returned queryset, so neither
+    the codes nor the matching transaction ids are ever bound as IN lists
+    and the statement text is the same for every user and scope size.
+    Only EXISTS subqueries are added (no joins or DISTINCT), which keeps
+    the NCLOB columns out of any comparison on Oracle.
     """
-    entity_ids = [ability.Entity.id for ability in user.abilities.all() if ability.Entity and ability.Type == Type]
-    if dashboard_filler_per_project is not None:
-        if int(dashboard_filler_per_project) in entity_ids:
-            entity_ids = [int(dashboard_filler_per_project)]
-    entities = get_entities_with_children(entity_ids)
-
-    # Collect allowed entity codes and convert to integers when possible to match numeric cost_center_code
-    raw_entity_codes = [e.entity for e in entities]
-    numeric_entity_codes = []
-    for code in raw_entity_codes:
-        try:
-            # Many entities are stored as strings but represent integers; convert safely
-            numeric_entity_codes.append(int(str(code).strip()))
-        except Exception:
-            # Skip non-numeric codes to avoid Oracle ORA-01722 when comparing to NUMBER columns
-            continue
-
-    # Simplified approach to avoid NCLOB issues
-    # Get transfer IDs that have all their transactions in allowed entities
-    from django.db import connection
-    
-    try:
-        # Use raw SQL to avoid NCLOB issues with complex annotations
-        with connection.cursor() as cursor:
-            if numeric_entity_codes:
-                # Build dynamic placeholders for IN clause
-                placeholders = ','.join(['%s'] * len(numeric_entity_codes))
-                sql = f"""
-                    SELECT bt.transaction_id
-                    FROM XX_BUDGET_TRANSFER_XX bt
-                    WHERE NOT EXISTS (
-                        SELECT 1 
-                        FROM XX_Transaction_Transfer_XX tt 
-                        WHERE tt.transaction_id = bt.transaction_id 
-                        AND tt.cost_center_code NOT IN ({placeholders})
-                    )
-                    AND EXISTS (
-                        SELECT 1 
-                        FROM XX_Transaction_Transfer_XX tt2 
-                        WHERE tt2.transaction_id = bt.transaction_id
-                    )
-
-                    UNION
-
-                    SELECT bt.transaction_id
-                    FROM XX_BUDGET_TRANSFER_XX bt
-                    WHERE NOT EXISTS (
-                        SELECT 1 
-                        FROM XX_Transaction_Transfer_XX tt 
-                        WHERE tt.transaction_id = bt.transaction_id
-                    )
-                """
-                cursor.execute(sql, numeric_entity_codes)
-            else:
-                # No numeric entity codes; skip NOT IN check and just select those with no transactions
-                cursor.execute(
-                    """
-                    SELECT bt.transaction_id
-                    FROM XX_BUDGET_TRANSFER_XX bt
-                    WHERE NOT EXISTS (
-                        SELECT 1 
-                        FROM XX_Transaction_Transfer_XX tt 
-                        WHERE tt.transaction_id = bt.transaction_id
-                    )
-                    """
-                )
-
-            allowed_ids = [row[0] for row in cursor.fetchall()]
-        
-        combined = budget_transfers.filter(
-            Q(transaction_id__in=allowed_ids) | Q(user_id=user.id)
-        ).distinct()
-        return combined
-
-    except Exception as e:
-        # Fallback to simple filtering if raw SQL fails
-        print(f"Error occurred: {e}")
-        if numeric_entity_codes:
-            return budget_transfers.filter(
-                Q(adjd_transfers__cost_center_code__in=numeric_entity_codes) | Q(user_id=user.id)
-            ).distinct()
-        # If nothing numeric to filter on, just fall back to user-owned transfers
-        return budget_transfers.filter(Q(user_id=user.id)).distinct()
+    from adjd_transaction.models import xx_TransactionTransfer
+
+    scope_key, numeric_entity_codes = get_user_entity_scope(user, Type, dashboard_filler_per_project)
+
+    lines = xx_TransactionTransfer.objects.filter(transaction_id=OuterRef('transaction_id'))
+    if numeric_entity_codes:
+        # Lines with a NULL cost center never disqualify a transfer
+        in_scope = xx_UserEntityScope.objects.filter(
+            scope_key=scope_key, cost_center_code=OuterRef('cost_center_code')
+        )
+        lines = lines.filter(cost_center_code__isnull=False).exclude(Exists(in_scope))
+    # With no numeric entity codes only transfers without any lines qualify
+
+    return budget_transfers.filter(~Exists(lines) | Q(user_id=user.id))
 
 def get_level_zero_children(entity_ids):
     """
     Given a list of entity IDs, return only the Level 0 children 
     (children that are not parents to any other entity).
     """
-    # First get all entities including their children recursively
-    all_entities = get_entities_with_children(entity_ids)
-    
-    # Create a set of all entity numbers that are parents
-    parent_numbers = set()
-    for entity in all_entities:
-        if entity.parent:  # If this entity has a parent
-            parent_numbers.add(entity.parent)
-    
-    # Filter for entities that are not parents (level 0 children)
-    level_zero_children = []
-    for entity in all_entities:
-        # Check if this entity's number is NOT in parent_numbers
-        # and also make sure it's not one of the original entities (if needed)
-        if str(entity.entity) not in parent_numbers:
-            level_zero_children.append(entity)
-    
-    return level_zero_children
+    tree = get_entity_tree()
+    return tree.entities(tree.leaf_ids(entity_ids))
 
 
 
@@ -225,16 +131,71 @@ def get_costcenter_code(user, Type = 'edit',dashboard_filler_per_project=None):
     
     Modified to avoid Oracle NCLOB issues with complex annotations.
     """
-    entity_ids = [ability.Entity.id for ability in user.abilities.all() if ability.Entity and ability.Type == Type]
+    entity_ids = get_user_entity_ids(user, Type)
     if len(dashboard_filler_per_project) > 0:
             if all(entity_id in entity_ids for entity_id in dashboard_filler_per_project):
                entity_ids = dashboard_filler_per_project
-    entities = get_entities_with_children(entity_ids)
-    entity_codes = [e.entity for e in entities]
+    tree = get_entity_tree()
+    entity_codes = tree.codes_for(tree.descendant_ids(entity_ids))
     return entity_codes
 
     
 
+class xx_BudgetTransferSearchToken(models.Model):
+    """Normalised search tokens of a budget transfer (see search_index.py)"""
+    transfer = models.ForeignKey(
+        xx_BudgetTransfer,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        db_column='transaction_id'
+    )
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        db_table = 'XX_BUDGET_TRANSFER_SEARCH_XX'
+        indexes = [
+            models.Index(fields=['token', 'transfer'], name='xx_bt_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search token {self.token} for Transfer {self.transfer_id}"
+
+
+class BlobDeferringQuerySet(models.QuerySet):
+    """QuerySet that leaves the file_data BLOB out of SELECTs unless asked for"""
+
+    def with_data(self):
+        """Include file_data for callers that really need the bytes."""
+        return self.defer(None)
+
+
+class BlobDeferringManager(models.Manager.from_queryset(BlobDeferringQuerySet)):
+    """Default manager that never fetches file_data implicitly"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('file_data')
+
+
+class xx_AttachmentBlob(models.Model):
+    """Content-addressed attachment bytes, stored once and shared by reference count"""
+    blob_id = models.AutoField(primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    file_size = models.IntegerField()
+    file_data = models.BinaryField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobDeferringManager()
+
+    class Meta:
+        db_table = 'XX_ATTACHMENT_BLOB_XX'
+        # Related lookups and cascade deletes also skip the BLOB
+        base_manager_name = 'objects'
+
+    def __str__(self):
+        return f"Blob {self.blob_id}: {self.sha256} ({self.ref_count} refs)"
+
+
 class xx_BudgetTransferAttachment(models.Model):
     """Model to store file attachments as BLOBs for budget transfers"""
     attachment_id = models.AutoField(primary_key=True)
@@ -247,11 +208,25 @@ class xx_BudgetTransferAttachment(models.Model):
     file_name = models.CharField(max_length=255)  # Changed from EncryptedCharField
     file_type = models.CharField(max_length=100)  # Changed from EncryptedCharField
     file_size = models.IntegerField()
-    file_data = models.BinaryField()  # This will store the BLOB data
+    # Shared bytes in the blob store; attachments stored before it keep them in file_data
+    blob = models.ForeignKey(
+        xx_AttachmentBlob,
+        on_delete=models.PROTECT,
+        related_name='attachments',
+        db_column='blob_id',
+        null=True,
+        blank=True
+    )
+    file_data = models.BinaryField(null=True, blank=True)  # Legacy inline BLOB data
     upload_date = models.DateTimeField(auto_now_add=True)
+
+    # Metadata only by default; use .with_data() to read file_data
+    objects = BlobDeferringManager()
     
     class Meta:
         db_table = 'XX_BUDGET_TRANSFER_ATTACHMENT_XX'
+        # Related lookups and cascade deletes also skip the BLOB
+        base_manager_name = 'objects'
         
     def __str__(self):
         return f"Attachment {self.attachment_id}: {self.file_name} for Transfer {self.budget_transfer_id}"
@@ -300,4 +275,34 @@ class xx_DashboardBudgetTransfer(models.Model):
         db_table = 'XX_DASHBOARD_BUDGET_TRANSFER_XX'
     
     def __str__(self):
-        return f"Dashboard Data {self.Dashboard_id} from {self.date}"
\ No newline at end of file
+        return f"Dashboard Data {self.Dashboard_id} from {self.date}"
+
+
+class xx_DashboardSmartAggregate(models.Model):
+    """Running totals of approved transfer lines per cost center and account code"""
+    cost_center_code = models.IntegerField(null=True, blank=True)
+    account_code = models.IntegerField(null=True, blank=True)
+    total_from_center = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    total_to_center = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    line_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'XX_DASHBOARD_SMART_AGG_XX'
+        unique_together = ('cost_center_code', 'account_code')
+
+    def __str__(self):
+        return f"Smart Aggregate {self.cost_center_code}/{self.account_code}"
+
+
+class xx_UserEntityScope(models.Model):
+    """Resolved numeric cost center codes of one user entity scope (see entity_scope.py)"""
+    scope_key = models.CharField(max_length=150, db_index=True)
+    user_id = models.IntegerField(db_index=True)
+    cost_center_code = models.IntegerField()
+
+    class Meta:
+        db_table = 'XX_USER_ENTITY_SCOPE_XX'
+        unique_together = ('scope_key', 'cost_center_code')
+
+    def __str__(self):
+        return f"Scope {self.scope_key}: {self.cost_center_code}"
@@ -0,0 +1,130 @@
+"""
+Token index behind the budget transfer ``search`` filter.
+
+Searching with ``icontains`` over several columns wraps every row in UPPER()
+and scans the whole table. Instead, each transfer's searchable values are
+normalised into tokens stored in XX_BUDGET_TRANSFER_SEARCH_XX, one row per
+(transfer, token), and a search term matches a transfer when every word of
+the term is a prefix of one of its tokens. That is an index range scan
+(``token LIKE 'TERM%'``) rather than a full scan.
+
+A word that is no token's prefix (e.g. the middle of a code, which the old
+``icontains`` search found) falls back to ``icontains`` over the fields for
+that word only, so every transfer the substring search matched is still
+found; only such searches pay for the scan.
+
+Tokens are kept in step by the xx_BudgetTransfer signals; run
+``python manage.py rebuild_transfer_search_index`` after changes made
+without the ORM.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+# Model fields whose values are searchable
+SEARCH_FIELDS = ('code', 'requested_by', 'status', 'transaction_date', 'type')
+
+TOKEN_MAX_LENGTH = 100
+
+_SPLIT_RE = re.compile(r'[^0-9A-Z]+')
+
+
+def normalize_search_text(value):
+    """Upper-case and trim a value the same way for indexing and searching."""
+    return str(value).strip().upper()
+
+
+def tokenize_value(value):
+    """
+    Tokens for one value: the whole normalised value plus each alphanumeric
+    part, so 'FAR-0012' is found by 'FAR-0', 'FAR' and '0012'.
+    """
+    if value in (None, ''):
+        return set()
+    text = normalize_search_text(value)
+    if not text:
+        return set()
+    tokens = {text}
+    tokens.update(part for part in _SPLIT_RE.split(text) if part)
+    return {token[:TOKEN_MAX_LENGTH] for token in tokens}
+
+
+def tokenize_transfer(values):
+    """Tokens for a transfer given a mapping of SEARCH_FIELDS to values."""
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        tokens.update(tokenize_value(values.get(field)))
+    return tokens
+
+
+def refresh_transfer_search_tokens(transfer_ids):
+    """Rewrite the tokens of the given transfers from their stored values."""
+    from .models import xx_BudgetTransfer, xx_BudgetTransferSearchToken
+
+    transfer_ids = list(transfer_ids)
+    if not transfer_ids:
+        return 0
+
+    rows = xx_BudgetTransfer.objects.filter(transaction_id__in=transfer_ids).values(
+        'transaction_id', *SEARCH_FIELDS
+    )
+    tokens = [
+        xx_BudgetTransferSearchToken(transfer_id=row['transaction_id'], token=token)
+        for row in rows
+        for token in sorted(tokenize_transfer(row))
+    ]
+    with transaction.atomic():
+        xx_BudgetTransferSearchToken.objects.filter(transfer_id__in=transfer_ids).delete()
+        xx_BudgetTransferSearchToken.objects.bulk_create(tokens, batch_size=1000)
+    return len(tokens)
+
+
+def rebuild_transfer_search_index(batch_size=1000):
+    """Rebuild the tokens of every transfer. Returns the number of tokens written."""
+    from .models import xx_BudgetTransfer
+
+    written = 0
+    ids = list(xx_BudgetTransfer.objects.order_by('transaction_id').values_list('transaction_id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        written += refresh_transfer_search_tokens(ids[start:start + batch_size])
+    return written
+
+
+def _icontains_query(word):
+    query = Q()
+    for field in SEARCH_FIELDS:
+        query |= Q(**{f'{field}__icontains': word})
+    return query
+
+
+def filter_transfers_by_search(transfers, search):
+    """
+    Narrow a transfer queryset to those matching ``search`` and annotate
+    ``search_rank`` (0 for an exact code match, 1 otherwise) for ordering.
+    """
+    from .models import xx_BudgetTransferSearchToken
+
+    text = normalize_search_text(search)
+    words = [word[:TOKEN_MAX_LENGTH] for word in text.split() if word]
+    if not words:
+        return transfers.annotate(search_rank=Value(1, output_field=IntegerField()))
+
+    query = Q()
+    for word in words:
+        tokens = xx_BudgetTransferSearchToken.objects.filter(token__startswith=word)
+        if tokens.exists():
+            query &= Q(transaction_id__in=tokens.values('transfer_id'))
+        else:
+            query &= _icontains_query(word)
+    if text.isdigit():
+        # Support numeric search on transaction_id
+        query |= Q(transaction_id=int(text))
+
+    return transfers.filter(query).annotate(
+        search_rank=Case(
+            When(code__iexact=text, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    )
@@ -0,0 +1,27 @@
+"""
+Django signals for xx_BudgetTransferAttachment model
+Keep blob store reference counts in step with attachment deletions
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from ..models import xx_BudgetTransferAttachment
+import logging
+from ..attachments import release_blob
+# Configure logging for attachment signals
+logger = logging.getLogger('attachment_signals')
+
+# ============================================================================
+# xx_BudgetTransferAttachment Signals
+# ============================================================================
+
+
+@receiver(post_delete, sender=xx_BudgetTransferAttachment)
+def attachment_post_delete(sender, instance, **kwargs):
+    """
+    Function executed AFTER deleting xx_BudgetTransferAttachment
+    Releases the attachment's reference to its shared blob, in the same
+    transaction, so the bytes go away with the last attachment using them
+    """
+    if instance.blob_id is None:
+        return
+    release_blob(instance.blob_id)
@@ -3,12 +3,16 @@ Django signals for xx_BudgetTransfer model
 Automatically execute functions when budget transfer changes occur
 """
 from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
+from django.db import transaction
 from django.dispatch import receiver
 from django.utils import timezone
 from ..models import xx_BudgetTransfer
 from user_management.models import xx_notification
 import logging
-from budget_transfer.global_function.dashbaord import dashboard_smart,dashboard_normal
+from budget_transfer.global_function.dashbaord import apply_smart_dashboard_delta
+from budget_transfer.global_function.dashboard_cache import invalidate_dashboard_cache
+from budget_transfer.global_function.dashboard_refresher import mark_dashboard_dirty
+from ..search_index import SEARCH_FIELDS, refresh_transfer_search_tokens
 # Configure logging for budget transfer signals
 logger = logging.getLogger('budget_transfer_signals')
 
@@ -18,31 +22,79 @@ logger = logging.getLogger('budget_transfer_signals')
 
 
 
+@receiver(pre_save, sender=xx_BudgetTransfer)
+def budget_transfer_pre_save(sender, instance, **kwargs):
+    """
+    Function executed BEFORE saving xx_BudgetTransfer
+    Remembers the stored status so post_save can detect approval transitions,
+    and the searchable values so it can tell whether search tokens changed
+    """
+    instance._previous_status = None
+    instance._previous_search_values = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values(*SEARCH_FIELDS).first()
+        if previous is not None:
+            instance._previous_status = previous['status']
+            instance._previous_search_values = previous
+
+
 @receiver(post_save, sender=xx_BudgetTransfer)
 def budget_transfer_post_save(sender, instance, created, **kwargs):
     """
     Function executed AFTER saving xx_BudgetTransfer
     Use this for notifications, related updates, or post-processing
     """
+    # Keep the smart dashboard totals in step with approval transitions. Not
+    # caught: a failed delta must fail the save rather than let totals drift
+    was_approved = getattr(instance, '_previous_status', None) == "approved"
+    is_approved = instance.status == "approved"
+    if is_approved and not was_approved:
+        apply_smart_dashboard_delta(instance.transaction_id, sign=1)
+    elif was_approved and not is_approved:
+        apply_smart_dashboard_delta(instance.transaction_id, sign=-1)
+
     try:
-        # Run dashboard function for ALL saves (create AND update)
+        # Re-index the transfer for search when a searchable value changed
+        previous = getattr(instance, '_previous_search_values', None)
+        if previous is None or any(
+            previous[field] != getattr(instance, field) for field in SEARCH_FIELDS
+        ):
+            refresh_transfer_search_tokens([instance.transaction_id])
+
+        # Drop cached dashboard sections once the change is visible to readers
+        if is_approved != was_approved:
+            transaction.on_commit(lambda: invalidate_dashboard_cache('normal', 'smart'))
+        else:
+            transaction.on_commit(lambda: invalidate_dashboard_cache('normal'))
+
+        # Mark the dashboard dirty for ALL saves (create AND update); the
+        # background refresher collapses bursts of saves into one recompute
         if instance.status == "approved":
-            print("approved enterd")
-            dashboard_smart()
-        # elif instance.status == "pending":
-        print("pending enterd")
-        dashboard_normal()
+            mark_dashboard_dirty('normal', 'smart')
+        else:
+            mark_dashboard_dirty('normal')
         
         if created:
-            logger.info(f"New BudgetTransfer created: {instance.transaction_id} - Dashboard updated")
+            logger.info(f"New BudgetTransfer created: {instance.transaction_id} - Dashboard marked dirty")
         else:
-            logger.info(f"BudgetTransfer updated: {instance.transaction_id} - Dashboard updated")
+            logger.info(f"BudgetTransfer updated: {instance.transaction_id} - Dashboard marked dirty")
                 
     except Exception as e:
         logger.error(f"Error in budget_transfer_post_save: {str(e)}")
 
 
 
+@receiver(pre_delete, sender=xx_BudgetTransfer)
+def budget_transfer_pre_delete(sender, instance, **kwargs):
+    """
+    Function executed BEFORE deleting xx_BudgetTransfer
+    Removes an approved transfer's lines from the smart dashboard totals
+    while they still exist (the cascaded line deletes then leave them alone)
+    """
+    if instance.status == "approved":
+        apply_smart_dashboard_delta(instance.transaction_id, sign=-1)
+
+
 @receiver(post_delete, sender=xx_BudgetTransfer)
 def budget_transfer_post_delete(sender, instance, **kwargs):
     """
@@ -50,9 +102,10 @@ def budget_transfer_post_delete(sender, instance, **kwargs):
     Use this for cleanup, notifications, or post-deletion processing
     """
     try:
-        dashboard_smart()
+        mark_dashboard_dirty('normal', 'smart')
+        transaction.on_commit(lambda: invalidate_dashboard_cache('normal', 'smart'))
 
-        logger.info(f"Dashboard updated after deleting BudgetTransfer {instance.transaction_id}")
+        logger.info(f"Dashboard marked dirty after deleting BudgetTransfer {instance.transaction_id}")
             
     except Exception as e:
         logger.error(f"Error in budget_transfer_post_delete: {str(e)}")
@@ -0,0 +1,101 @@
+"""
+Django signals for xx_TransactionTransfer model
+Keep cached dashboard data in step with transfer line changes
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+from adjd_transaction.models import xx_TransactionTransfer
+import logging
+from budget_management.models import xx_BudgetTransfer
+from budget_transfer.global_function.dashbaord import apply_smart_dashboard_line_delta
+from budget_transfer.global_function.dashboard_cache import invalidate_dashboard_cache
+from budget_transfer.global_function.dashboard_refresher import mark_dashboard_dirty
+# Configure logging for transaction transfer signals
+logger = logging.getLogger('transaction_transfer_signals')
+
+# ============================================================================
+# xx_TransactionTransfer Signals
+# ============================================================================
+
+
+def _is_approved(transaction_id):
+    if transaction_id is None:
+        return False
+    return xx_BudgetTransfer.objects.filter(pk=transaction_id, status="approved").exists()
+
+
+def _stored_smart_line(instance):
+    """The stored (cost center, account, from, to) of a line if its transfer is approved."""
+    return (
+        xx_TransactionTransfer.objects.filter(pk=instance.pk, transaction__status="approved")
+        .values_list('cost_center_code', 'account_code', 'from_center', 'to_center')
+        .first()
+    )
+
+
+@receiver(pre_save, sender=xx_TransactionTransfer)
+def transaction_transfer_pre_save(sender, instance, **kwargs):
+    """
+    Function executed BEFORE saving xx_TransactionTransfer
+    Remembers the stored line if it counts in the smart dashboard totals
+    (its transfer is approved), so post_save can move it
+    """
+    instance._previous_smart_line = _stored_smart_line(instance) if instance.pk else None
+
+
+@receiver(pre_delete, sender=xx_TransactionTransfer)
+def transaction_transfer_pre_delete(sender, instance, origin=None, **kwargs):
+    """
+    Function executed BEFORE deleting xx_TransactionTransfer
+    Remembers the stored line if it counts in the smart dashboard totals.
+    Lines deleted along with their transfer are removed by the transfer's
+    own pre_delete signal
+    """
+    cascaded = isinstance(origin, xx_BudgetTransfer) or getattr(origin, 'model', None) is xx_BudgetTransfer
+    instance._previous_smart_line = None if cascaded else _stored_smart_line(instance)
+
+
+@receiver(post_save, sender=xx_TransactionTransfer)
+def transaction_transfer_post_save(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving xx_TransactionTransfer
+    Moves the line's old and new amounts in the smart dashboard totals
+    when they count there. Not caught: a failed delta must fail the save
+    """
+    previous = getattr(instance, '_previous_smart_line', None)
+    removed = [previous] if previous else []
+    added = []
+    if _is_approved(instance.transaction_id):
+        added.append((instance.cost_center_code, instance.account_code, instance.from_center, instance.to_center))
+    if removed or added:
+        apply_smart_dashboard_line_delta(removed=removed, added=added)
+        transaction.on_commit(lambda: invalidate_dashboard_cache('smart'))
+        mark_dashboard_dirty('smart')
+
+
+@receiver(post_delete, sender=xx_TransactionTransfer)
+def transaction_transfer_post_delete(sender, instance, **kwargs):
+    """
+    Function executed AFTER deleting xx_TransactionTransfer
+    Removes the line from the smart dashboard totals when it counted there
+    """
+    previous = getattr(instance, '_previous_smart_line', None)
+    if previous:
+        apply_smart_dashboard_line_delta(removed=[previous])
+        transaction.on_commit(lambda: invalidate_dashboard_cache('smart'))
+        mark_dashboard_dirty('smart')
+
+
+@receiver(post_save, sender=xx_TransactionTransfer)
+@receiver(post_delete, sender=xx_TransactionTransfer)
+def transaction_transfer_changed(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving or deleting xx_TransactionTransfer
+    Lines decide which entity scopes a transfer belongs to, so the cached
+    per-scope dashboard counts are invalidated
+    """
+    try:
+        transaction.on_commit(lambda: invalidate_dashboard_cache('normal'))
+    except Exception as e:
+        logger.error(f"Error in transaction_transfer_changed: {str(e)}")
@@ -0,0 +1,48 @@
+"""
+Django signals for xx_UserAbility model
+Retire cached user entity scopes when abilities change
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from user_management.models import xx_UserAbility
+import logging
+from budget_management.entity_scope import invalidate_user_entity_scope
+# Configure logging for user ability signals
+logger = logging.getLogger('user_ability_signals')
+
+# ============================================================================
+# xx_UserAbility Signals
+# ============================================================================
+
+
+@receiver(pre_save, sender=xx_UserAbility)
+def user_ability_pre_save(sender, instance, **kwargs):
+    """
+    Function executed BEFORE saving xx_UserAbility
+    Remembers the stored owner in case the ability moves to another user
+    """
+    instance._previous_user_id = None
+    if instance.pk:
+        instance._previous_user_id = (
+            sender.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=xx_UserAbility)
+@receiver(post_delete, sender=xx_UserAbility)
+def user_ability_changed(sender, instance, **kwargs):
+    """
+    Function executed AFTER saving or deleting xx_UserAbility
+    The owner's entity scopes no longer match their abilities
+    """
+    try:
+        user_ids = {instance.user_id, getattr(instance, '_previous_user_id', None)} - {None}
+
+        def _invalidate():
+            for user_id in user_ids:
+                invalidate_user_entity_scope(user_id)
+
+        transaction.on_commit(_invalidate)
+    except Exception as e:
+        logger.error(f"Error in user_ability_changed: {str(e)}")
@@ -0,0 +1,744 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account_and_entitys.entity_tree import get_entity_tree, invalidate_entity_tree
+from account_and_entitys.models import XX_Entity, XX_PivotFund, XX_PivotFundMovement
+from adjd_transaction.models import xx_TransactionTransfer
+from budget_transfer.global_function.dashbaord import compute_normal_dashboard, rebuild_smart_dashboard_aggregates
+from budget_transfer.global_function import dashboard_refresher
+from budget_transfer.global_function.dashboard_cache import (
+    get_cached_dashboard_section,
+    invalidate_dashboard_cache,
+    set_cached_dashboard_section,
+)
+from public_funtion.keyset_pagination import decode_cursor, encode_cursor, paginate_by_keyset
+from user_management.models import xx_User, xx_UserAbility
+
+from .attachments import acquire_blob, create_attachment_from_upload, parse_range_header, release_blob
+from .entity_scope import get_user_entity_scope, invalidate_user_entity_scope
+from .models import (
+    filter_budget_transfers_all_in_entities,
+    xx_AttachmentBlob,
+    xx_BudgetTransfer,
+    xx_BudgetTransferAttachment,
+    xx_BudgetTransferRejectReason,
+    xx_DashboardSmartAggregate,
+    xx_UserEntityScope,
+)
+from .search_index import filter_transfers_by_search, tokenize_value
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_absent_or_unsupported_header_serves_whole_file(self):
+        for header in (None, "", "items=0-10", "bytes=0-1,5-9", "bytes=-"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 100))
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range_header("bytes=0-9", 100), (0, 9))
+
+    def test_open_range_runs_to_the_end(self):
+        self.assertEqual(parse_range_header("bytes=90-", 100), (90, 99))
+
+    def test_end_past_the_file_is_clamped(self):
+        self.assertEqual(parse_range_header("bytes=50-500", 100), (50, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range_header("bytes=-500", 100), (0, 99))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ("bytes=100-", "bytes=100-200", "bytes=9-5", "bytes=-0"):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range_header(header, 100)
+
+
+@override_settings(ATTACHMENT_STREAM_CHUNK_SIZE=1000)
+class AttachmentUploadTests(TestCase):
+    def setUp(self):
+        self.transfer = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+
+    def test_upload_is_written_chunk_by_chunk(self):
+        content = bytes(range(256)) * 20 + b"\x00tail"
+        # Large uploads are spooled to disk and read back in chunks
+        upload = TemporaryUploadedFile("report.pdf", "application/pdf", len(content), None)
+        self.addCleanup(upload.close)
+        upload.write(content)
+        upload.seek(0)
+        with CaptureQueriesContext(connection) as queries:
+            attachment = create_attachment_from_upload(self.transfer, upload)
+
+        # One UPDATE per chunk, none of them binding the whole file
+        appends = [query["sql"] for query in queries.captured_queries if "CAST(file_data ||" in query["sql"]]
+        self.assertEqual(len(appends), 6)
+        blob = xx_AttachmentBlob.objects.with_data().get(pk=attachment.blob_id)
+        self.assertEqual(bytes(blob.file_data), content)
+        self.assertEqual((blob.file_size, attachment.file_size), (len(content), len(content)))
+
+
+class AttachmentBlobStoreTests(TestCase):
+    def setUp(self):
+        self.first = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+        self.second = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+
+    def attach(self, transfer, content, name="report.pdf"):
+        return create_attachment_from_upload(
+            transfer, SimpleUploadedFile(name, content, content_type="application/pdf")
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.attach(self.first, b"same bytes")
+        second = self.attach(self.second, b"same bytes", name="copy.pdf")
+        other = self.attach(self.second, b"other bytes")
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        self.assertEqual(
+            dict(xx_AttachmentBlob.objects.values_list("blob_id", "ref_count")), {first.blob_id: 2, other.blob_id: 1}
+        )
+
+    def test_blob_is_kept_until_its_last_attachment_is_deleted(self):
+        first = self.attach(self.first, b"same bytes")
+        self.attach(self.second, b"same bytes")
+
+        first.delete()
+        blob = xx_AttachmentBlob.objects.with_data().get(pk=first.blob_id)
+        self.assertEqual((blob.ref_count, bytes(blob.file_data)), (1, b"same bytes"))
+
+        # Cascaded from the transfer
+        self.second.delete()
+        self.assertFalse(xx_AttachmentBlob.objects.exists())
+
+    def test_existing_content_is_not_read_again(self):
+        with transaction.atomic():
+            blob = acquire_blob("a" * 64, 3, lambda: iter([b"abc"]))
+            again = acquire_blob("a" * 64, 3, mock.Mock(side_effect=AssertionError("read again")))
+        self.assertEqual(again.blob_id, blob.blob_id)
+        self.assertEqual(xx_AttachmentBlob.objects.get(pk=blob.blob_id).ref_count, 2)
+
+        release_blob(blob.blob_id)
+        release_blob(blob.blob_id)
+        self.assertFalse(xx_AttachmentBlob.objects.exists())
+
+
+class AttachmentDeferredDataTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="reader", role="user"))
+        self.transfer = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+        self.shared = create_attachment_from_upload(
+            self.transfer, SimpleUploadedFile("shared.pdf", b"blob bytes", content_type="application/pdf")
+        )
+        # Stored before the blob store: bytes inline in file_data
+        self.legacy = xx_BudgetTransferAttachment.objects.create(
+            budget_transfer=self.transfer, file_name="old.txt", file_type="text/plain", file_size=6,
+            file_data=b"inline",
+        )
+
+    def captured_sql(self, queries):
+        return [query["sql"] for query in queries.captured_queries]
+
+    def test_list_queries_leave_out_the_bytes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("budget_management:budget-transfer-list-files"), {"transaction_id": self.transfer.pk}
+            )
+            attachment = xx_BudgetTransferAttachment.objects.get(pk=self.shared.pk)
+            attachment.blob.sha256
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["attachments"]), 2)
+        self.assertFalse([sql for sql in self.captured_sql(queries) if "file_data" in sql])
+
+    def test_with_data_loads_the_bytes(self):
+        with CaptureQueriesContext(connection) as queries:
+            legacy = xx_BudgetTransferAttachment.objects.with_data().get(pk=self.legacy.pk)
+            blob = xx_AttachmentBlob.objects.with_data().get(pk=self.shared.blob_id)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all("file_data" in sql for sql in self.captured_sql(queries)))
+        self.assertEqual((bytes(legacy.file_data), bytes(blob.file_data)), (b"inline", b"blob bytes"))
+
+    def test_download_reads_the_bytes(self):
+        for attachment, content in ((self.shared, b"blob bytes"), (self.legacy, b"inline")):
+            with self.subTest(file_name=attachment.file_name):
+                response = self.client.get(
+                    reverse(
+                        "budget_management:budget-transfer-download-attachment",
+                        args=[self.transfer.pk, attachment.pk],
+                    )
+                )
+                self.assertEqual(response.status_code, 200)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(b"".join(response.streaming_content), content)
+                self.assertEqual(
+                    [sql.startswith("SELECT file_data") for sql in self.captured_sql(queries)], [True]
+                )
+
+
+class KeysetCursorTests(TestCase):
+    ordering = [("request_date", True), ("transaction_id", True)]
+
+    def test_cursor_round_trip_keeps_microseconds(self):
+        request_date = timezone.make_aware(datetime.datetime(2025, 3, 4, 5, 6, 7, 891011))
+        cursor = encode_cursor([request_date, 42])
+        self.assertEqual(decode_cursor(cursor, xx_BudgetTransfer, self.ordering), [request_date, 42])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ("not a cursor", encode_cursor([1]), encode_cursor(["x", 1])):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor, xx_BudgetTransfer, self.ordering)
+
+    def test_pages_cover_every_row_once_despite_ties(self):
+        request_date = timezone.now()
+        for _ in range(7):
+            xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+        # Same request_date on every row, so only the id breaks the ties
+        xx_BudgetTransfer.objects.update(request_date=request_date)
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = paginate_by_keyset(
+                xx_BudgetTransfer.objects.all(), ("-request_date", "-transaction_id"), cursor, page_size=3
+            )
+            seen.extend(row.transaction_id for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(
+            seen,
+            list(xx_BudgetTransfer.objects.order_by("-transaction_id").values_list("transaction_id", flat=True)),
+        )
+
+
+class EntityScopeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for entity, parent in (("10", None), ("11", "10"), ("12", "11"), ("20", None), ("X1", "10")):
+            XX_Entity.objects.create(entity=entity, parent=parent)
+        invalidate_entity_tree()
+        self.user = xx_User.objects.create(username="scoped", role="user")
+        xx_UserAbility.objects.create(user=self.user, Entity=XX_Entity.objects.get(entity="10"), Type="edit")
+
+    def scope_rows(self, scope_key):
+        return sorted(xx_UserEntityScope.objects.filter(scope_key=scope_key).values_list("cost_center_code", flat=True))
+
+    def test_scope_covers_descendants_with_numeric_codes(self):
+        scope_key, codes = get_user_entity_scope(self.user)
+        self.assertEqual(codes, [10, 11, 12])
+        self.assertEqual(self.scope_rows(scope_key), [10, 11, 12])
+
+    def test_missing_rows_are_restored_on_a_cache_hit(self):
+        scope_key, codes = get_user_entity_scope(self.user)
+        xx_UserEntityScope.objects.all().delete()
+        self.assertEqual(get_user_entity_scope(self.user), (scope_key, codes))
+        self.assertEqual(self.scope_rows(scope_key), [10, 11, 12])
+
+    def test_ability_change_retires_the_old_scope(self):
+        old_key, _codes = get_user_entity_scope(self.user)
+        xx_UserAbility.objects.create(user=self.user, Entity=XX_Entity.objects.get(entity="20"), Type="edit")
+        invalidate_user_entity_scope(self.user.id)
+
+        scope_key, codes = get_user_entity_scope(self.user)
+        self.assertNotEqual(scope_key, old_key)
+        self.assertEqual(codes, [10, 11, 12, 20])
+        self.assertEqual(self.scope_rows(scope_key), [10, 11, 12, 20])
+        self.assertFalse(xx_UserEntityScope.objects.filter(scope_key=old_key).exists())
+
+    def test_worker_on_an_older_tree_keeps_newer_rows(self):
+        old_tree = get_entity_tree()
+        old_key, codes = get_user_entity_scope(self.user)
+        invalidate_entity_tree()
+        new_key, _codes = get_user_entity_scope(self.user)
+        self.assertFalse(xx_UserEntityScope.objects.filter(scope_key=old_key).exists())
+
+        # A worker that has not reloaded its tree yet restores its own rows
+        # and leaves the newer version alone
+        with mock.patch("budget_management.entity_scope.get_entity_tree", return_value=old_tree):
+            self.assertEqual(get_user_entity_scope(self.user), (old_key, codes))
+        self.assertEqual(self.scope_rows(old_key), [10, 11, 12])
+        self.assertEqual(self.scope_rows(new_key), [10, 11, 12])
+
+        # The next resolve under the newer version removes the older rows
+        cache.delete(f"entity_scope:{new_key}")
+        self.assertEqual(get_user_entity_scope(self.user)[0], new_key)
+        self.assertFalse(xx_UserEntityScope.objects.filter(scope_key=old_key).exists())
+
+
+class TransfersInEntitiesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for entity, parent in (("10", None), ("11", "10"), ("20", None), ("X1", "10")):
+            XX_Entity.objects.create(entity=entity, parent=parent)
+        invalidate_entity_tree()
+        self.user = xx_User.objects.create(username="scoped", role="user")
+        self.other = xx_User.objects.create(username="other", role="user")
+        for owner, cost_centers in (
+            (self.other, [10, 11]),
+            (self.other, [10, 20]),
+            (self.other, [20]),
+            (self.other, []),
+            (self.other, [None, 11]),
+            (self.other, [None]),
+            (self.user, [20]),
+            (self.user, [10]),
+        ):
+            transfer = xx_BudgetTransfer.objects.create(
+                amount=1, status="pending", transaction_date="x", user_id=owner.id
+            )
+            for cost_center_code in cost_centers:
+                xx_TransactionTransfer.objects.create(transaction=transfer, cost_center_code=cost_center_code)
+
+    def expected(self, codes):
+        # Reference semantics: own transfers, plus transfers none of whose
+        # lines name a cost center outside the scope (all lines, without one)
+        expected = []
+        for transfer in xx_BudgetTransfer.objects.order_by("transaction_id"):
+            lines = list(transfer.adjd_transfers.values_list("cost_center_code", flat=True))
+            if codes:
+                inside = all(code is None or code in codes for code in lines)
+            else:
+                inside = not lines
+            if inside or transfer.user_id == self.user.id:
+                expected.append(transfer.transaction_id)
+        return expected
+
+    def filtered(self, **kwargs):
+        transfers = filter_budget_transfers_all_in_entities(xx_BudgetTransfer.objects.all(), self.user, **kwargs)
+        return list(transfers.order_by("transaction_id").values_list("transaction_id", flat=True))
+
+    def test_matches_the_reference_for_mixed_lines(self):
+        xx_UserAbility.objects.create(user=self.user, Entity=XX_Entity.objects.get(entity="10"), Type="edit")
+        self.assertEqual(self.filtered(), self.expected({10, 11}))
+        self.assertEqual(len(self.filtered()), 6)
+
+    def test_matches_the_reference_without_a_scope(self):
+        self.assertEqual(self.filtered(), self.expected(set()))
+
+    def test_matches_the_reference_for_one_project(self):
+        for entity in ("10", "20"):
+            xx_UserAbility.objects.create(user=self.user, Entity=XX_Entity.objects.get(entity=entity), Type="edit")
+        self.assertEqual(self.filtered(), self.expected({10, 11, 20}))
+        project = XX_Entity.objects.get(entity="11").id
+        xx_UserAbility.objects.create(user=self.user, Entity_id=project, Type="edit")
+        self.assertEqual(self.filtered(dashboard_filler_per_project=project), self.expected({11}))
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = xx_User.objects.create(username="viewer", role="user")
+        self.other = xx_User.objects.create(username="other", role="user")
+
+    def test_normal_sections_are_kept_per_user_and_smart_is_shared(self):
+        set_cached_dashboard_section(self.user, "normal", {"total_transfers": 1})
+        set_cached_dashboard_section(self.user, "smart", {"total": 2}, filler="7")
+        self.assertEqual(get_cached_dashboard_section(self.user, "normal"), {"total_transfers": 1})
+        self.assertIsNone(get_cached_dashboard_section(self.other, "normal"))
+        self.assertEqual(get_cached_dashboard_section(self.other, "smart", filler="7"), {"total": 2})
+        self.assertIsNone(get_cached_dashboard_section(self.other, "smart"))
+
+    def test_ability_change_changes_the_normal_scope(self):
+        set_cached_dashboard_section(self.user, "normal", {"total_transfers": 1})
+        entity = XX_Entity.objects.create(entity="10")
+        xx_UserAbility.objects.create(user=self.user, Entity=entity, Type="edit")
+        self.assertIsNone(get_cached_dashboard_section(self.user, "normal"))
+
+    def test_invalidation_retires_only_the_given_type(self):
+        set_cached_dashboard_section(self.user, "normal", {"total_transfers": 1})
+        set_cached_dashboard_section(self.user, "smart", {"total": 2})
+        invalidate_dashboard_cache("normal")
+        self.assertIsNone(get_cached_dashboard_section(self.user, "normal"))
+        self.assertEqual(get_cached_dashboard_section(self.user, "smart"), {"total": 2})
+
+        invalidate_dashboard_cache()
+        self.assertIsNone(get_cached_dashboard_section(self.user, "smart"))
+
+    @mock.patch("budget_transfer.global_function.dashboard_refresher._schedule_refresh")
+    def test_transfer_changes_invalidate_on_commit(self, _schedule_refresh):
+        set_cached_dashboard_section(self.user, "normal", {"total_transfers": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+            self.assertEqual(get_cached_dashboard_section(self.user, "normal"), {"total_transfers": 1})
+        self.assertIsNone(get_cached_dashboard_section(self.user, "normal"))
+
+    def test_entity_changes_invalidate_normal_on_commit(self):
+        set_cached_dashboard_section(self.user, "normal", {"total_transfers": 1})
+        set_cached_dashboard_section(self.user, "smart", {"total": 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            XX_Entity.objects.create(entity="10")
+            self.assertEqual(get_cached_dashboard_section(self.user, "normal"), {"total_transfers": 1})
+        self.assertIsNone(get_cached_dashboard_section(self.user, "normal"))
+        self.assertEqual(get_cached_dashboard_section(self.user, "smart"), {"total": 2})
+
+
+@mock.patch("budget_transfer.global_function.dashboard_refresher.connections", mock.Mock())
+@mock.patch("budget_transfer.global_function.dashboard_refresher.dashboard_normal")
+@mock.patch("budget_transfer.global_function.dashboard_refresher.dashboard_smart")
+@mock.patch("budget_transfer.global_function.dashboard_refresher.threading.Timer")
+class DashboardRefresherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(self.forget_pending)
+
+    def forget_pending(self):
+        # What another worker process would see: nothing pending locally
+        dashboard_refresher._pending.clear()
+        dashboard_refresher._timer = None
+
+    def mark_burst(self, *dashboard_types):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(20):
+                dashboard_refresher.mark_dashboard_dirty(*dashboard_types)
+
+    def test_burst_of_marks_refreshes_once(self, Timer, dashboard_smart, dashboard_normal):
+        self.mark_burst("smart")
+        self.mark_burst("normal", "smart")
+
+        Timer.assert_called_once()
+        _window, run_refresh = Timer.call_args.args
+        run_refresh()
+        self.assertEqual((dashboard_smart.call_count, dashboard_normal.call_count), (1, 1))
+        self.assertEqual(dashboard_refresher._pending, {})
+
+    def test_nothing_is_scheduled_before_the_commit(self, Timer, dashboard_smart, dashboard_normal):
+        with self.captureOnCommitCallbacks(execute=False):
+            dashboard_refresher.mark_dashboard_dirty("smart")
+        Timer.assert_not_called()
+
+    def test_changes_covered_by_another_process_are_not_refreshed_again(
+        self, Timer, dashboard_smart, dashboard_normal
+    ):
+        self.mark_burst("smart")
+        other_process_refresh = Timer.call_args.args[1]
+        self.forget_pending()
+        self.mark_burst("smart")
+        this_process_refresh = Timer.call_args.args[1]
+
+        other_process_refresh()
+        self.assertEqual(dashboard_smart.call_count, 1)
+        # The pending process only saw changes the refresh above covered
+        this_process_refresh()
+        self.assertEqual(dashboard_smart.call_count, 1)
+
+    def test_refresh_running_elsewhere_is_retried(self, Timer, dashboard_smart, dashboard_normal):
+        self.mark_burst("smart")
+        run_refresh = Timer.call_args.args[1]
+        cache.add("dashboard_refresh:lock:smart", 1)
+
+        run_refresh()
+        dashboard_smart.assert_not_called()
+        self.assertEqual(Timer.call_count, 2)
+
+        cache.delete("dashboard_refresh:lock:smart")
+        Timer.call_args.args[1]()
+        dashboard_smart.assert_called_once()
+
+
+class TransferSearchTests(TestCase):
+    def setUp(self):
+        for code, requested_by in (("FAR-0012", "John Smith"), ("FAR-12", "Jane Doe"), ("AFR-0120", "john doe")):
+            xx_BudgetTransfer.objects.create(
+                amount=1, status="pending", transaction_date="2025-01-01", code=code, requested_by=requested_by
+            )
+
+    def search(self, text):
+        transfers = filter_transfers_by_search(xx_BudgetTransfer.objects.all(), text)
+        return sorted(transfers.values_list("code", flat=True))
+
+    def test_values_are_split_into_tokens(self):
+        self.assertEqual(tokenize_value(" far-0012 "), {"FAR-0012", "FAR", "0012"})
+        self.assertEqual(tokenize_value(None), set())
+
+    def test_every_word_must_prefix_a_token(self):
+        self.assertEqual(self.search("john"), ["AFR-0120", "FAR-0012"])
+        self.assertEqual(self.search("JOHN doe"), ["AFR-0120"])
+        self.assertEqual(self.search("far-12"), ["FAR-12"])
+
+    def test_words_inside_tokens_fall_back_to_substring_search(self):
+        self.assertEqual(self.search("r-00"), ["FAR-0012"])
+        self.assertEqual(self.search("ohn doe"), ["AFR-0120"])
+        self.assertEqual(self.search("nobody"), [])
+
+    def test_exact_code_ranks_first(self):
+        transfers = filter_transfers_by_search(xx_BudgetTransfer.objects.all(), "far-12")
+        self.assertEqual(transfers.get().search_rank, 0)
+
+
+class ListBudgetTransferViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="lister", role="admin"))
+        for code in ("FAR-1", "FAR-12", "AFR-0120", "FAR-100"):
+            xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x", code=code)
+
+    def get(self, **params):
+        return self.client.get(reverse("budget_management:list-budget-transfers"), params)
+
+    def test_search_keeps_its_ranking(self):
+        # The exact code ranks ahead of newer prefix matches
+        response = self.get(search="far-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["code"] for row in response.data["results"]], ["FAR-1", "FAR-100", "FAR-12"])
+
+    def test_search_cannot_be_combined_with_cursor(self):
+        for cursor in ("", encode_cursor(["2025-01-01T00:00:00+00:00", 1])):
+            with self.subTest(cursor=cursor):
+                response = self.get(search="far-1", cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get(cursor="").status_code, 200)
+
+    def test_pages_are_sliced_in_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(page=2, page_size=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["code"] for row in response.data["results"]], ["FAR-1"])
+        self.assertEqual(response.data["count"], 4)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(response.data["previous"], "?page=1&page_size=3")
+        selects = [query["sql"] for query in queries.captured_queries if "XX_BUDGET_TRANSFER_XX" in query["sql"]]
+        self.assertTrue(any("COUNT(" in sql for sql in selects))
+        self.assertTrue(any("LIMIT 3 OFFSET 3" in sql for sql in selects))
+
+    def test_count_false_skips_the_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(page=1, page_size=3, count="false")
+        self.assertEqual([row["code"] for row in response.data["results"]], ["FAR-100", "AFR-0120", "FAR-12"])
+        self.assertIsNone(response.data["count"])
+        self.assertEqual(response.data["next"], "?page=2&page_size=3")
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if "COUNT(" in query["sql"] and "XX_BUDGET_TRANSFER_XX" in query["sql"]
+        ])
+
+        response = self.get(page=2, page_size=3, count="false")
+        self.assertEqual([row["code"] for row in response.data["results"]], ["FAR-1"])
+        self.assertIsNone(response.data["next"])
+
+    def test_non_numeric_page_is_rejected(self):
+        for params in ({"page": "abc"}, {"page_size": "ten"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+
+class ListBudgetTransferDateRangeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="lister", role="admin"))
+        dubai = datetime.timezone(datetime.timedelta(hours=4))
+        for code, request_date in (
+            ("LAST-OF-JAN", datetime.datetime(2025, 1, 31, 23, 59, 59, 999999, tzinfo=dubai)),
+            ("FIRST-OF-FEB", datetime.datetime(2025, 2, 1, 0, 0, tzinfo=dubai)),
+            ("LAST-OF-FEB-1", datetime.datetime(2025, 2, 1, 23, 59, 59, tzinfo=dubai)),
+            ("FEB-2", datetime.datetime(2025, 2, 2, 0, 0, tzinfo=dubai)),
+            ("FIRST-OF-MAR", datetime.datetime(2025, 3, 1, 0, 0, tzinfo=dubai)),
+        ):
+            transfer = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x", code=code)
+            xx_BudgetTransfer.objects.filter(pk=transfer.pk).update(request_date=request_date)
+
+    def codes(self, **params):
+        # Dates are interpreted in the active time zone
+        with timezone.override("Asia/Dubai"):
+            response = self.client.get(reverse("budget_management:list-budget-transfers"), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row["code"] for row in response.data["results"])
+
+    def test_day_is_half_open_at_local_midnight(self):
+        self.assertEqual(self.codes(day="2025-02-01"), ["FIRST-OF-FEB", "LAST-OF-FEB-1"])
+        self.assertEqual(self.codes(day="2025-01-31"), ["LAST-OF-JAN"])
+
+    def test_month_and_year_end_at_the_next_period(self):
+        self.assertEqual(self.codes(month="2025-02"), ["FEB-2", "FIRST-OF-FEB", "LAST-OF-FEB-1"])
+        self.assertEqual(self.codes(month="1", year="2025"), ["LAST-OF-JAN"])
+        self.assertEqual(len(self.codes(year="2025")), 5)
+
+    def test_date_range_includes_both_days(self):
+        self.assertEqual(
+            self.codes(start_date="2025-02-02", end_date="2025-02-01"), ["FEB-2", "FIRST-OF-FEB", "LAST-OF-FEB-1"]
+        )
+
+
+class NormalDashboardTests(TestCase):
+    def test_histogram_matches_the_per_row_dates(self):
+        utc = datetime.timezone.utc
+        for request_date, status, code in (
+            (datetime.datetime(2025, 1, 31, 19, 59, tzinfo=utc), "approved", "FAR-1"),
+            (datetime.datetime(2025, 1, 31, 20, 0, tzinfo=utc), "pending", "AFR-1"),
+            (datetime.datetime(2025, 1, 31, 23, 30, tzinfo=utc), "rejected", "FAD-1"),
+            (datetime.datetime(2025, 2, 1, 8, 0, tzinfo=utc), "pending", "FAR-2"),
+        ):
+            transfer = xx_BudgetTransfer.objects.create(amount=1, status=status, transaction_date="x", code=code)
+            xx_BudgetTransfer.objects.filter(pk=transfer.pk).update(request_date=request_date)
+
+        # Days are counted in the active time zone, so 20:00 UTC is already
+        # the next day in Dubai
+        with timezone.override("Asia/Dubai"):
+            data = compute_normal_dashboard(xx_BudgetTransfer.objects.all())
+            daily = {}
+            monthly = {}
+            for request_date in xx_BudgetTransfer.objects.values_list("request_date", flat=True):
+                day = timezone.localtime(request_date).date()
+                daily[day.isoformat()] = daily.get(day.isoformat(), 0) + 1
+                monthly[day.strftime("%Y-%m")] = monthly.get(day.strftime("%Y-%m"), 0) + 1
+
+        histogram = data["request_date_histogram"]
+        self.assertEqual({row["date"]: row["count"] for row in histogram["daily"]}, daily)
+        self.assertEqual({row["month"]: row["count"] for row in histogram["monthly"]}, monthly)
+        self.assertEqual(daily, {"2025-01-31": 1, "2025-02-01": 3})
+        self.assertEqual(
+            (data["total_transfers"], data["approved_transfers"], data["pending_transfers"], data["total_transfers_far"]),
+            (4, 1, 2, 2),
+        )
+        self.assertEqual(data["request_dates"][0], "2025-02-01T08:00:00+00:00")
+
+
+class SmartDashboardTotalsTests(TestCase):
+    def setUp(self):
+        self.approved = self.make_transfer("approved", [(1000, 5000, 10, 0), (1001, 5000, 0, 10)])
+        self.pending = self.make_transfer("pending", [(1000, 5000, 5, 0), (1002, 5001, 0, 5)])
+
+    def make_transfer(self, status, lines):
+        transfer = xx_BudgetTransfer.objects.create(amount=1, status="pending", transaction_date="x")
+        for cost_center_code, account_code, from_center, to_center in lines:
+            xx_TransactionTransfer.objects.create(
+                transaction=transfer,
+                cost_center_code=cost_center_code,
+                account_code=account_code,
+                from_center=from_center,
+                to_center=to_center,
+            )
+        if status != "pending":
+            transfer.status = status
+            transfer.save()
+        return transfer
+
+    def totals(self):
+        return sorted(
+            xx_DashboardSmartAggregate.objects.values_list(
+                "cost_center_code", "account_code", "total_from_center", "total_to_center", "line_count"
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        maintained = self.totals()
+        rebuild_smart_dashboard_aggregates()
+        self.assertEqual(maintained, self.totals())
+
+    def test_approve(self):
+        self.assertEqual([row[:2] for row in self.totals()], [(1000, 5000), (1001, 5000)])
+        self.pending.status = "approved"
+        self.pending.save()
+        self.assertEqual(len(self.totals()), 3)
+        self.assertMatchesRebuild()
+
+    def test_unapprove(self):
+        self.approved.status = "rejected"
+        self.approved.save()
+        self.assertEqual(self.totals(), [])
+        self.assertMatchesRebuild()
+
+    def test_delete_transfer(self):
+        self.make_transfer("approved", [(1000, 5000, 7, 0)])
+        self.approved.delete()
+        self.pending.delete()
+        self.assertEqual(len(self.totals()), 1)
+        self.assertMatchesRebuild()
+
+    def test_edit_lines_of_an_approved_transfer(self):
+        line = self.approved.adjd_transfers.get(cost_center_code=1000)
+        line.from_center = 25
+        line.save()
+        line = self.approved.adjd_transfers.get(cost_center_code=1001)
+        line.cost_center_code = 1003
+        line.save()
+        self.assertMatchesRebuild()
+
+        xx_TransactionTransfer.objects.create(
+            transaction=self.approved, cost_center_code=1004, account_code=5000, from_center=3, to_center=0
+        )
+        self.assertMatchesRebuild()
+
+        self.approved.adjd_transfers.filter(cost_center_code=1000).delete()
+        self.approved.adjd_transfers.get(cost_center_code=1003).delete()
+        self.assertMatchesRebuild()
+
+    def test_lines_of_other_transfers_do_not_count(self):
+        line = self.pending.adjd_transfers.get(cost_center_code=1000)
+        line.from_center = 99
+        line.save()
+        line.delete()
+        self.assertMatchesRebuild()
+
+    def test_failed_delta_fails_the_save(self):
+        self.pending.status = "approved"
+        with mock.patch(
+            "budget_management.signals.budget_trasnfer.apply_smart_dashboard_delta", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.pending.save()
+
+
+@mock.patch("budget_transfer.global_function.dashboard_refresher._schedule_refresh")
+class ApproveRejectBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(xx_User.objects.create(username="approver", role="admin"))
+        XX_PivotFund.objects.create(entity="1000", account="5000", year=2025)
+        self.funded = self.make_transfer("FAR-0001", 1000)
+        self.unfunded = self.make_transfer("FAR-0002", 1999)
+
+    def make_transfer(self, code, cost_center_code):
+        transfer = xx_BudgetTransfer.objects.create(
+            amount=1, status="pending", status_level=2, transaction_date="x", code=code, fy=2025
+        )
+        xx_TransactionTransfer.objects.create(
+            transaction=transfer, cost_center_code=cost_center_code, account_code=5000, from_center=10, to_center=0
+        )
+        return transfer
+
+    def reject(self, *transfers):
+        return self.client.post(
+            reverse("budget_management:adjd-transaction-approve-reject"),
+            [{"transaction_id": [transfer.pk], "decide": [3], "reason": ["No budget"]} for transfer in transfers],
+            format="json",
+        )
+
+    def test_each_item_is_saved_or_rolled_back_as_a_whole(self, _schedule_refresh):
+        response = self.reject(self.funded, self.unfunded)
+
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data["results"]
+        self.assertEqual((first["transaction_id"], first["status"]), (self.funded.pk, "rejected"))
+        self.assertEqual((second["transaction_id"], second["status"]), (self.unfunded.pk, "error"))
+        self.assertEqual([line["cost_center_code"] for line in second["missing_pivot_funds"]], [1999])
+
+        self.funded.refresh_from_db()
+        self.unfunded.refresh_from_db()
+        self.assertEqual((self.funded.status, self.funded.status_level), ("rejected", -1))
+        self.assertEqual((self.unfunded.status, self.unfunded.status_level), ("pending", 2))
+        self.assertEqual(
+            list(xx_BudgetTransferRejectReason.objects.values_list("Transcation_id", flat=True)), [self.funded.pk]
+        )
+        self.assertEqual(XX_PivotFundMovement.objects.count(), 1)
+
+    def test_invalid_item_saves_nothing(self, _schedule_refresh):
+        response = self.client.post(
+            reverse("budget_management:adjd-transaction-approve-reject"),
+            [
+                {"transaction_id": [self.funded.pk], "decide": [3], "reason": ["No budget"]},
+                {"transaction_id": [self.unfunded.pk], "decide": [3]},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.funded.refresh_from_db()
+        self.assertEqual(self.funded.status, "pending")
+        self.assertFalse(xx_BudgetTransferRejectReason.objects.exists())
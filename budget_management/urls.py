@@ -11,6 +11,7 @@ from .views import (
     BudgetTransferFileUploadView,
     DeleteBudgetTransferAttachmentView,
     ListBudgetTransferAttachmentsView,
+    DownloadBudgetTransferAttachmentView,
     list_budget_transfer_reject_reason,
     DashboardBudgetTransferView,
     ListBudgetTransfer_approvels_MobileView
@@ -39,6 +40,7 @@ urlpatterns = [
     path('transfers/list-files/', ListBudgetTransferAttachmentsView.as_view(), name='budget-transfer-list-files'),
 
     path('transfers/<int:transfer_id>/attachments/<int:attachment_id>/', DeleteBudgetTransferAttachmentView.as_view(), name='budget-transfer-delete-attachment'),
+    path('transfers/<int:transfer_id>/attachments/<int:attachment_id>/download/', DownloadBudgetTransferAttachmentView.as_view(), name='budget-transfer-download-attachment'),
     path('transfers/list_reject/', list_budget_transfer_reject_reason.as_view(), name='budget-transfer-delete-attachment'),
 
 
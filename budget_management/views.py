@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Q, Sum
 from django.db.models.functions import Cast
@@ -19,14 +20,22 @@ from .models import (
 )
 from account_and_entitys.models import XX_PivotFund, XX_Entity, XX_Account
 from adjd_transaction.models import xx_TransactionTransfer
+from .attachments import build_attachment_response, create_attachment_from_upload
+from .search_index import filter_transfers_by_search
 from .serializers import BudgetTransferSerializer
 from user_management.permissions import IsAdmin, CanTransferBudget
 from budget_transfer.global_function.dashbaord import (
+    compute_normal_dashboard,
     get_all_dashboard_data, 
     get_saved_dashboard_data, 
     refresh_dashboard_data
 )
-from public_funtion.update_pivot_fund import update_pivot_fund
+from budget_transfer.global_function.dashboard_cache import (
+    get_cached_dashboard_section,
+    set_cached_dashboard_section,
+)
+from public_funtion.update_pivot_fund import apply_pivot_fund_updates
+from public_funtion.keyset_pagination import get_keyset_page_size, paginate_by_keyset
 import base64
 from django.db.models.functions import Cast
 from django.db.models import CharField
@@ -43,7 +52,7 @@ from collections import defaultdict
 from decimal import Decimal
 import time
 from itertools import islice
-from django.db import connection
+from django.db import connection, transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -139,10 +148,16 @@ class CreateBudgetTransferView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 class ListBudgetTransferView(APIView):
-    """List budget transfers with pagination"""
+    """List budget transfers with pagination
+
+    Pass ``cursor`` (empty for the first page) to use keyset pagination on
+    (request_date, transaction_id) instead of page numbers. Search results
+    are ordered by rank, so ``search`` cannot be combined with ``cursor``.
+    """
 
     permission_classes = [IsAuthenticated]
     pagination_class = TransferPagination
+    keyset_ordering = ("-request_date", "-transaction_id")
 
     def get(self, request):
         status_type = request.query_params.get("status_type", None)
@@ -154,6 +169,13 @@ class ListBudgetTransferView(APIView):
         edate = request.query_params.get("end_date")
         code = request.query_params.get("code", None)
 
+        if search and "cursor" in request.GET:
+            # The keyset order would silently replace the search ranking
+            return Response(
+                {"error": "search results are paged by page number; cursor cannot be combined with search"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         transfers = xx_BudgetTransfer.objects.all()
         # Apply user restriction if not admin
         if not IsAdmin().has_permission(request, self):
@@ -177,26 +199,12 @@ class ListBudgetTransferView(APIView):
         if request.user.abilities.count() > 0:
             transfers = filter_budget_transfers_all_in_entities(budget_transfers=transfers, user=request.user, Type='edit')
 
-        # Free-text search across common fields (icontains)
+        # Free-text search through the transfer token index (exact code matches rank first)
         if search:
-            s = str(search).strip()
-            query = (
-                Q(code__icontains=s)
-                | Q(requested_by__icontains=s)
-                | Q(status__icontains=s)
-                | Q(transaction_date__icontains=s)
-                | Q(type__icontains=s)
-            )
-            if s.isdigit():
-                # Support numeric search on transaction_id
-                try:
-                    query |= Q(transaction_id=int(s))
-                except Exception:
-                    pass
-            transfers = transfers.filter(query)
+            transfers = filter_transfers_by_search(transfers, search)
         
         try:
-            from datetime import datetime as _dt
+            from datetime import datetime as _dt, timedelta as _td
 
             def _validate(fmt, value):
                 try:
@@ -204,28 +212,40 @@ class ListBudgetTransferView(APIView):
                     return True
                 except Exception:
                     return False
-                
+
+            def _start_of(yi, mi=1, di=1):
+                return timezone.make_aware(_dt(yi, mi, di))
+
+            # Every filter is a half-open range [start, end) on request_date so the
+            # (user_id, request_date) index is range scanned; startswith would cast
+            # each timestamp to text first
             if day:
                 if not _validate("%Y-%m-%d", day):
                     return Response({"error": "Invalid day format. Use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
-                transfers = transfers.filter(request_date__startswith=day)
+                start = timezone.make_aware(_dt.strptime(day, "%Y-%m-%d"))
+                transfers = transfers.filter(request_date__gte=start, request_date__lt=start + _td(days=1))
             elif month:
                 mval = str(month)
-                prefix = None
+                period = None
                 if _validate("%Y-%m", mval):
-                    prefix = mval
+                    parsed = _dt.strptime(mval, "%Y-%m")
+                    period = (parsed.year, parsed.month)
                 else:
                     if year:
                         try:
                             yi = int(year)
                             mi = int(mval)
                             if 1 <= mi <= 12 and 1900 <= yi <= 2100:
-                                prefix = f"{yi}-{mi:02d}"
+                                period = (yi, mi)
                         except Exception:
                             pass
-                if not prefix:
+                if not period:
                     return Response({"error": "Invalid month. Provide YYYY-MM or month with 'year'"}, status=status.HTTP_400_BAD_REQUEST)
-                transfers = transfers.filter(request_date__startswith=prefix)
+                yi, mi = period
+                next_yi, next_mi = (yi + 1, 1) if mi == 12 else (yi, mi + 1)
+                transfers = transfers.filter(
+                    request_date__gte=_start_of(yi, mi), request_date__lt=_start_of(next_yi, next_mi)
+                )
             elif year:
                 try:
                     yi = int(year)
@@ -233,7 +253,7 @@ class ListBudgetTransferView(APIView):
                         raise ValueError()
                 except Exception:
                     return Response({"error": "Invalid year. Use YYYY in range 1900-2100"}, status=status.HTTP_400_BAD_REQUEST)
-                transfers = transfers.filter(request_date__startswith=f"{int(year)}-")
+                transfers = transfers.filter(request_date__gte=_start_of(yi), request_date__lt=_start_of(yi + 1))
             elif sdate and edate:
                 sd = str(sdate)
                 ed = str(edate)
@@ -241,17 +261,22 @@ class ListBudgetTransferView(APIView):
                     return Response({"error": "Invalid date range. Use YYYY-MM-DD for start_date and end_date"}, status=status.HTTP_400_BAD_REQUEST)
                 if sd > ed:
                     sd, ed = ed, sd
-                transfers = transfers.filter(request_date__gte=sd, request_date__lte=ed)
+                # Both dates are inclusive: the range ends at the start of the day after end_date
+                start = timezone.make_aware(_dt.strptime(sd, "%Y-%m-%d"))
+                end = timezone.make_aware(_dt.strptime(ed, "%Y-%m-%d")) + _td(days=1)
+                transfers = transfers.filter(request_date__gte=start, request_date__lt=end)
         except Exception as _date_err:
             return Response({"error": f"Failed to apply date filter: {_date_err}"}, status=status.HTTP_400_BAD_REQUEST)
 
 
         # Use only safe fields for ordering to avoid Oracle NCLOB issues
-        transfers = transfers.order_by("-transaction_id")
+        if search:
+            transfers = transfers.order_by("search_rank", "-transaction_id")
+        else:
+            transfers = transfers.order_by("-transaction_id")
         
-        # Convert to list to avoid lazy evaluation issues with Oracle
         # Exclude TextField columns that become NCLOB in Oracle
-        transfer_list = list(transfers.values(
+        transfer_values = transfers.values(
             'transaction_id', 'transaction_date', 'amount', 'status', 
             'requested_by', 'user_id', 'request_date', 'code', 
             'gl_posting_status', 'approvel_1', 'approvel_2', 'approvel_3', 'approvel_4',
@@ -260,27 +285,59 @@ class ListBudgetTransferView(APIView):
             'reject_group_id', 'reject_interface_id', 'approve_group_id', 'approve_interface_id',
             'report', 'type'
             # Excluding 'notes' field as it's TextField/NCLOB in Oracle
-        ))
+        )
+
+        if "cursor" in request.GET:
+            page_size = get_keyset_page_size(request, TransferPagination.page_size, TransferPagination.max_page_size)
+            try:
+                paginated_data, next_cursor = paginate_by_keyset(
+                    transfer_values, self.keyset_ordering, request.GET.get("cursor"), page_size
+                )
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'results': paginated_data,
+                'next_cursor': next_cursor,
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+            })
         
-        # Manual pagination to avoid Oracle issues
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 10))
+        # Paginate in the database (OFFSET/FETCH) so only the requested page is loaded
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = max(int(request.GET.get('page_size', 10)), 1)
+        except (TypeError, ValueError):
+            return Response({"error": "page and page_size must be integers"}, status=status.HTTP_400_BAD_REQUEST)
         start_idx = (page - 1) * page_size
         end_idx = start_idx + page_size
-        
-        paginated_data = transfer_list[start_idx:end_idx]
+
+        # count=false skips the COUNT query; one extra row tells whether a next page exists
+        include_count = str(request.GET.get('count', 'true')).lower() not in ('false', '0', 'no')
+        if include_count:
+            total_count = transfers.count()
+            paginated_data = list(transfer_values[start_idx:end_idx])
+            has_next = end_idx < total_count
+        else:
+            total_count = None
+            paginated_data = list(transfer_values[start_idx:end_idx + 1])
+            has_next = len(paginated_data) > page_size
+            paginated_data = paginated_data[:page_size]
         
         return Response({
             'results': paginated_data,
-            'count': len(transfer_list),
-            'next': f"?page={page + 1}&page_size={page_size}" if end_idx < len(transfer_list) else None,
+            'count': total_count,
+            'next': f"?page={page + 1}&page_size={page_size}" if has_next else None,
             'previous': f"?page={page - 1}&page_size={page_size}" if page > 1 else None
         })
 class ListBudgetTransfer_approvels_View(APIView):
-    """List budget transfers with pagination"""
+    """List budget transfers with pagination
+
+    Pass ``cursor`` (empty for the first page) to use keyset pagination on
+    (request_date, transaction_id) instead of page numbers.
+    """
 
     permission_classes = [IsAuthenticated]
     pagination_class = TransferPagination
+    keyset_ordering = ("-request_date", "-transaction_id")
 
     def get(self, request):
         code = request.query_params.get("code", None)
@@ -307,14 +364,32 @@ class ListBudgetTransfer_approvels_View(APIView):
 
         transfers = transfers.order_by("-request_date")
 
+        if "cursor" in request.query_params:
+            page_size = get_keyset_page_size(request, self.pagination_class.page_size, self.pagination_class.max_page_size)
+            try:
+                page, next_cursor = paginate_by_keyset(
+                    transfers, self.keyset_ordering, request.query_params.get("cursor"), page_size
+                )
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                "results": self._summarise(BudgetTransferSerializer(page, many=True).data),
+                "next_cursor": next_cursor,
+                "next": f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+            })
+
         # Paginate results
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(transfers, request, view=self)
         serializer = BudgetTransferSerializer(page, many=True)
 
+        return paginator.get_paginated_response(self._summarise(serializer.data))
+
+    @staticmethod
+    def _summarise(serialized_transfers):
         # Create a list of dictionaries with just the fields we want
         filtered_data = []
-        for item in serializer.data:
+        for item in serialized_transfers:
             filtered_item = {
                 "transaction_id": item.get("transaction_id"),
                 "amount": item.get("amount"),
@@ -326,8 +401,9 @@ class ListBudgetTransfer_approvels_View(APIView):
                 "transaction_date": item.get("transaction_date"),
             }
             filtered_data.append(filtered_item)
+        return filtered_data
+
 
-        return paginator.get_paginated_response(filtered_data)
 class ApproveBudgetTransferView(APIView):
     """Approve or reject budget transfer requests (admin only)"""
 
@@ -541,13 +617,12 @@ class Adjdtranscationtransferapprovel_reject(APIView):
         else:
             # Handle single transaction case
             items_to_process = [request.data]
-        results = []
-        # Process each transaction
+        # Validate every item before any of them is saved
+        decisions = []
         for item in items_to_process:
             transaction_id = item.get("transaction_id")[0]
             decide = item.get("decide")[0]
-            if item.get("reason") is not None:
-                reson = item.get("reason")[0]
+            reson = item.get("reason")[0] if item.get("reason") is not None else None
             # Validate required fields
             if not transaction_id:
                 return Response(
@@ -573,98 +648,116 @@ class Adjdtranscationtransferapprovel_reject(APIView):
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+            decisions.append((transaction_id, decide, reson))
+        results = []
+        # Process each transaction; each one is saved or rolled back as a
+        # whole and its outcome reported in results
+        for transaction_id, decide, reson in decisions:
             try:
-                # Get the transfer record - use get() for single record
-                trasncation = xx_BudgetTransfer.objects.get(
-                    transaction_id=transaction_id
-                )
-                # Get the transfer type code
-                code = trasncation.code.split("-")[0]
-                # Handle approval flow based on transfer type
-                if code == "FAR" or code == "AFR":
-                    max_level = 4
-                else:
-                    max_level = 3
-                # Update approval based on decision
-                if decide == 2 and trasncation.status_level <= max_level:  # Approve
-                    level = trasncation.status_level
-                    # Set the appropriate approval fields
-                    if level == 2:
-                        trasncation.approvel_2 = request.user.username
-                        trasncation.approvel_2_date = timezone.now()
-                    elif level == 3:
-                        trasncation.approvel_3 = request.user.username
-                        trasncation.approvel_3_date = timezone.now()
-                    elif level == 4:
-                        trasncation.approvel_4 = request.user.username
-                        trasncation.approvel_4_date = timezone.now()
-                    if trasncation.status_level == max_level:
-                        trasncation.status = "approved"
-                    trasncation.status_level += 1
-                elif decide == 3:  # Reject
-                    # Record who rejected it at the current level
-                    level = trasncation.status_level
-                    if level == 2:
-                        trasncation.approvel_2 = request.user.username
-                        trasncation.approvel_2_date = timezone.now()
-                    elif level == 3:
-                        trasncation.approvel_3 = request.user.username
-                        trasncation.approvel_3_date = timezone.now()
-                    elif level == 4:
-                        trasncation.approvel_4 = request.user.username
-                        trasncation.approvel_4_date = timezone.now()
-                    trasncation.status_level = -1
-                    Reson_object = xx_BudgetTransferRejectReason.objects.create(
-                        Transcation_id=trasncation,
-                        reason_text=reson,
-                        reject_by=request.user.username,
-                    )
-                    Reson_object.save()
-                    trasncation.status = "rejected"
-                # Save changes to the transfer
-                trasncation.save()
-                # Update pivot fund if final approval or rejection
-                pivot_updates = []
-                if (
-                    max_level == trasncation.status_level and decide == 2
-                ) or decide == 3:
-                    trasfers = xx_TransactionTransfer.objects.filter(
+                with transaction.atomic():
+                    # Get the transfer record - use get() for single record
+                    trasncation = xx_BudgetTransfer.objects.get(
                         transaction_id=transaction_id
                     )
-                    for transfer in trasfers:
-                        try:
-                            # Extract the necessary data
-                            item_cost_center = transfer.cost_center_code
-                            item_account_code = transfer.account_code
-                            from_center = transfer.from_center or 0
-                            to_center = transfer.to_center or 0
-                            # Update the pivot fund
-                            update_result = update_pivot_fund(
-                                item_cost_center,
-                                item_account_code,
-                                from_center,
-                                to_center,
-                                decide,
-                            )
-                            if update_result:
-                                pivot_updates.append(update_result)
-                        except Exception as e:
-                            return Response(
+                    # Get the transfer type code
+                    code = trasncation.code.split("-")[0]
+                    # Handle approval flow based on transfer type
+                    if code == "FAR" or code == "AFR":
+                        max_level = 4
+                    else:
+                        max_level = 3
+                    # Update approval based on decision
+                    if decide == 2 and trasncation.status_level <= max_level:  # Approve
+                        level = trasncation.status_level
+                        # Set the appropriate approval fields
+                        if level == 2:
+                            trasncation.approvel_2 = request.user.username
+                            trasncation.approvel_2_date = timezone.now()
+                        elif level == 3:
+                            trasncation.approvel_3 = request.user.username
+                            trasncation.approvel_3_date = timezone.now()
+                        elif level == 4:
+                            trasncation.approvel_4 = request.user.username
+                            trasncation.approvel_4_date = timezone.now()
+                        if trasncation.status_level == max_level:
+                            trasncation.status = "approved"
+                        trasncation.status_level += 1
+                    elif decide == 3:  # Reject
+                        # Record who rejected it at the current level
+                        level = trasncation.status_level
+                        if level == 2:
+                            trasncation.approvel_2 = request.user.username
+                            trasncation.approvel_2_date = timezone.now()
+                        elif level == 3:
+                            trasncation.approvel_3 = request.user.username
+                            trasncation.approvel_3_date = timezone.now()
+                        elif level == 4:
+                            trasncation.approvel_4 = request.user.username
+                            trasncation.approvel_4_date = timezone.now()
+                        trasncation.status_level = -1
+                        xx_BudgetTransferRejectReason.objects.create(
+                            Transcation_id=trasncation,
+                            reason_text=reson,
+                            reject_by=request.user.username,
+                        )
+                        trasncation.status = "rejected"
+                    # Save changes to the transfer
+                    trasncation.save()
+                    # Update pivot fund if final approval or rejection
+                    pivot_updates = []
+                    if (
+                        max_level == trasncation.status_level and decide == 2
+                    ) or decide == 3:
+                        trasfers = list(
+                            xx_TransactionTransfer.objects.filter(
+                                transaction_id=transaction_id
+                            ).values_list("cost_center_code", "account_code", "from_center", "to_center")
+                        )
+                        if trasfers:
+                            try:
+                                # Apply all lines' movements in one batch
+                                update_result = apply_pivot_fund_updates(
+                                    [
+                                        (cost_center, account_code, from_center or 0, to_center or 0)
+                                        for cost_center, account_code, from_center, to_center in trasfers
+                                    ],
+                                    decide,
+                                    year=trasncation.fy,
+                                    transaction_id=transaction_id,
+                                )
+                                pivot_updates = update_result["updated"]
+                            except Exception as e:
+                                # Keep the transfer's status in step with its pivot funds
+                                transaction.set_rollback(True)
+                                results.append(
+                                    {
+                                        "transaction_id": transaction_id,
+                                        "status": "error",
+                                        "message": f"Error updating pivot fund: {str(e)}",
+                                    }
+                                )
+                                continue
+                            if update_result["missing"]:
+                                # Nothing was recorded, so the status must not move on either
+                                transaction.set_rollback(True)
+                                results.append(
+                                    {
+                                        "transaction_id": transaction_id,
+                                        "status": "error",
+                                        "message": f"No PIVOT FUND AVAILABLE: {transaction_id}",
+                                        "missing_pivot_funds": update_result["missing"],
+                                    }
+                                )
+                                continue
+                            # Add the result for this transaction
+                            results.append(
                                 {
-                                    "error": "Error updating pivot fund",
-                                    "message": str(e),
-                                },
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    "transaction_id": transaction_id,
+                                    "status": "approved" if decide == 2 else "rejected",
+                                    "status_level": trasncation.status_level,
+                                    "pivot_updates": pivot_updates,
+                                }
                             )
-                        # Add the result for this transaction
-                        results.append(
-                            {
-                                "transaction_id": transaction_id,
-                                "status": "approved" if decide == 2 else "rejected",
-                                "status_level": trasncation.status_level,
-                                "pivot_updates": pivot_updates,
-                            }
-                        )
             except xx_BudgetTransfer.DoesNotExist:
                 results.append(
                     {
@@ -718,17 +811,8 @@ class BudgetTransferFileUploadView(APIView):
             # Process each uploaded file
             uploaded_files = []
             for file_key, uploaded_file in request.FILES.items():
-                # Read the file data
-                file_data = uploaded_file.read()
-
-                # Create the attachment record
-                attachment = xx_BudgetTransferAttachment.objects.create(
-                    budget_transfer=transfer,
-                    file_name=uploaded_file.name,
-                    file_type=uploaded_file.content_type,
-                    file_size=len(file_data),
-                    file_data=file_data,
-                )
+                # Create the attachment record, writing the file in chunks
+                attachment = create_attachment_from_upload(transfer, uploaded_file)
 
                 uploaded_files.append(
                     {
@@ -844,6 +928,9 @@ class DeleteBudgetTransferAttachmentView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 class ListBudgetTransferAttachmentsView(APIView):
+    """List attachment metadata for a transfer; file contents are served by
+    DownloadBudgetTransferAttachmentView"""
+
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -853,7 +940,7 @@ class ListBudgetTransferAttachmentsView(APIView):
             # Retrieve the main budget transfer record
             transfer = xx_BudgetTransfer.objects.get(transaction_id=transfer_id)
 
-            # Fetch related attachments
+            # Fetch related attachments (the default manager leaves out the BLOBs)
             attachments = xx_BudgetTransferAttachment.objects.filter(
                 budget_transfer=transfer
             )
@@ -861,15 +948,17 @@ class ListBudgetTransferAttachmentsView(APIView):
             # Build a simplified response
             data = []
             for attach in attachments:
-                encoded_data = base64.b64encode(attach.file_data).decode("utf-8")
                 data.append(
                     {
                         "attachment_id": attach.attachment_id,
                         "file_name": attach.file_name,
                         "file_type": attach.file_type,
                         "file_size": attach.file_size,
-                        "file_data": encoded_data,  # base64-encoded
                         "upload_date": attach.upload_date,
+                        "download_url": reverse(
+                            "budget_management:budget-transfer-download-attachment",
+                            args=[transfer.transaction_id, attach.attachment_id],
+                        ),
                     }
                 )
 
@@ -881,6 +970,31 @@ class ListBudgetTransferAttachmentsView(APIView):
             return Response(
                 {"error": "Transfer not found"}, status=status.HTTP_404_NOT_FOUND
             )
+
+
+class DownloadBudgetTransferAttachmentView(APIView):
+    """Stream one attachment's file in chunks (supports Range and ETag)"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, transfer_id, attachment_id):
+        try:
+            attachment = (
+                xx_BudgetTransferAttachment.objects.select_related("blob")
+                .defer("blob__file_data")
+                .get(attachment_id=attachment_id, budget_transfer_id=transfer_id)
+            )
+        except xx_BudgetTransferAttachment.DoesNotExist:
+            return Response(
+                {
+                    "error": "Attachment not found",
+                    "message": f"No attachment found with ID {attachment_id} for this transfer",
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return build_attachment_response(request, attachment)
+
+
 class list_budget_transfer_reject_reason(APIView):
     """List all budget transfer reject reasons"""
 
@@ -985,84 +1099,32 @@ class DashboardBudgetTransferView(APIView):
 
             DashBoard_filler_per_Project = request.query_params.get('DashBoard_filler_per_Project', None)
 
-            start_time = time.time()
-            print("Starting optimized normal dashboard calculation...")
-
-            # PHASE 1: Database-level counting and aggregations
-            count_start = time.time()
+            # Serve sections already cached for this entity scope unless a refresh is forced
+            if not force_refresh:
+                for section in ("normal", "smart"):
+                    if dashboard_type == section or dashboard_type == "all":
+                        cached = get_cached_dashboard_section(request.user, section, DashBoard_filler_per_Project)
+                        if cached is not None:
+                            return_data[section] = cached
+                if return_data and (dashboard_type != "all" or len(return_data) == 2):
+                    return Response(return_data, status=status.HTTP_200_OK)
 
-            # Get all transfers with minimal data loading
-            transfers_queryset = xx_BudgetTransfer.objects.only(
-            'code', 'status', 'status_level', 'request_date'
-            )
-            # if request.user.abilities.count() > 0:
-            print(len(transfers_queryset))
-            transfers_queryset = filter_budget_transfers_all_in_entities(transfers_queryset, request.user, 'edit',dashboard_filler_per_project=DashBoard_filler_per_Project)
-            print(len(transfers_queryset))
+            start_time = time.time()
 
-            if dashboard_type=="normal"  or dashboard_type=="all":
+            if (dashboard_type=="normal"  or dashboard_type=="all") and "normal" not in return_data:
                 # Use database aggregations for counting
                 try:
+                    print("Starting optimized normal dashboard calculation...")
 
-                    total_count = transfers_queryset.count()
-
-                    # Count by status using database aggregation
-                    status_counts = transfers_queryset.aggregate(
-                        approved=Count('transaction_id', filter=Q(status='approved')),
-                        rejected=Count('transaction_id', filter=Q(status='rejected')),
-                        pending=Count('transaction_id', filter=Q(status='pending'))
-                    )
-
-                    # Count by status level using database aggregation
-                    level_counts = transfers_queryset.aggregate(
-                        level1=Count('transaction_id', filter=Q(status_level=1)),
-                        level2=Count('transaction_id', filter=Q(status_level=2)),
-                        level3=Count('transaction_id', filter=Q(status_level=3)),
-                        level4=Count('transaction_id', filter=Q(status_level=4))
-                    )
-
-                    # Count by code prefix using database functions
-                    code_counts = transfers_queryset.aggregate(
-                        far=Count('transaction_id', filter=Q(code__istartswith='FAR')),
-                        afr=Count('transaction_id', filter=Q(code__istartswith='AFR')),
-                        fad=Count('transaction_id', filter=Q(code__istartswith='FAD'))
-                    )
-
-                    # Get request dates efficiently (only non-null dates)
-                    request_dates = list(
-                        transfers_queryset.filter(request_date__isnull=False)
-                        .values_list('request_date', flat=True)
-                        .order_by('-request_date')[:1000]  # Limit to recent 1000 for performance
+                    # Get all transfers with minimal data loading
+                    transfers_queryset = xx_BudgetTransfer.objects.only(
+                    'code', 'status', 'status_level', 'request_date'
                     )
+                    transfers_queryset = filter_budget_transfers_all_in_entities(transfers_queryset, request.user, 'edit',dashboard_filler_per_project=DashBoard_filler_per_Project)
 
-                    # Convert datetime objects to ISO format strings for JSON serialization
-                    request_dates_iso = [date.isoformat() for date in request_dates]
-
-                    print(f"Database counting completed in {time.time() - count_start:.2f}s")
-
-                    # PHASE 2: Format response data
-                    data = {
-                        "total_transfers": total_count,
-                        "total_transfers_far": code_counts['far'],
-                        "total_transfers_afr": code_counts['afr'],
-                        "total_transfers_fad": code_counts['fad'],
-                        "approved_transfers": status_counts['approved'],
-                        "rejected_transfers": status_counts['rejected'],
-                        "pending_transfers": status_counts['pending'],
-                        "pending_transfers_by_level": {
-                            "Level1": level_counts['level1'],
-                            "Level2": level_counts['level2'],
-                            "Level3": level_counts['level3'],
-                            "Level4": level_counts['level4'],
-                        },
-                        "request_dates": request_dates_iso,
-                        "performance_metrics": {
-                            "total_processing_time": round(time.time() - start_time, 2),
-                            "counting_time": round(time.time() - count_start, 2),
-                            "total_records_processed": total_count,
-                            "request_dates_retrieved": len(request_dates_iso)
-                        }
-                    }
+                    # All counters and the request date histogram in one round trip
+                    data = compute_normal_dashboard(transfers_queryset, start_time)
+                    total_count = data["total_transfers"]
 
                     print(f"Total optimized processing time: {time.time() - start_time:.2f}s")
                     print(f"Processed {total_count} transfers")
@@ -1072,6 +1134,7 @@ class DashboardBudgetTransferView(APIView):
                     try:
                         # Ensure a local container exists to store dashboard data
                         return_data['normal'] = data
+                        set_cached_dashboard_section(request.user, 'normal', data, DashBoard_filler_per_Project)
 
                         # If only normal dashboard is requested, return now.
                         if dashboard_type == "normal":
@@ -1080,7 +1143,7 @@ class DashboardBudgetTransferView(APIView):
                         print(f"Error occurred while saving dashboard data: {str(e)}")
                 except Exception as e:
                     print(f"Error occurred while saving dashboard data: {str(e)}")
-            if dashboard_type=="smart" or dashboard_type=="all":
+            if (dashboard_type=="smart" or dashboard_type=="all") and "smart" not in return_data:
                 try:
                     start_time = time.time()
 
@@ -1177,6 +1240,7 @@ class DashboardBudgetTransferView(APIView):
                     save_start = time.time()
                     try:
                         return_data['smart'] = data
+                        set_cached_dashboard_section(request.user, 'smart', data, DashBoard_filler_per_Project)
                         # If only smart dashboard is requested, return now.
                         if dashboard_type == "smart":
                             return Response(return_data, status=status.HTTP_200_OK)
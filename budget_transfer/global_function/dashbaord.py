@@ -6,8 +6,9 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Sum, Count, Case, When, Value, F
-from django.db.models.functions import Cast, Substr, Upper
+from django.db.models.functions import Cast, Substr, Upper, TruncDate
 from django.db.models import CharField, DecimalField
 from user_management.models import xx_notification
 from budget_management.models import (
@@ -15,6 +16,7 @@ from budget_management.models import (
     xx_BudgetTransferAttachment,
     xx_BudgetTransferRejectReason,
     xx_DashboardBudgetTransfer,
+    xx_DashboardSmartAggregate,
 )
 from adjd_transaction.models import xx_TransactionTransfer
 import time
@@ -46,37 +48,34 @@ def dashboard_smart(filter_cost_center=None, filter_account_code=None):
         # PHASE 1: Database-level aggregations for approved transfers
         aggregation_start = time.time()
         
-        # Build base queryset with optimized filtering
-        base_queryset = xx_TransactionTransfer.objects.select_related('transaction').filter(
-            transaction__status="approved"
-        )
-        
+        # Read the maintained (cost center, account) totals instead of
+        # re-aggregating every approved transfer line
+        aggregate_queryset = xx_DashboardSmartAggregate.objects.all()
+
         # Apply additional filters if provided
         if filter_cost_center:
-            base_queryset = base_queryset.filter(cost_center_code=filter_cost_center)
+            aggregate_queryset = aggregate_queryset.filter(cost_center_code=filter_cost_center)
         if filter_account_code:
-            base_queryset = base_queryset.filter(account_code=filter_account_code)
-
-        # Aggregate by cost center code (single database query)
-        cost_center_totals = list(base_queryset.values('cost_center_code').annotate(
-            total_from_center=Sum('from_center'),
-            total_to_center=Sum('to_center')
-        ).order_by('cost_center_code'))
-
-        # Aggregate by account code (single database query)
-        account_code_totals = list(base_queryset.values('account_code').annotate(
-            total_from_center=Sum('from_center'),
-            total_to_center=Sum('to_center')
-        ).order_by('account_code'))
-
-        # Aggregate by combination of cost center and account code (single database query)
-        all_combinations = list(base_queryset.values('cost_center_code', 'account_code').annotate(
-            total_from_center=Sum('from_center'),
-            total_to_center=Sum('to_center')
+            aggregate_queryset = aggregate_queryset.filter(account_code=filter_account_code)
+
+        # Combination of cost center and account code (single database query)
+        all_combinations = list(aggregate_queryset.values(
+            'cost_center_code', 'account_code', 'total_from_center', 'total_to_center'
         ).order_by('cost_center_code', 'account_code'))
 
+        # Roll the combinations up by cost center code and by account code
+        cost_center_totals = _rollup_smart_combinations(all_combinations, 'cost_center_code')
+        account_code_totals = _rollup_smart_combinations(all_combinations, 'account_code')
+
         # Get filtered individual records if filters are applied
         if filter_cost_center or filter_account_code:
+            base_queryset = xx_TransactionTransfer.objects.filter(
+                transaction__status="approved"
+            )
+            if filter_cost_center:
+                base_queryset = base_queryset.filter(cost_center_code=filter_cost_center)
+            if filter_account_code:
+                base_queryset = base_queryset.filter(account_code=filter_account_code)
             filtered_combinations = list(base_queryset.values(
                 'cost_center_code', 'account_code', 'from_center', 'to_center'
             ))
@@ -160,82 +159,264 @@ def dashboard_smart(filter_cost_center=None, filter_account_code=None):
         traceback.print_exc()
         return False
 
-def dashboard_normal():
+def _rollup_smart_combinations(combinations, key):
     """
-    Optimized normal dashboard using database-level aggregations and counting
+    Sum (cost_center_code, account_code) combination rows by a single key,
+    returning rows shaped like ``values(key).annotate(...)`` ordered by key.
     """
-    try:
-        start_time = time.time()
-        print("Starting optimized normal dashboard calculation...")
+    totals = {}
+    for item in combinations:
+        group = totals.setdefault(item[key], {
+            key: item[key],
+            'total_from_center': Decimal('0'),
+            'total_to_center': Decimal('0'),
+        })
+        group['total_from_center'] += item['total_from_center'] or 0
+        group['total_to_center'] += item['total_to_center'] or 0
+
+    # Oracle sorts NULLs last in ascending order; keep the same ordering
+    return [totals[k] for k in sorted(totals, key=lambda v: (v is None, v if v is not None else 0))]
+
 
-        # PHASE 1: Database-level counting and aggregations
-        count_start = time.time()
+def _add_smart_totals(deltas):
+    """
+    Add signed deltas to the maintained smart dashboard totals.
+
+    ``deltas`` maps (cost_center_code, account_code) to (from delta, to
+    delta, line count delta). Missing combinations are created when lines
+    are added; combinations left without lines are dropped.
+    """
+    with transaction.atomic():
+        for (cost_center_code, account_code), (from_delta, to_delta, lines_delta) in deltas.items():
+            if not (from_delta or to_delta or lines_delta):
+                continue
+            key = {'cost_center_code': cost_center_code, 'account_code': account_code}
+            changes = {
+                'total_from_center': F('total_from_center') + from_delta,
+                'total_to_center': F('total_to_center') + to_delta,
+                'line_count': F('line_count') + lines_delta,
+            }
 
-        # Get all transfers with minimal data loading
-        transfers_queryset = xx_BudgetTransfer.objects.only(
-            'code', 'status', 'status_level', 'request_date'
+            updated = xx_DashboardSmartAggregate.objects.filter(**key).update(**changes)
+            if not updated and lines_delta > 0:
+                try:
+                    with transaction.atomic():
+                        xx_DashboardSmartAggregate.objects.create(
+                            total_from_center=from_delta,
+                            total_to_center=to_delta,
+                            line_count=lines_delta,
+                            **key,
+                        )
+                except IntegrityError:
+                    # Another approval created the row first; add onto it
+                    xx_DashboardSmartAggregate.objects.filter(**key).update(**changes)
+
+        if any(lines_delta < 0 for _from, _to, lines_delta in deltas.values()):
+            # Drop combinations that no longer have any approved lines
+            xx_DashboardSmartAggregate.objects.filter(line_count__lte=0).delete()
+
+
+def apply_smart_dashboard_delta(transaction_id, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the lines of one budget transfer from
+    the maintained smart dashboard totals.
+
+    Costs one grouped query over the transfer's own lines plus one write per
+    affected (cost center, account) pair, independent of history size.
+    """
+    if sign not in (1, -1):
+        raise ValueError("sign must be 1 or -1")
+
+    line_totals = (
+        xx_TransactionTransfer.objects.filter(transaction_id=transaction_id)
+        .values('cost_center_code', 'account_code')
+        .annotate(
+            from_total=Sum('from_center'),
+            to_total=Sum('to_center'),
+            lines=Count('transfer_id'),
+        )
+        .order_by('cost_center_code', 'account_code')
+    )
+    _add_smart_totals({
+        (item['cost_center_code'], item['account_code']): (
+            (item['from_total'] or Decimal('0')) * sign,
+            (item['to_total'] or Decimal('0')) * sign,
+            item['lines'] * sign,
         )
+        for item in line_totals
+    })
 
-        # Use database aggregations for counting
-        total_count = transfers_queryset.count()
-        
-        # Count by status using database aggregation
-        status_counts = transfers_queryset.aggregate(
-            approved=Count('transaction_id', filter=Q(status='approved')),
-            rejected=Count('transaction_id', filter=Q(status='rejected')),
-            pending=Count('transaction_id', filter=Q(status='pending'))
+
+def apply_smart_dashboard_line_delta(removed=(), added=()):
+    """
+    Move individual lines of an approved transfer in or out of the smart
+    dashboard totals, e.g. when such a line is edited (removed as it was,
+    added as it is now), deleted or created.
+
+    ``removed`` and ``added`` are iterables of (cost_center_code,
+    account_code, from_center, to_center).
+    """
+    deltas = defaultdict(lambda: (Decimal('0'), Decimal('0'), 0))
+    for sign, lines in ((-1, removed), (1, added)):
+        for cost_center_code, account_code, from_center, to_center in lines:
+            key = (cost_center_code, account_code)
+            from_delta, to_delta, lines_delta = deltas[key]
+            deltas[key] = (
+                from_delta + Decimal(str(from_center or 0)) * sign,
+                to_delta + Decimal(str(to_center or 0)) * sign,
+                lines_delta + sign,
+            )
+    _add_smart_totals(deltas)
+
+
+def rebuild_smart_dashboard_aggregates(line_model=None, aggregate_model=None):
+    """
+    Rebuild the maintained smart dashboard totals from all approved transfer
+    lines. Used to reconcile drift; returns the number of combinations stored.
+
+    Migrations pass their historical models as ``line_model`` and
+    ``aggregate_model``.
+    """
+    line_model = line_model or xx_TransactionTransfer
+    aggregate_model = aggregate_model or xx_DashboardSmartAggregate
+
+    combinations = (
+        line_model.objects.filter(transaction__status="approved")
+        .values('cost_center_code', 'account_code')
+        .annotate(
+            from_total=Sum('from_center'),
+            to_total=Sum('to_center'),
+            lines=Count('transfer_id'),
         )
+        .order_by('cost_center_code', 'account_code')
+    )
+
+    with transaction.atomic():
+        aggregate_model.objects.all().delete()
+        aggregate_model.objects.bulk_create(
+            [
+                aggregate_model(
+                    cost_center_code=item['cost_center_code'],
+                    account_code=item['account_code'],
+                    total_from_center=item['from_total'] or 0,
+                    total_to_center=item['to_total'] or 0,
+                    line_count=item['lines'],
+                )
+                for item in combinations
+            ],
+            batch_size=1000,
+        )
+        return aggregate_model.objects.count()
+
+
+# Upper bound on the legacy "request_dates" list
+REQUEST_DATES_LIMIT = 1000
+
+
+def compute_normal_dashboard(transfers_queryset, start_time=None):
+    """
+    Compute every "normal" dashboard counter for a queryset of budget
+    transfers in two queries.
 
-        # Count by status level using database aggregation
-        level_counts = transfers_queryset.aggregate(
+    Status, status level and code prefix counts are conditional aggregates
+    over one GROUP BY on the request day; the per-day rows double as the
+    request date histogram and are summed in Python for the totals. The
+    second query reads the capped "request_dates" list of recent timestamps.
+
+    Returns:
+        dict: Normal dashboard data (same shape as the saved dashboard)
+    """
+    start_time = start_time or time.time()
+    count_start = time.time()
+
+    buckets = list(
+        transfers_queryset.order_by()
+        .annotate(request_day=TruncDate('request_date'))
+        .values('request_day')
+        .annotate(
+            total=Count('transaction_id'),
+            approved=Count('transaction_id', filter=Q(status='approved')),
+            rejected=Count('transaction_id', filter=Q(status='rejected')),
+            pending=Count('transaction_id', filter=Q(status='pending')),
             level1=Count('transaction_id', filter=Q(status_level=1)),
             level2=Count('transaction_id', filter=Q(status_level=2)),
             level3=Count('transaction_id', filter=Q(status_level=3)),
-            level4=Count('transaction_id', filter=Q(status_level=4))
-        )
-
-        # Count by code prefix using database functions
-        code_counts = transfers_queryset.aggregate(
+            level4=Count('transaction_id', filter=Q(status_level=4)),
             far=Count('transaction_id', filter=Q(code__istartswith='FAR')),
             afr=Count('transaction_id', filter=Q(code__istartswith='AFR')),
-            fad=Count('transaction_id', filter=Q(code__istartswith='FAD'))
-        )
-
-        # Get request dates efficiently (only non-null dates)
-        request_dates = list(
-            transfers_queryset.filter(request_date__isnull=False)
-            .values_list('request_date', flat=True)
-            .order_by('-request_date')[:1000]  # Limit to recent 1000 for performance
+            fad=Count('transaction_id', filter=Q(code__istartswith='FAD')),
         )
+    )
+
+    counter_names = (
+        'total', 'approved', 'rejected', 'pending',
+        'level1', 'level2', 'level3', 'level4',
+        'far', 'afr', 'fad',
+    )
+    counts = dict.fromkeys(counter_names, 0)
+    daily = defaultdict(int)
+    monthly = defaultdict(int)
+    for bucket in buckets:
+        for name in counter_names:
+            counts[name] += bucket[name]
+        day = bucket['request_day']
+        if day is not None:
+            daily[day] += bucket['total']
+            monthly[day.strftime('%Y-%m')] += bucket['total']
+
+    # The legacy "request_dates" list keeps its per-transfer timestamps
+    # (most recent first, capped); charts by day use the histogram instead
+    request_dates = list(
+        transfers_queryset.filter(request_date__isnull=False)
+        .values_list('request_date', flat=True)
+        .order_by('-request_date')[:REQUEST_DATES_LIMIT]
+    )
+    request_dates_iso = [date.isoformat() for date in request_dates]
+
+    print(f"Database counting completed in {time.time() - count_start:.2f}s")
+
+    return {
+        "total_transfers": counts['total'],
+        "total_transfers_far": counts['far'],
+        "total_transfers_afr": counts['afr'],
+        "total_transfers_fad": counts['fad'],
+        "approved_transfers": counts['approved'],
+        "rejected_transfers": counts['rejected'],
+        "pending_transfers": counts['pending'],
+        "pending_transfers_by_level": {
+            "Level1": counts['level1'],
+            "Level2": counts['level2'],
+            "Level3": counts['level3'],
+            "Level4": counts['level4'],
+        },
+        "request_dates": request_dates_iso,
+        "request_date_histogram": {
+            "daily": [
+                {"date": day.isoformat(), "count": daily[day]} for day in sorted(daily)
+            ],
+            "monthly": [
+                {"month": month, "count": monthly[month]} for month in sorted(monthly)
+            ],
+        },
+        "performance_metrics": {
+            "total_processing_time": round(time.time() - start_time, 2),
+            "counting_time": round(time.time() - count_start, 2),
+            "total_records_processed": counts['total'],
+            "request_dates_retrieved": len(request_dates_iso)
+        }
+    }
 
-        # Convert datetime objects to ISO format strings for JSON serialization
-        request_dates_iso = [date.isoformat() for date in request_dates]
 
-        print(f"Database counting completed in {time.time() - count_start:.2f}s")
+def dashboard_normal():
+    """
+    Optimized normal dashboard using a grouped conditional aggregation
+    """
+    try:
+        start_time = time.time()
+        print("Starting optimized normal dashboard calculation...")
 
-        # PHASE 2: Format response data
-        data = {
-            "total_transfers": total_count,
-            "total_transfers_far": code_counts['far'],
-            "total_transfers_afr": code_counts['afr'],
-            "total_transfers_fad": code_counts['fad'],
-            "approved_transfers": status_counts['approved'],
-            "rejected_transfers": status_counts['rejected'],
-            "pending_transfers": status_counts['pending'],
-            "pending_transfers_by_level": {
-                "Level1": level_counts['level1'],
-                "Level2": level_counts['level2'],
-                "Level3": level_counts['level3'],
-                "Level4": level_counts['level4'],
-            },
-            "request_dates": request_dates_iso,
-            "performance_metrics": {
-                "total_processing_time": round(time.time() - start_time, 2),
-                "counting_time": round(time.time() - count_start, 2),
-                "total_records_processed": total_count,
-                "request_dates_retrieved": len(request_dates_iso)
-            }
-        }
+        data = compute_normal_dashboard(xx_BudgetTransfer.objects.all(), start_time)
+        total_count = data["total_transfers"]
 
         print(f"Total optimized processing time: {time.time() - start_time:.2f}s")
         print(f"Processed {total_count} transfers")
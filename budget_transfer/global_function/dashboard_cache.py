@@ -0,0 +1,91 @@
+"""
+Scoped cache for DashboardBudgetTransferView sections.
+
+Entries are keyed by (entity-scope fingerprint, dashboard type,
+DashBoard_filler_per_Project) and expire after ``settings.DASHBOARD_CACHE_TTL``
+seconds. Each dashboard type also carries a generation number that is bumped
+whenever the transfers it summarises change (and, for 'normal', whenever the
+entity tree its scopes are resolved from changes), which invalidates every
+cached entry of that type at once without having to enumerate keys.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('budget_transfer_signals')
+
+DEFAULT_CACHE_TTL = 300
+
+CACHE_PREFIX = 'dashboard'
+
+
+def get_cache_ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', DEFAULT_CACHE_TTL)
+
+
+def _generation_key(dashboard_type):
+    return f"{CACHE_PREFIX}:generation:{dashboard_type}"
+
+
+def get_dashboard_generation(dashboard_type):
+    """Return the current cache generation for a dashboard type."""
+    return cache.get_or_set(_generation_key(dashboard_type), 1, None)
+
+
+def invalidate_dashboard_cache(*dashboard_types):
+    """Invalidate every cached entry of the given dashboard types."""
+    for dashboard_type in dashboard_types or ('normal', 'smart'):
+        key = _generation_key(dashboard_type)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Generation not initialised yet (or evicted); start a new one
+                cache.set(key, 2, None)
+        except Exception as e:
+            logger.error(f"Error invalidating {dashboard_type} dashboard cache: {str(e)}")
+
+
+def get_scope_fingerprint(user, dashboard_type, Type='edit'):
+    """
+    Fingerprint of what a user's dashboard section depends on.
+
+    The 'normal' section is filtered by the user's entity abilities and
+    always includes the user's own transfers, so it is keyed per user. The
+    'smart' section summarises every approved line (optionally narrowed by
+    DashBoard_filler_per_Project) and is shared by all users.
+    """
+    if dashboard_type != 'normal':
+        return 'all'
+
+    entity_ids = sorted(
+        user.abilities.filter(Type=Type, Entity__isnull=False).values_list('Entity_id', flat=True)
+    )
+    raw = f"{user.id}|{Type}|{','.join(str(entity_id) for entity_id in entity_ids)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_key(fingerprint, dashboard_type, filler):
+    generation = get_dashboard_generation(dashboard_type)
+    return f"{CACHE_PREFIX}:{dashboard_type}:{generation}:{fingerprint}:{filler or '-'}"
+
+
+def get_cached_dashboard_section(user, dashboard_type, filler=None):
+    """Return the cached section data, or None on a miss."""
+    try:
+        fingerprint = get_scope_fingerprint(user, dashboard_type)
+        return cache.get(_entry_key(fingerprint, dashboard_type, filler))
+    except Exception as e:
+        logger.error(f"Error reading dashboard cache: {str(e)}")
+        return None
+
+
+def set_cached_dashboard_section(user, dashboard_type, data, filler=None):
+    """Store freshly computed section data for the user's scope."""
+    try:
+        fingerprint = get_scope_fingerprint(user, dashboard_type)
+        cache.set(_entry_key(fingerprint, dashboard_type, filler), data, get_cache_ttl())
+    except Exception as e:
+        logger.error(f"Error writing dashboard cache: {str(e)}")
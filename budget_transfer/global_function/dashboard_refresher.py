@@ -0,0 +1,166 @@
+"""
+Coalescing background refresher for the saved budget transfer dashboard.
+
+Signal handlers call ``mark_dashboard_dirty()`` instead of recomputing the
+dashboard inside the request thread. Every dirty mark that arrives while a
+refresh is already scheduled is folded into that refresh, so a burst of
+approvals costs one ``dashboard_normal()`` / ``dashboard_smart()`` run per
+window instead of one per save.
+
+Coalescing also spans worker processes through the shared cache: each
+committed change bumps a per-type change counter, and a refresh records the
+highest counter it covered. A process whose changes another process has
+already covered skips its refresh, and only one process refreshes a type at
+a time; one that finds the refresh running elsewhere tries again after the
+window. Without the cache every process simply refreshes on its own.
+
+The window (in seconds) is read from ``settings.DASHBOARD_REFRESH_WINDOW``.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from budget_transfer.global_function.dashbaord import dashboard_normal, dashboard_smart
+
+logger = logging.getLogger('budget_transfer_signals')
+
+DEFAULT_REFRESH_WINDOW = 5
+
+DASHBOARD_TYPES = ('normal', 'smart')
+
+CACHE_PREFIX = 'dashboard_refresh'
+
+# Longest a refresh may hold the shared lock before another process may take over
+REFRESH_LOCK_TIMEOUT = 600
+
+_lock = threading.Lock()
+# Dashboard type -> highest change counter to cover (None: counter unknown)
+_pending = {}
+_timer = None
+
+
+def get_refresh_window():
+    """Return the coalescing window in seconds (never negative)."""
+    window = getattr(settings, 'DASHBOARD_REFRESH_WINDOW', DEFAULT_REFRESH_WINDOW)
+    try:
+        return max(float(window), 0.0)
+    except (TypeError, ValueError):
+        return float(DEFAULT_REFRESH_WINDOW)
+
+
+def mark_dashboard_dirty(*dashboard_types):
+    """
+    Mark one or more dashboard sections ('normal', 'smart') as stale.
+
+    The refresh is scheduled only after the surrounding transaction commits,
+    so the background thread never aggregates uncommitted rows.
+    """
+    types = set(dashboard_types or DASHBOARD_TYPES)
+    invalid = types.difference(DASHBOARD_TYPES)
+    if invalid:
+        raise ValueError(f"Invalid dashboard type(s): {', '.join(sorted(invalid))}")
+
+    transaction.on_commit(lambda: _schedule_refresh(types))
+
+
+def _changes_key(dashboard_type):
+    return f"{CACHE_PREFIX}:changes:{dashboard_type}"
+
+
+def _covered_key(dashboard_type):
+    return f"{CACHE_PREFIX}:covered:{dashboard_type}"
+
+
+def _lock_key(dashboard_type):
+    return f"{CACHE_PREFIX}:lock:{dashboard_type}"
+
+
+def _count_change(dashboard_type):
+    """Bump the shared change counter of a type; None if the cache is down."""
+    key = _changes_key(dashboard_type)
+    try:
+        cache.add(key, 0, None)
+        return cache.incr(key)
+    except Exception as e:
+        logger.error(f"Error counting {dashboard_type} dashboard change: {str(e)}")
+        return None
+
+
+def _schedule_refresh(types):
+    _queue_refresh({dashboard_type: _count_change(dashboard_type) for dashboard_type in types})
+
+
+def _queue_refresh(changes):
+    global _timer
+    with _lock:
+        for dashboard_type, change in changes.items():
+            previous = _pending.get(dashboard_type, 0)
+            _pending[dashboard_type] = None if None in (previous, change) else max(previous, change)
+        if _timer is not None:
+            # A refresh is already pending; it will pick these types up.
+            return
+        _timer = threading.Timer(get_refresh_window(), _run_refresh)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _refresh(dashboard_type):
+    if dashboard_type == 'smart':
+        dashboard_smart()
+    else:
+        dashboard_normal()
+
+
+def _refresh_shared(dashboard_type, change):
+    """
+    Refresh one dashboard type unless another process already covered
+    ``change``. Returns False when another process is refreshing it right now.
+    """
+    if change is not None:
+        try:
+            if (cache.get(_covered_key(dashboard_type)) or 0) >= change:
+                return True
+            if not cache.add(_lock_key(dashboard_type), 1, REFRESH_LOCK_TIMEOUT):
+                return False
+            # Every change counted so far was committed before it was counted
+            covers = cache.get(_changes_key(dashboard_type)) or change
+        except Exception as e:
+            logger.error(f"Error coordinating {dashboard_type} dashboard refresh: {str(e)}")
+            change = None
+
+    try:
+        _refresh(dashboard_type)
+        if change is not None:
+            cache.set(_covered_key(dashboard_type), covers, None)
+    finally:
+        if change is not None:
+            cache.delete(_lock_key(dashboard_type))
+    return True
+
+
+def _run_refresh():
+    global _timer
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _timer = None
+
+    retry = {}
+    try:
+        for dashboard_type in ('smart', 'normal'):
+            if dashboard_type not in pending:
+                continue
+            try:
+                if not _refresh_shared(dashboard_type, pending[dashboard_type]):
+                    retry[dashboard_type] = pending[dashboard_type]
+            except Exception as e:
+                logger.error(f"Error refreshing {dashboard_type} dashboard in background: {str(e)}")
+        logger.info(f"Dashboard refreshed in background: {', '.join(sorted(pending))}")
+    finally:
+        # This thread opened its own database connection; release it.
+        connections.close_all()
+    if retry:
+        _queue_refresh(retry)
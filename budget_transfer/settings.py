@@ -2,6 +2,7 @@
 Django settings for budget_transfer project.
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -60,6 +61,45 @@ CHANNEL_LAYERS = {
 
 
 
+# Shared cache for dashboard sections, entity scopes and the version
+# counters that retire them, e.g. REDIS_CACHE_URL=redis://127.0.0.1:6379/1.
+# Without it each process falls back to its own local memory cache, so
+# invalidations only reach the process that made the change.
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'budget_transfer',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'KEY_PREFIX': 'budget_transfer',
+        },
+    }
+
+# Seconds a scoped DashboardBudgetTransferView section stays cached; entries
+# are also invalidated as soon as the underlying transfers change.
+DASHBOARD_CACHE_TTL = 300
+
+# Seconds a worker may keep its in-memory XX_Entity tree without seeing the
+# shared version in the cache; entity changes reload it immediately.
+ENTITY_TREE_MAX_AGE = 300
+
+# Seconds a user's resolved entity scope (allowed cost center codes) stays
+# cached; ability and entity changes retire it immediately.
+ENTITY_SCOPE_CACHE_TTL = 300
+
+# Seconds to wait before recomputing the saved dashboard after a budget
+# transfer changes; every change inside the window shares one recompute.
+DASHBOARD_REFRESH_WINDOW = 5
+
+
 FIELD_ENCRYPTION_KEY = 'G2g9Xb8qH-SZs-So5QEK1EXmf_lUqHuvdgFnitEtRB0='
 
 
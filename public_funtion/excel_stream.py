@@ -0,0 +1,99 @@
+"""
+Streaming Excel ingestion.
+
+``pd.read_excel`` loads the whole workbook and then the whole DataFrame, so
+a large sheet costs several times its size in worker memory. Here .xlsx
+files are opened with openpyxl in read-only mode, which parses the sheet
+XML as it goes, and rows are handed out as DataFrames of at most
+``batch_size`` rows. Memory stays bounded by one batch whatever the size of
+the sheet.
+
+Each batch is indexed by Excel row number (the header is row 1), so
+callers can report errors against the row the user sees. Fully empty rows
+are skipped.
+
+Legacy .xls files cannot be read incrementally; they are loaded with pandas
+and then split into the same batches.
+"""
+import pandas as pd
+from openpyxl import load_workbook
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+def _normalize_headers(headers, normalize):
+    columns = []
+    for position, header in enumerate(headers):
+        if header is None:
+            header = f"Unnamed: {position}"
+        header = str(header)
+        columns.append(normalize(header) if normalize else header)
+    return columns
+
+
+def _frame(rows, row_numbers, columns):
+    return pd.DataFrame(rows, columns=columns, index=pd.Index(row_numbers, name="row"))
+
+
+def _iter_xls_batches(file, batch_size, normalize):
+    df = pd.read_excel(file)
+    df.columns = _normalize_headers(df.columns, normalize)
+    df = df.dropna(how="all")
+    # Header is row 1, the first data row is row 2
+    df.index = pd.Index(df.index + 2, name="row")
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def iter_excel_batches(file, batch_size=DEFAULT_BATCH_SIZE, normalize_header=None):
+    """
+    Yield the first sheet of ``file`` as DataFrames of up to ``batch_size``
+    rows, with the first row as column names (passed through
+    ``normalize_header`` if given). Empty cells are None (NaN in numeric
+    columns).
+    """
+    name = getattr(file, "name", "") or ""
+    if name.lower().endswith(".xls"):
+        yield from _iter_xls_batches(file, batch_size, normalize_header)
+        return
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        columns = _normalize_headers(headers, normalize_header)
+
+        batch, row_numbers = [], []
+        for row_number, values in enumerate(rows, start=2):
+            if all(value is None or value == "" for value in values):
+                continue
+            # Read-only rows can be shorter or longer than the header
+            values = list(values[:len(columns)]) + [None] * (len(columns) - len(values))
+            batch.append(values)
+            row_numbers.append(row_number)
+            if len(batch) >= batch_size:
+                yield _frame(batch, row_numbers, columns)
+                batch, row_numbers = [], []
+        if batch:
+            yield _frame(batch, row_numbers, columns)
+    finally:
+        workbook.close()
+
+
+def read_excel_columns(file, normalize_header=None):
+    """Column names of the first sheet, without reading its rows."""
+    name = getattr(file, "name", "") or ""
+    if name.lower().endswith(".xls"):
+        columns = _normalize_headers(pd.read_excel(file, nrows=0).columns, normalize_header)
+        file.seek(0)
+        return columns
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        headers = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), None)
+    finally:
+        workbook.close()
+    file.seek(0)
+    return _normalize_headers(headers or (), normalize_header)
@@ -0,0 +1,109 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Page-number pagination makes the database skip every row before the
+requested page, so deep pages get slower and rows shift between pages when
+new ones are inserted. Keyset pagination instead remembers the ordering
+values of the last row served and asks for the rows strictly after it:
+
+    WHERE (a < :a) OR (a = :a AND b < :b) ...
+
+Every page costs the same and concurrent inserts never duplicate or skip
+rows. The ordering must end in a unique column (or unique combination).
+
+The cursor handed to clients is an opaque url-safe string.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+def _json_default(value):
+    # Full isoformat: DjangoJSONEncoder would cut datetimes to milliseconds
+    # and make the cursor skip rows inside the dropped microseconds
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    """Encode the ordering values of a row as an opaque cursor string."""
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """
+    Decode a cursor into ordering values typed like the model fields.
+
+    Raises ValueError if the cursor is malformed or does not match the ordering.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError("Invalid cursor")
+
+    typed = []
+    for (field_name, _descending), value in zip(ordering, values):
+        try:
+            typed.append(model._meta.get_field(field_name).to_python(value))
+        except (FieldDoesNotExist, ValidationError):
+            raise ValueError("Invalid cursor")
+    return typed
+
+
+def _parse_ordering(order_by):
+    return [(field.lstrip('-'), field.startswith('-')) for field in order_by]
+
+
+def keyset_filter(ordering, values):
+    """Q object selecting the rows that come strictly after ``values``."""
+    condition = Q()
+    equal_so_far = Q()
+    for (field_name, descending), value in zip(ordering, values):
+        lookup = f"{field_name}__lt" if descending else f"{field_name}__gt"
+        condition |= equal_so_far & Q(**{lookup: value})
+        equal_so_far &= Q(**{field_name: value})
+    return condition
+
+
+def get_keyset_page_size(request, default=10, max_page_size=100):
+    """Read page_size from the query string, clamped to [1, max_page_size]."""
+    try:
+        page_size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return min(max(page_size, 1), max_page_size)
+
+
+def paginate_by_keyset(queryset, order_by, cursor=None, page_size=10):
+    """
+    Return (rows, next_cursor) for the page after ``cursor``.
+
+    ``order_by`` uses Django syntax, e.g. ('-request_date', '-transaction_id').
+    Works on model querysets and on values() querysets, as long as the values
+    include the ordering fields. next_cursor is None on the last page.
+    Raises ValueError for an invalid cursor.
+    """
+    ordering = _parse_ordering(order_by)
+    queryset = queryset.order_by(*order_by)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, queryset.model, ordering)))
+
+    # One extra row tells whether another page exists
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        values = [last[field_name] for field_name, _descending in ordering]
+    else:
+        values = [getattr(last, field_name) for field_name, _descending in ordering]
+    return rows, encode_cursor(values)
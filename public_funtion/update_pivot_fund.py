@@ -1,71 +1,265 @@
-from account_and_entitys.models import XX_PivotFund
+"""
+Pivot fund encumbrance/actual movements.
+
+Transfers do not update XX_PivotFund in place: every submit, approval and
+rejection appends its movements to the XX_PIVOT_FUND_MOVEMENT_XX ledger.
+A pivot fund's balance is its stored snapshot (the encumbrance/actual
+columns) plus the movements not yet folded into it; read balances through
+with_pivot_fund_balances(). ``python manage.py compact_pivot_fund_ledger``
+folds pending movements into the snapshot so that sum stays small.
+"""
+from account_and_entitys.models import XX_PivotFund, XX_PivotFundMovement
 from decimal import Decimal  # Add this import
+from collections import OrderedDict
+import uuid
+from django.db import transaction
+from django.db.models import Case, F, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+# decide = 1 when sent for approval, 2 when approved, 3 when rejected
+SUBMIT, APPROVE, REJECT = 1, 2, 3
+
+# Pairs (or rows) per query, to stay well inside Oracle's bind limits
+LOOKUP_BATCH_SIZE = 400
+
 
-def update_pivot_fund(cost_center_code, account_code, from_center, to_center, decide):
+def _to_decimal(value):
+    return Decimal(str(value).strip()) if value not in [None, '', ' '] else Decimal('0')
+
+
+def pivot_fund_deltas(from_center, to_center, decide):
     """
-    Update the pivot fund for a given cost center and account with the from_center amount.
-    Returns a dict with update status and information.
+    (encumbrance delta, actual delta) one transfer line applies to its pivot fund.
+    """
+    from_center_dec = _to_decimal(from_center)
+    to_center_dec = _to_decimal(to_center)
+
+    if decide == SUBMIT:
+        return from_center_dec, Decimal('0')
+    if decide == APPROVE:
+        if from_center_dec > 0:
+            return -from_center_dec, Decimal('0')
+        if to_center_dec > 0:
+            return Decimal('0'), to_center_dec
+    elif decide == REJECT:
+        if from_center_dec > 0:
+            return from_center_dec, Decimal('0')
+    return Decimal('0'), Decimal('0')
+
+
+def _pending_sum(column):
+    """Sum of ``column`` over the outer pivot fund's movements not yet in its snapshot."""
+    total = (
+        XX_PivotFundMovement.objects.filter(pivot_fund=OuterRef('pk'), snapshot_id__isnull=True)
+        .order_by()
+        .values('pivot_fund')
+        .annotate(total=Sum(column))
+        .values('total')
+    )
+    return Coalesce(
+        Subquery(total, output_field=XX_PivotFundMovement._meta.get_field(column)),
+        Value(Decimal('0')),
+    )
+
+
+def with_pivot_fund_balances(queryset):
+    """
+    Annotate pending_encumbrance / pending_actual (movements not yet compacted)
+    on a XX_PivotFund queryset. The current balance is the stored snapshot
+    plus these; see pivot_fund_balance().
+    """
+    return queryset.annotate(
+        pending_encumbrance=_pending_sum('encumbrance_delta'),
+        pending_actual=_pending_sum('actual_delta'),
+    )
+
+
+def pivot_fund_balance(fund):
+    """(encumbrance, actual) of a fund loaded through with_pivot_fund_balances()."""
+    return (
+        _to_decimal(fund.encumbrance) + _to_decimal(getattr(fund, 'pending_encumbrance', 0)),
+        _to_decimal(fund.actual) + _to_decimal(getattr(fund, 'pending_actual', 0)),
+    )
+
+
+def _key_batches(keys):
+    """Q conditions matching the (entity, account) keys, LOOKUP_BATCH_SIZE pairs each."""
+    keys = sorted(keys)
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        condition = Q()
+        for entity, account in keys[start:start + LOOKUP_BATCH_SIZE]:
+            condition |= Q(entity=entity, account=account)
+        yield condition
+
+
+def find_pivot_fund_keys(keys):
+    """The (entity, account) keys, of those given, that have a pivot fund in any year."""
+    found = set()
+    for condition in _key_batches(keys):
+        found.update(
+            XX_PivotFund.objects.filter(condition).values_list('entity', 'account').distinct()
+        )
+    return found
+
+
+def find_pivot_funds(keys, year=None):
+    """Pivot funds (with pending balances) of the given (entity, account) keys, as {key: [funds]}."""
+    funds = {}
+    for condition in _key_batches(keys):
+        queryset = XX_PivotFund.objects.filter(condition)
+        if year is not None:
+            queryset = queryset.filter(year=year)
+        for fund in with_pivot_fund_balances(queryset):
+            funds.setdefault((fund.entity, fund.account), []).append(fund)
+    return funds
+
+
+def apply_pivot_fund_updates(lines, decide, year=None, transaction_id=None, funds=None):
     """
-    try:
-        # Convert values to Decimal to ensure type compatibility
-        from_center_dec = Decimal(str(from_center)) if from_center is not None else Decimal('0')
-        to_center_dec = Decimal(str(to_center)) if to_center is not None else Decimal('0')
-        
-        print(f"cost_center_code: {cost_center_code}")
-        print(f"account_code: {account_code}")
-        print(f"from_center: {from_center}")
-        print(f"to_center: {to_center}")
-        
-        pivot_fund = XX_PivotFund.objects.get(entity=cost_center_code, account=account_code)
-        pivot_fund.encumbrance = Decimal(str(pivot_fund.encumbrance).strip()) if pivot_fund.encumbrance not in [None, '', ' '] else Decimal('0')
-        pivot_fund.actual = Decimal(str(pivot_fund.actual).strip()) if pivot_fund.actual not in [None, '', ' '] else Decimal('0')
-
-        print(f"Pivot fund found: ////////////")
-        print(f"Pivot fund found: {pivot_fund}")
-        print(f"Pivot fund found: ////////////")
-
-        # Store old value before changes for reporting
-        old_encumbrance = pivot_fund.encumbrance
-        
-        # decide =1 when sent for approvel
-        print(f"decide: {decide}")
-        if decide == 1:
-          print(f"from_center_dec: {from_center_dec}")
-          print(f"encumbrance: {pivot_fund.encumbrance}")
-          pivot_fund.encumbrance += from_center_dec
-        # decide = 2 when approved 
-        elif decide == 2:
-              if from_center_dec > 0:
-                print(f"from_center_dec: {from_center_dec}")
-                print(f"encumbrance: {pivot_fund.encumbrance}")
-                pivot_fund.encumbrance -= from_center_dec
-              elif to_center_dec > 0:
-               pivot_fund.actual += to_center_dec
-        # decide = 3 when rejcted         
-        elif decide == 3:  # Changed to elif to avoid multiple executions
-             if from_center_dec > 0:
-                pivot_fund.encumbrance += from_center_dec
-                
-        print(f"Pivot fund updated: {pivot_fund}")
-                 
-        pivot_fund.save()
-        print("finish")
-
-        return {
+    Record the encumbrance/actual movements of a batch of transfer lines.
+
+    ``lines`` is an iterable of (cost_center_code, account_code, from_center,
+    to_center). Each line with a non-zero effect appends one row to the
+    XX_PIVOT_FUND_MOVEMENT_XX ledger; pivot fund rows themselves are not
+    touched (and not locked), so concurrent transfers on the same cost
+    center/account never wait on each other. ``compact_pivot_fund_ledger``
+    later folds the movements into the XX_PivotFund snapshot. ``year``
+    scopes the pivot funds (e.g. the transfer's fy); without it each
+    (entity, account) must have a single pivot fund. Callers that already
+    loaded the funds with find_pivot_funds() can pass them as ``funds``.
+
+    Returns {'updated': [...], 'missing': [...]}, one entry per line. If any
+    line has no (or no unambiguous) pivot fund nothing is recorded.
+    """
+    lines = [
+        (cost_center_code, account_code, from_center, to_center)
+        for cost_center_code, account_code, from_center, to_center in lines
+    ]
+    if funds is None:
+        funds = find_pivot_funds(
+            {(str(cost_center_code), str(account_code)) for cost_center_code, account_code, _f, _t in lines}, year
+        )
+
+    missing = []
+    for cost_center_code, account_code, from_center, _to_center in lines:
+        matches = funds.get((str(cost_center_code), str(account_code)), [])
+        if len(matches) != 1:
+            missing.append({
+                'cost_center_code': cost_center_code,
+                'account_code': account_code,
+                'from_center': from_center,
+                'status': 'failed',
+                'error': 'Pivot fund not found' if not matches else 'Multiple pivot funds found',
+            })
+    if missing:
+        return {'updated': [], 'missing': missing}
+
+    movements = []
+    encumbrance_deltas = OrderedDict()
+    for cost_center_code, account_code, from_center, to_center in lines:
+        key = (str(cost_center_code), str(account_code))
+        encumbrance_delta, actual_delta = pivot_fund_deltas(from_center, to_center, decide)
+        encumbrance_deltas[key] = encumbrance_deltas.get(key, Decimal('0')) + encumbrance_delta
+        if encumbrance_delta or actual_delta:
+            movements.append(XX_PivotFundMovement(
+                pivot_fund=funds[key][0],
+                encumbrance_delta=encumbrance_delta,
+                actual_delta=actual_delta,
+                decide=decide,
+                transaction_id=transaction_id,
+            ))
+    with transaction.atomic():
+        # All of a batch's movements are recorded, or none
+        XX_PivotFundMovement.objects.bulk_create(movements, batch_size=LOOKUP_BATCH_SIZE)
+
+    updated = []
+    for cost_center_code, account_code, from_center, _to_center in lines:
+        key = (str(cost_center_code), str(account_code))
+        old_encumbrance, _actual = pivot_fund_balance(funds[key][0])
+        updated.append({
             'cost_center_code': cost_center_code,
             'account_code': account_code,
             'from_center': from_center,
             'status': 'updated seccessfully',
             'encumbrance_old_value': old_encumbrance,
-            'encumbrance_new_value': pivot_fund.encumbrance
-        }
-    
-    except XX_PivotFund.DoesNotExist:
-        # Handle the case where the pivot fund does not exist
-        return {
-            'cost_center_code': cost_center_code,
-            'account_code': account_code,
-            'from_center': from_center,
-            'status': 'failed',
-            'error': 'Pivot fund not found'
-        }
\ No newline at end of file
+            'encumbrance_new_value': old_encumbrance + encumbrance_deltas[key],
+        })
+    return {'updated': updated, 'missing': []}
+
+
+def _increment(column, deltas_by_pk):
+    """CASE expression adding each row's delta to ``column`` (NULL counts as 0)."""
+    current = Coalesce(F(column), Value(Decimal('0')))
+    return Case(
+        *[When(pk=pk, then=current + delta) for pk, delta in deltas_by_pk.items()],
+        default=F(column),
+        output_field=XX_PivotFund._meta.get_field(column),
+    )
+
+
+def _update_pivot_fund_rows(row_deltas):
+    """One UPDATE adding (pk, encumbrance delta, actual delta) to the snapshot rows."""
+    changes = {}
+    encumbrance = {pk: delta for pk, delta, _actual in row_deltas if delta}
+    actual = {pk: delta for pk, _encumbrance, delta in row_deltas if delta}
+    if encumbrance:
+        changes['encumbrance'] = _increment('encumbrance', encumbrance)
+    if actual:
+        changes['actual'] = _increment('actual', actual)
+    if changes:
+        XX_PivotFund.objects.filter(pk__in=[pk for pk, _e, _a in row_deltas]).update(**changes)
+
+
+def compact_pivot_fund_ledger(max_movements=None):
+    """
+    Fold pending ledger movements into the XX_PivotFund snapshot.
+
+    The movements up to the current high-water mark are claimed with a fresh
+    snapshot id (``UPDATE ... SET snapshot_id = :token WHERE snapshot_id IS
+    NULL``), summed per pivot fund and added to the snapshot, all in one
+    transaction, so readers see either the old snapshot plus the pending
+    movements or the new snapshot, never both or neither. Movements are
+    kept as history. Returns (movements compacted, pivot funds changed).
+    """
+    with transaction.atomic():
+        pending = XX_PivotFundMovement.objects.filter(snapshot_id__isnull=True)
+        high_water = pending.aggregate(high_water=Max('id'))['high_water']
+        if high_water is None:
+            return 0, 0
+        if max_movements:
+            low = pending.aggregate(low=Min('id'))['low']
+            high_water = min(high_water, low + max_movements - 1)
+
+        token = uuid.uuid4().int >> 65  # Positive and within a signed 64-bit column
+        claimed = pending.filter(id__lte=high_water).update(snapshot_id=token)
+        totals = list(
+            XX_PivotFundMovement.objects.filter(snapshot_id=token)
+            .order_by()
+            .values('pivot_fund_id')
+            .annotate(encumbrance=Sum('encumbrance_delta'), actual=Sum('actual_delta'))
+            .values_list('pivot_fund_id', 'encumbrance', 'actual')
+        )
+        row_deltas = [
+            (pk, _to_decimal(encumbrance), _to_decimal(actual))
+            for pk, encumbrance, actual in totals
+            if encumbrance or actual
+        ]
+        for start in range(0, len(row_deltas), LOOKUP_BATCH_SIZE):
+            _update_pivot_fund_rows(row_deltas[start:start + LOOKUP_BATCH_SIZE])
+    return claimed, len(row_deltas)
+
+
+def update_pivot_fund(cost_center_code, account_code, from_center, to_center, decide, year=None):
+    """
+    Update the pivot fund for a given cost center and account with the from_center amount.
+    Returns a dict with update status and information.
+
+    Single-line form of apply_pivot_fund_updates; prefer the batch form when
+    a transfer has several lines.
+    """
+    result = apply_pivot_fund_updates(
+        [(cost_center_code, account_code, from_center, to_center)], decide, year=year
+    )
+    if result['missing']:
+        return result['missing'][0]
+    return result['updated'][0]